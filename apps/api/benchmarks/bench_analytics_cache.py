@@ -0,0 +1,183 @@
+"""
+`/portfolio/analytics` with the result cache: cold vs repeat loads, and
+invalidation after a holdings edit or a new daily bar.
+
+For each portfolio size, seeds a temporary holdings database and history
+store (a year of synthetic closes per symbol, all marked fresh, so nothing
+goes upstream), creates the holdings through `POST /holdings/`, then times
+through httpx's ASGI transport:
+
+- `uncached`: every request recomputes (cache disabled).
+- `cold`: first request after the holdings were written.
+- `repeat`: the same request again, served from the cache.
+- `lookup us`: just the cache lookup of a hit, without the request around it
+  (routing, the holdings-version query, response encoding).
+- `after edit`: first request after `PUT /holdings/{id}`; must recompute and
+  return a different result.
+- `after new bar`: first request after one symbol gains a bar.
+
+Values are median milliseconds over `--repeat` runs of each case.
+
+    python -m benchmarks.bench_analytics_cache
+    python -m benchmarks.bench_analytics_cache --symbols 5 50 200 --repeat 20
+
+Run from `apps/api`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+from benchmarks.bench_analytics import make_histories
+
+
+def _configure() -> None:
+    # Must be set before the db and history modules are imported.
+    root = Path(tempfile.mkdtemp())
+    os.environ["DATABASE_URL"] = f"sqlite:///{root / 'bench_analytics_cache.db'}"
+    os.environ["HISTORY_CACHE_PATH"] = str(root / "history.sqlite3")
+    os.environ["ANALYTICS_BENCHMARK_SYMBOL"] = "SPY"
+
+
+def seed_bars(symbols: list[str]) -> None:
+    from services.history_cache import get_history_store
+
+    store = get_history_store()
+    histories = make_histories(len(symbols), 300)
+    # Shift the synthetic year so it ends yesterday, inside the analytics window.
+    offset = date.today() - timedelta(days=1) - max(bar["date"] for bars in histories.values() for bar in bars)
+    for symbol, bars in zip(symbols, histories.values()):
+        store.write(symbol, [(bar["date"] + offset, bar["close"]) for bar in bars])
+
+
+async def _median_ms(fn, repeat: int) -> tuple[float, object]:
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+async def _lookup_us(user_id: str, repeat: int) -> float:
+    from crud.holding import holdings_version
+    from db.async_session import AsyncSessionLocal
+    from services.analytics_cache import analytics_cache, cache_key
+    from services.finnhub_client import get_unix_timestamp_days_ago
+
+    async with AsyncSessionLocal() as db:
+        version = await holdings_version(db, uuid.UUID(user_id))
+    key = cache_key(user_id, get_unix_timestamp_days_ago(365), "SPY")
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        assert await analytics_cache.get(key, version) is not None
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+async def run(args: argparse.Namespace) -> None:
+    _configure()
+
+    import httpx
+    from fastapi import FastAPI
+
+    from db.base import Base
+    from db.session import engine
+    from routes import holdings, portfolio
+    from services.analytics_cache import AnalyticsCache, analytics_cache
+    from services.history_cache import get_history_store
+
+    import models.holding  # noqa: F401  (register the tables)
+    import models.holdings_version  # noqa: F401
+
+    Base.metadata.create_all(engine)
+    app = FastAPI()
+    app.include_router(holdings.router, prefix="/holdings")
+    app.include_router(portfolio.router, prefix="/portfolio")
+
+    print(f"median ms over {args.repeat} requests")
+    print(
+        f"{'symbols':>8} {'uncached':>9} {'cold':>9} {'repeat':>9} {'lookup us':>10} {'after edit':>11} "
+        f"{'after new bar':>14} {'speedup':>9}"
+    )
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as http:
+        for n_symbols in args.symbols:
+            user_id = str(uuid.uuid4())
+            symbols = [f"B{n_symbols}X{i:04d}" for i in range(n_symbols)]
+            seed_bars(symbols + ["SPY"])
+            ids = []
+            for index, symbol in enumerate(symbols):
+                response = await http.post(
+                    "/holdings/",
+                    params={"user_id": user_id},
+                    json={"symbol": symbol, "quantity": 10 + index, "avg_cost": 100.0},
+                )
+                response.raise_for_status()
+                ids.append(response.json()["id"])
+
+            async def analytics():
+                response = await http.get("/portfolio/analytics", params={"user_id": user_id})
+                response.raise_for_status()
+                return response.json()
+
+            async def miss_after(change):
+                await change()
+                started = time.perf_counter()
+                result = await analytics()
+                return (time.perf_counter() - started) * 1000, result
+
+            portfolio.analytics_cache = AnalyticsCache(maxsize=0, ttl=0)
+            uncached, _ = await _median_ms(analytics, args.repeat)
+            portfolio.analytics_cache = analytics_cache
+
+            cold, before = await miss_after(lambda: asyncio.sleep(0))
+            repeat, cached = await _median_ms(analytics, args.repeat)
+            assert cached == before
+            lookup_us = await _lookup_us(user_id, args.repeat)
+
+            async def edit():
+                response = await http.put(
+                    f"/holdings/{ids[0]}",
+                    params={"user_id": user_id},
+                    json={"symbol": symbols[0], "quantity": 5_000, "avg_cost": 100.0},
+                )
+                response.raise_for_status()
+
+            edited, after_edit = await miss_after(edit)
+            assert after_edit != before, "stale analytics served after a holdings edit"
+
+            async def new_bar():
+                store = get_history_store()
+                last = store.last_bar_date(symbols[-1])
+                await asyncio.to_thread(store.write, symbols[-1], [(last + timedelta(days=1), 1.0)])
+
+            new_bar_ms, after_bar = await miss_after(new_bar)
+            assert after_bar != after_edit, "stale analytics served after a new bar"
+
+            print(
+                f"{n_symbols:>8} {uncached:>9.2f} {cold:>9.2f} {repeat:>9.2f} {lookup_us:>10.1f} {edited:>11.2f} "
+                f"{new_bar_ms:>14.2f} {uncached / repeat:>8.0f}x"
+            )
+    print(f"cache: {analytics_cache.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, nargs="+", default=[5, 50, 200])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Chatbot answer cache: hit rate, model time saved and lookup cost.
+
+Builds a question stream from a few dozen templates over a set of tickers,
+with template popularity following a Zipf curve. Each template comes in
+several phrasings that differ only by filler words ("what is" / "what's" /
+"please tell me"). The stream is replayed through a `ChatCache` three ways:
+no cache, exact-match only, and exact plus near-duplicate lookup. Each
+answer is charged the fake model's latency on a miss, and the table shows
+hit rates and total model time. Lookup cost is timed separately for a warm
+cache.
+
+Before any timing, pairs of questions that only differ by a meaning-bearing
+word ("should" / "can", "is" / "was") are checked to miss each other's entry
+in near-duplicate mode.
+
+Finally a handful of questions go end to end through `/chatbot/query` on the
+fake backend, so the served latency of a miss and a hit can be compared.
+
+    python -m benchmarks.bench_chat_cache
+    python -m benchmarks.bench_chat_cache --questions 20000 --tickers 200
+
+Run from `apps/api`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+TEMPLATES = [
+    "what is the p/e of {t}",
+    "what is the dividend yield of {t}",
+    "how did {t} trade",
+    "what is the market cap of {t}",
+    "is {t} overvalued",
+    "what are the main risks of {t}",
+    "when does {t} report earnings",
+    "what is the 52 week high of {t}",
+    "who is the ceo of {t}",
+    "what sector is {t} in",
+    "compare {t} and spy",
+    "what does {t} do",
+]
+PHRASINGS = [
+    "{q}?",
+    "{q}",
+    "Please tell me {q}",
+    "hey, quick one: {q}?",
+    "Can you tell me {q}?",
+]
+
+# Questions that look alike but must never share an answer.
+DISTINCT_PAIRS = [
+    ("Should I buy TSLA?", "Can I buy TSLA?"),
+    ("Would TSLA be a good buy?", "Could TSLA be a good buy?"),
+    ("What is the price of AAPL?", "What was the price of AAPL?"),
+    ("What is the price of AAPL?", "What is the price of MSFT?"),
+]
+
+
+def _phrase(rng: random.Random, question: str) -> str:
+    if question.startswith("what is ") and rng.random() < 0.2:
+        return f"What's {question[len('what is '):]}?"
+    return rng.choice(PHRASINGS).format(q=question)
+
+
+def _stream(n_questions: int, n_tickers: int) -> list[str]:
+    rng = random.Random(17)
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    weights = [1 / (rank + 1) for rank in range(len(TEMPLATES) * n_tickers)]
+    pairs = [(template, ticker) for ticker in tickers for template in TEMPLATES]
+    rng.shuffle(pairs)
+    chosen = rng.choices(pairs, weights=weights, k=n_questions)
+    return [_phrase(rng, template.format(t=ticker)) for template, ticker in chosen]
+
+
+def replay(questions: list[str], answer_seconds: float, maxsize: int, near: bool | None):
+    from services.chat_cache import ChatCache
+
+    cache = None if near is None else ChatCache(maxsize=maxsize, ttl=3600, near_duplicates=near)
+    model_seconds = 0.0
+    for question in questions:
+        if cache is not None and cache.get(question, "system", "fake") is not None:
+            continue
+        model_seconds += answer_seconds
+        if cache is not None:
+            cache.set(question, "system", "fake", f"answer to {question}", answer_seconds)
+    return cache, model_seconds
+
+
+def check_distinct() -> None:
+    from services.chat_cache import ChatCache
+
+    for first, second in DISTINCT_PAIRS:
+        for cached, asked in ((first, second), (second, first)):
+            cache = ChatCache(maxsize=16, ttl=3600, near_duplicates=True)
+            cache.set(cached, "system", "fake", f"answer to {cached}", 1.0)
+            assert cache.get(asked, "system", "fake") is None, f"{asked!r} was served the answer to {cached!r}"
+
+
+def lookup_cost_us(questions: list[str], near: bool, maxsize: int) -> tuple[float, float]:
+    """Microseconds per hit and per miss on a warm cache."""
+    from services.chat_cache import ChatCache
+
+    cache = ChatCache(maxsize=maxsize, ttl=3600, near_duplicates=near)
+    for question in questions:
+        cache.set(question, "system", "fake", "answer", 1.0)
+    hits = questions[: min(2000, len(questions))]
+    misses = [f"{question} for ZZZ{i}" for i, question in enumerate(hits)]
+    timings = []
+    for batch in (hits, misses):
+        started = time.perf_counter()
+        for question in batch:
+            cache.get(question, "system", "fake")
+        timings.append((time.perf_counter() - started) / len(batch) * 1e6)
+    return timings[0], timings[1]
+
+
+async def end_to_end(args: argparse.Namespace) -> list[tuple[str, float]]:
+    os.environ.update(
+        CHATBOT_BACKEND="fake",
+        CHATBOT_FAKE_FIRST_TOKEN_MS=str(args.first_token_ms),
+        CHATBOT_FAKE_TOKEN_MS=str(args.token_ms),
+        CHATBOT_FAKE_TOKENS=str(args.tokens),
+        CHATBOT_CACHE_NEAR_DUPLICATES="1",
+    )
+    os.environ.pop("CHATBOT_CACHE_PATH", None)
+
+    import httpx
+    from fastapi import FastAPI
+
+    from routes import chatbot
+
+    app = FastAPI()
+    app.include_router(chatbot.router, prefix="/chatbot")
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as http:
+        for label, question in (
+            ("miss", "What is the P/E of AAPL?"),
+            ("exact hit", "what is the p/e of aapl"),
+            ("near hit", "Please tell me the P/E of AAPL, thanks"),
+            ("miss (ticker)", "What is the P/E of MSFT?"),
+        ):
+            started = time.perf_counter()
+            response = await http.post("/chatbot/query", json={"question": question})
+            response.raise_for_status()
+            results.append((label, (time.perf_counter() - started) * 1000))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=5_000)
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--cache-size", type=int, default=1_000)
+    parser.add_argument("--first-token-ms", type=int, default=400)
+    parser.add_argument("--token-ms", type=int, default=15)
+    parser.add_argument("--tokens", type=int, default=60)
+    args = parser.parse_args()
+
+    check_distinct()
+    answer_seconds = (args.first_token_ms + args.token_ms * (args.tokens - 1)) / 1000
+    questions = _stream(args.questions, args.tickers)
+    print(
+        f"{args.questions} questions, {len(TEMPLATES)} templates x {args.tickers} tickers, "
+        f"{len(set(questions))} distinct strings, cache size {args.cache_size}, "
+        f"{answer_seconds * 1000:.0f} ms per generated answer"
+    )
+    print(f"{'cache':>14} {'hit rate':>9} {'near hits':>10} {'model time s':>13} {'saved':>7}")
+    baseline = None
+    for name, near in (("none", None), ("exact", False), ("exact + near", True)):
+        cache, model_seconds = replay(questions, answer_seconds, args.cache_size, near)
+        baseline = baseline or model_seconds
+        stats = cache.stats() if cache else {"hit_rate": 0.0, "near_hits": 0}
+        print(
+            f"{name:>14} {stats['hit_rate']:>9.1%} {stats['near_hits']:>10} {model_seconds:>13,.1f} "
+            f"{1 - model_seconds / baseline:>7.1%}"
+        )
+
+    print(f"\n{'lookup':>14} {'hit us':>9} {'miss us':>9}")
+    for name, near in (("exact", False), ("exact + near", True)):
+        hit_us, miss_us = lookup_cost_us(sorted(set(questions)), near, max(args.cache_size, len(set(questions))))
+        print(f"{name:>14} {hit_us:>9.1f} {miss_us:>9.1f}")
+
+    print("\nend to end over /chatbot/query (fake backend)")
+    for label, ms in asyncio.run(end_to_end(args)):
+        print(f"{label:>14} {ms:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Chatbot latency, event-loop stalls and overload behaviour on the fake backend.
+
+Everything runs in-process against `CHATBOT_BACKEND=fake`, a local model
+stand-in with a fixed time to first token and per-token delay. No network
+is involved. Three measurements:
+
+1. Event-loop lag while N questions are in flight. A heartbeat task sleeps
+   10 ms in a loop and records how late it wakes. "blocking" rebuilds the old
+   route, which called the model synchronously inside `async def`; "async" is
+   the current `/chatbot/query`.
+2. Time to first token over `/chatbot/stream` vs waiting for the whole answer.
+3. An overload burst larger than the concurrency limit plus queue: how many
+   requests get 200 vs 503, and the latency of the ones served.
+
+    python -m benchmarks.bench_chatbot
+    python -m benchmarks.bench_chatbot --questions 20 --burst 300 --concurrency 8
+
+Run from `apps/api`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+QUESTION = {"question": "How did AAPL trade today?"}
+
+
+def _configure(args: argparse.Namespace) -> None:
+    # The limiter reads these at import time.
+    os.environ.update(
+        CHATBOT_BACKEND="fake",
+        CHATBOT_FAKE_FIRST_TOKEN_MS=str(args.first_token_ms),
+        CHATBOT_FAKE_TOKEN_MS=str(args.token_ms),
+        CHATBOT_FAKE_TOKENS=str(args.tokens),
+        CHATBOT_MAX_CONCURRENCY=str(args.concurrency),
+        CHATBOT_MAX_QUEUE=str(args.queue),
+        CHATBOT_QUEUE_TIMEOUT_SECONDS=str(args.queue_timeout),
+    )
+
+
+def _blocking_router(args: argparse.Namespace):
+    from fastapi import APIRouter
+
+    router = APIRouter()
+    answer_seconds = (args.first_token_ms + args.token_ms * (args.tokens - 1)) / 1000
+
+    @router.post("/query")
+    async def query_chatbot(payload: dict):
+        # What the old route did: a synchronous model call inside async def.
+        time.sleep(answer_seconds)
+        return {"answer": "blocking"}
+
+    return router
+
+
+def _app(router):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    app.include_router(router, prefix="/chatbot")
+    return app
+
+
+def _ms(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+async def _loop_lag(app, n_questions: int) -> tuple[float, float, float]:
+    """Return (wall seconds, p99 lag ms, max lag ms) for n concurrent questions."""
+    import httpx
+
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def heartbeat() -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(max(time.perf_counter() - started - 0.01, 0))
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.05)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(http.post("/chatbot/query", json=QUESTION) for _ in range(n_questions)))
+        wall = time.perf_counter() - started
+    done.set()
+    await beat
+    return wall, _ms(lags, 0.99), max(lags) * 1000
+
+
+async def _first_token() -> tuple[float, float]:
+    """Time to the first streamed chunk vs the whole answer, through the service."""
+    from services.chatbot import chat_limiter, generate
+
+    await chat_limiter.acquire()
+    try:
+        started = time.perf_counter()
+        first = None
+        async for _ in generate(QUESTION["question"]):
+            if first is None:
+                first = time.perf_counter() - started
+        total = time.perf_counter() - started
+    finally:
+        chat_limiter.release()
+    return first * 1000, total * 1000
+
+
+async def _burst(app, n_requests: int) -> tuple[int, int, list[float]]:
+    import httpx
+
+    latencies: list[float] = []
+    served = rejected = 0
+
+    async def one(http) -> None:
+        nonlocal served, rejected
+        started = time.perf_counter()
+        response = await http.post("/chatbot/query", json=QUESTION)
+        if response.status_code == 200:
+            served += 1
+            latencies.append(time.perf_counter() - started)
+        elif response.status_code == 503:
+            rejected += 1
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as http:
+        await asyncio.gather(*(one(http) for _ in range(n_requests)))
+    return served, rejected, latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    _configure(args)
+    from routes import chatbot
+
+    answer_ms = args.first_token_ms + args.token_ms * (args.tokens - 1)
+    print(
+        f"fake model: {args.first_token_ms} ms to first token, {args.tokens} tokens "
+        f"{args.token_ms} ms apart (~{answer_ms} ms per answer)"
+    )
+
+    print(f"\n{args.questions} concurrent questions")
+    print(f"{'route':>9} {'wall s':>7} {'loop lag p99 ms':>16} {'max ms':>8}")
+    for name, router in (("blocking", _blocking_router(args)), ("async", chatbot.router)):
+        wall, p99, worst = await _loop_lag(_app(router), args.questions)
+        print(f"{name:>9} {wall:>7.2f} {p99:>16.1f} {worst:>8.1f}")
+
+    first, total = await _first_token()
+    print(f"\nstreamed: first token after {first:.0f} ms, full answer after {total:.0f} ms")
+
+    served, rejected, latencies = await _burst(_app(chatbot.router), args.burst)
+    print(
+        f"\nburst of {args.burst} with concurrency {args.concurrency}, queue {args.queue}, "
+        f"queue timeout {args.queue_timeout:g}s"
+    )
+    print(f"  served {served}, rejected 503 {rejected}")
+    if latencies:
+        print(
+            f"  served latency p50 {_ms(latencies, 0.5):.0f} ms, p95 {_ms(latencies, 0.95):.0f} ms, "
+            f"mean {statistics.mean(latencies) * 1000:.0f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--queue", type=int, default=32)
+    parser.add_argument("--queue-timeout", type=float, default=2.0)
+    parser.add_argument("--first-token-ms", type=int, default=400)
+    parser.add_argument("--token-ms", type=int, default=15)
+    parser.add_argument("--tokens", type=int, default=60)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Measure API cold start: module import time and time until the first 200.
+
+Each run spawns a fresh interpreter, so nothing is shared between samples.
+Run from `apps/api`:
+
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --runs 5 --ready
+
+`--ready` additionally waits for `/health/ready`, which needs a reachable
+Finnhub stream (or no FINNHUB_API_KEY, in which case streaming is disabled).
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def measure_import() -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=API_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if resp.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} did not return 200 in time")
+
+
+def measure_first_200(wait_ready: bool, timeout: float) -> tuple[float, float | None]:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + timeout
+        first_200 = wait_for(f"http://127.0.0.1:{port}/health/health", deadline) - started
+        ready = None
+        if wait_ready:
+            ready = wait_for(f"http://127.0.0.1:{port}/health/ready", deadline) - started
+        return first_200, ready
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def summarize(label: str, samples: list[float]) -> None:
+    print(
+        f"{label:<22} median {statistics.median(samples) * 1000:8.1f} ms"
+        f"   min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--ready", action="store_true", help="also time /health/ready")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite:///./cold_start_bench.db")
+
+    imports = [measure_import() for _ in range(args.runs)]
+    servers = [measure_first_200(args.ready, args.timeout) for _ in range(args.runs)]
+
+    summarize("import main", imports)
+    summarize("spawn -> first 200", [first for first, _ in servers])
+    if args.ready:
+        summarize("spawn -> ready", [ready for _, ready in servers if ready is not None])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Price fan-out throughput: encode-once frames vs per-client JSON encoding.
+
+Simulates N subscribers on one symbol and pushes trades through
+`FinnhubStreamManager`, draining every client queue into a no-op sink. The
+"per-client json" column replays the old path, where each client's
+`send_json` re-serialized the same dict.
+
+Run from `apps/api`:
+
+    python -m benchmarks.bench_fanout
+    python -m benchmarks.bench_fanout --clients 100 1000 --trades 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+
+from services.live_prices import FinnhubStreamManager
+from services.stream_wire import orjson
+
+# Trades per burst; stays below the 100-item client queue so nothing is dropped.
+BURST = 50
+
+
+async def _noop_command(payload) -> None:
+    return None
+
+
+async def encode_once(n_clients: int, n_trades: int) -> float:
+    manager = FinnhubStreamManager()
+    manager._send_command = _noop_command
+    sessions = []
+    for _ in range(n_clients):
+        session = await manager.register_client()
+        await manager.subscribe(session.handle, ["TSLA"])
+        sessions.append(session)
+
+    started = time.perf_counter()
+    for offset in range(0, n_trades, BURST):
+        for i in range(offset, min(offset + BURST, n_trades)):
+            await manager._broadcast_trade("TSLA", 250.0 + i * 0.01, 1_700_000_000_000 + i, 3.0)
+        for session in sessions:
+            while session.queue:
+                frame = session.pop()
+                len(frame)  # the websocket would write these bytes as-is
+    return time.perf_counter() - started
+
+
+async def per_client_json(n_clients: int, n_trades: int) -> float:
+    queues = [asyncio.Queue(maxsize=100) for _ in range(n_clients)]
+
+    started = time.perf_counter()
+    for offset in range(0, n_trades, BURST):
+        for i in range(offset, min(offset + BURST, n_trades)):
+            event = {
+                "type": "trade",
+                "symbol": "TSLA",
+                "price": 250.0 + i * 0.01,
+                "volume": 3.0,
+                "timestamp": 1_700_000_000_000 + i,
+                "source": "finnhub",
+            }
+            for queue in list(queues):
+                queue.put_nowait(event)
+        for queue in queues:
+            while not queue.empty():
+                json.dumps(queue.get_nowait())
+    return time.perf_counter() - started
+
+
+async def run(sizes: list[int], n_trades: int) -> None:
+    encoder = "orjson" if orjson is not None else "json"
+    print(f"encode-once encoder: {encoder}; {n_trades} trades per run")
+    print(f"{'clients':>8} {'per-client json msg/s':>22} {'encode-once msg/s':>18} {'speedup':>8}")
+    for n_clients in sizes:
+        deliveries = n_clients * n_trades
+        legacy = await per_client_json(n_clients, n_trades)
+        current = await encode_once(n_clients, n_trades)
+        print(
+            f"{n_clients:>8} {deliveries / legacy:>22,.0f} {deliveries / current:>18,.0f} "
+            f"{legacy / current:>7.1f}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--trades", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.trades))
+
+
+if __name__ == "__main__":
+    main()
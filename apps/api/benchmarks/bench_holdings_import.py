@@ -0,0 +1,156 @@
+"""
+Rows/sec loading a brokerage export: one POST per lot vs the bulk endpoints.
+
+Generates N lots over a few hundred symbols and loads them for a fresh user
+three ways, in-process through httpx's ASGI transport:
+
+- `single`: one `POST /holdings/` per lot (a request and a transaction each).
+- `import csv` / `import ndjson`: one streamed `POST /holdings/import?mode=append`.
+- `upsert`: `POST /holdings/import` in the default upsert mode, run twice so
+  the second pass updates every position instead of inserting it.
+
+Each bulk import is then read back through `GET /holdings/export`.
+
+Defaults to a throwaway SQLite file; pass `--database-url` for Postgres.
+
+    python -m benchmarks.bench_holdings_import
+    python -m benchmarks.bench_holdings_import --rows 50000 --single-rows 2000
+
+Run from `apps/api`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+
+def _configure_database(url: str | None) -> str:
+    if url is None:
+        url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench_import.db'}"
+    # Must be set before the db modules create their engines.
+    os.environ["DATABASE_URL"] = url
+    return url
+
+
+def _lots(n_rows: int) -> list[dict]:
+    rng = random.Random(5)
+    return [
+        {
+            "symbol": f"SYM{rng.randrange(300)}",
+            "quantity": rng.randint(1, 500),
+            "avg_cost": round(rng.uniform(5, 900), 2),
+        }
+        for _ in range(n_rows)
+    ]
+
+
+def _csv(lots: list[dict]) -> bytes:
+    lines = ["symbol,quantity,avg_cost"] + [f"{l['symbol']},{l['quantity']},{l['avg_cost']}" for l in lots]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _ndjson(lots: list[dict]) -> bytes:
+    return "".join(json.dumps(lot) + "\n" for lot in lots).encode()
+
+
+async def _chunks(payload: bytes, size: int = 64 * 1024):
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+
+async def run(args: argparse.Namespace) -> None:
+    url = _configure_database(args.database_url)
+
+    import httpx
+    from fastapi import FastAPI
+
+    from db.async_session import async_engine
+    from db.base import Base
+    from routes import holdings
+
+    async with async_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    app = FastAPI()
+    app.include_router(holdings.router, prefix="/holdings")
+    lots = _lots(args.rows)
+    print(f"{url.split('://')[0]}: {args.rows} lots over {len({l['symbol'] for l in lots})} symbols")
+    print(f"{'method':>14} {'rows':>8} {'seconds':>8} {'rows/s':>10} {'export rows/s':>14}")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+
+        async def export(user_id: str, expected: int) -> str:
+            started = time.perf_counter()
+            response = await http.get("/holdings/export", params={"user_id": user_id, "format": "ndjson"})
+            rows = response.text.count("\n")
+            assert rows == expected, (rows, expected)
+            return f"{rows / (time.perf_counter() - started):,.0f}"
+
+        user_id = str(uuid.uuid4())
+        single = lots[: args.single_rows]
+        started = time.perf_counter()
+        for lot in single:
+            response = await http.post("/holdings/", params={"user_id": user_id}, json=lot)
+            response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        print(f"{'single':>14} {len(single):>8} {elapsed:>8.2f} {len(single) / elapsed:>10,.0f} {'':>14}")
+
+        for name, payload, content_type in (
+            ("import csv", _csv(lots), "text/csv"),
+            ("import ndjson", _ndjson(lots), "application/x-ndjson"),
+        ):
+            user_id = str(uuid.uuid4())
+            started = time.perf_counter()
+            response = await http.post(
+                "/holdings/import",
+                params={"user_id": user_id, "mode": "append"},
+                content=_chunks(payload),
+                headers={"content-type": content_type},
+            )
+            response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            print(
+                f"{name:>14} {args.rows:>8} {elapsed:>8.2f} {args.rows / elapsed:>10,.0f} "
+                f"{await export(user_id, args.rows):>14}"
+            )
+
+        user_id = str(uuid.uuid4())
+        payload = _csv(lots)
+        for name in ("upsert insert", "upsert update"):
+            started = time.perf_counter()
+            response = await http.post(
+                "/holdings/import",
+                params={"user_id": user_id},
+                content=_chunks(payload),
+                headers={"content-type": "text/csv"},
+            )
+            response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            result = response.json()
+            print(
+                f"{name:>14} {args.rows:>8} {elapsed:>8.2f} {args.rows / elapsed:>10,.0f} "
+                f"{await export(user_id, result['inserted'] + result['updated']):>14}"
+            )
+
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--single-rows", type=int, default=1_000, help="lots loaded one POST at a time")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
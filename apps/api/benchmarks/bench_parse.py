@@ -0,0 +1,135 @@
+"""
+Parse cost of a full-history Alpha Vantage TIME_SERIES_DAILY payload, from
+raw response bytes to closes the analytics engine can align.
+
+- `legacy`: `json.loads`, then `strptime` and `float` per day into a list of
+  `(date, close)` tuples. Reading the bars back as `{"date", "close"}` dicts
+  and turning those into engine columns came on top of that.
+- `columnar`: `finnhub_client.parse_daily_series`, which turns the bytes
+  straight into int64 epoch days and float64 closes.
+
+Each path is timed with and without a `since` cutoff (the incremental refresh
+case, where only the last few bars are kept). The table reports best-of-N
+wall time and the peak traced allocation during one parse.
+
+    python -m benchmarks.bench_parse
+    python -m benchmarks.bench_parse --years 5 20 30 --repeat 10
+
+Run from `apps/api`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from services.analytics import _history_columns
+from services.daily_series import epoch_day
+from services.finnhub_client import parse_daily_series
+
+
+def make_payload(years: int, seed: int = 3) -> bytes:
+    """A TIME_SERIES_DAILY body with one bar per weekday, newest first, as served."""
+    rng = np.random.default_rng(seed)
+    end = date(2026, 10, 16)
+    days = [end - timedelta(days=i) for i in range(years * 365)]
+    days = [day for day in days if day.weekday() < 5]
+    closes = 100 * np.cumprod(1 + rng.normal(0.0003, 0.02, len(days)))
+    series = {}
+    for day, close in zip(days, closes):
+        series[day.isoformat()] = {
+            "1. open": f"{close * 0.99:.4f}",
+            "2. high": f"{close * 1.01:.4f}",
+            "3. low": f"{close * 0.98:.4f}",
+            "4. close": f"{close:.4f}",
+            "5. volume": str(int(rng.integers(1_000_000, 50_000_000))),
+        }
+    body = {
+        "Meta Data": {
+            "1. Information": "Daily Prices (open, high, low, close) and Volumes",
+            "2. Symbol": "BENCH",
+            "3. Last Refreshed": end.isoformat(),
+            "4. Output Size": "Full size",
+            "5. Time Zone": "US/Eastern",
+        },
+        "Time Series (Daily)": series,
+    }
+    return json.dumps(body, indent=4).encode()
+
+
+def legacy_parse(payload: bytes, since: date | None) -> List[Tuple[date, float]]:
+    """The parser `_download_daily_bars` used before columnar parsing."""
+    data = json.loads(payload)
+    result = []
+    for date_str, day_data in data["Time Series (Daily)"].items():
+        date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+        if since is None or date_obj > since:
+            result.append((date_obj, float(day_data["4. close"])))
+    return result
+
+
+def legacy_columns(payload: bytes, since: date | None):
+    """Legacy parse plus the dict bars and engine columns the read path built."""
+    bars = [{"date": day, "close": close} for day, close in sorted(legacy_parse(payload, since))]
+    return _history_columns(bars)
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Tuple[float, int]:
+    """(best wall seconds, peak traced bytes)."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[5, 20, 26])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--since-days", type=int, default=10, help="days kept by the incremental case")
+    args = parser.parse_args()
+
+    print(f"{'years':>5} {'bars':>6} {'payload':>9}  {'path':<24} {'ms':>8} {'peak MiB':>9}")
+    for years in args.years:
+        payload = make_payload(years)
+        since = date(2026, 10, 16) - timedelta(days=args.since_days)
+
+        # Both parsers must agree before their timings mean anything.
+        days, closes = parse_daily_series(payload)
+        expected = sorted(legacy_parse(payload, None))
+        assert days.tolist() == [epoch_day(day) for day, _ in expected]
+        assert closes.tolist() == [close for _, close in expected]
+        recent, _ = parse_daily_series(payload, since)
+        assert recent.tolist() == [epoch_day(day) for day, _ in sorted(legacy_parse(payload, since))]
+
+        cases = [
+            ("legacy", lambda: legacy_parse(payload, None)),
+            ("legacy + engine columns", lambda: legacy_columns(payload, None)),
+            ("columnar", lambda: parse_daily_series(payload)),
+            ("legacy, since", lambda: legacy_parse(payload, since)),
+            ("columnar, since", lambda: parse_daily_series(payload, since)),
+        ]
+        for name, fn in cases:
+            seconds, peak = measure(fn, args.repeat)
+            print(
+                f"{years:>5} {days.size:>6} {len(payload) / 2**20:>7.1f}Mi  {name:<24} "
+                f"{seconds * 1000:>8.2f} {peak / 2**20:>9.2f}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
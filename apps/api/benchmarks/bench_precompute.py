@@ -0,0 +1,144 @@
+"""
+End-of-day analytics precompute: throughput per worker-process count, and what
+it does to the first dashboard load of the day.
+
+Seeds a temporary database with `--users` portfolios of `--holdings` symbols
+each, drawn from a universe of `--symbols`, plus a year of synthetic closes
+per symbol in a temporary history store (marked fresh, so nothing goes
+upstream). Then:
+
+- `on demand`: first `/portfolio/analytics` load for a sample of users with a
+  cold cache, i.e. what every user paid before precompute.
+- `precompute`: one `AnalyticsPrecompute.run(refresh=False)` per process
+  count. It reports users/s over the whole user base.
+- `after precompute`: the same first loads once the job has run.
+
+    python -m benchmarks.bench_precompute
+    python -m benchmarks.bench_precompute --users 20000 --processes 1 2 4 8
+
+Run from `apps/api`. Process scaling needs as many cores as processes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+
+def _configure(args: argparse.Namespace) -> None:
+    # Must be set before the db, history and cache modules are imported.
+    root = Path(tempfile.mkdtemp())
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{root / 'bench_precompute.db'}",
+        HISTORY_CACHE_PATH=str(root / "history.sqlite3"),
+        ANALYTICS_BENCHMARK_SYMBOL="SPY",
+        ANALYTICS_CACHE_SIZE=str(args.users),
+        ANALYTICS_PRECOMPUTE_ENABLED="0",
+    )
+
+
+def _seed(args: argparse.Namespace) -> list[str]:
+    from sqlalchemy import insert
+
+    from benchmarks.bench_analytics_cache import seed_bars
+    from db.base import Base
+    from db.session import engine
+    from models.holding import Holding
+    from models.holdings_version import HoldingsVersion  # noqa: F401  (read by the job)
+
+    Base.metadata.create_all(engine)
+    universe = [f"SYM{i:04d}" for i in range(args.symbols)]
+    seed_bars(universe + ["SPY"])
+
+    rng = random.Random(5)
+    users = [uuid.uuid4() for _ in range(args.users)]
+    rows = [
+        {"id": uuid.uuid4(), "user_id": user_id, "symbol": symbol, "quantity": rng.randint(1, 200), "avg_cost": 100.0}
+        for user_id in users
+        for symbol in rng.sample(universe, args.holdings)
+    ]
+    with engine.begin() as connection:
+        for start in range(0, len(rows), 20_000):
+            connection.execute(insert(Holding), rows[start:start + 20_000])
+    return [str(user_id) for user_id in users]
+
+
+async def _first_loads(http, user_ids: list[str]) -> list[float]:
+    samples = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        response = await http.get("/portfolio/analytics", params={"user_id": user_id})
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def run(args: argparse.Namespace) -> None:
+    _configure(args)
+    started = time.perf_counter()
+    user_ids = _seed(args)
+    seeded = time.perf_counter() - started
+
+    import httpx
+    from fastapi import FastAPI
+
+    from routes import portfolio
+    from services.analytics_cache import analytics_cache
+    from services.analytics_precompute import AnalyticsPrecompute
+
+    app = FastAPI()
+    app.include_router(portfolio.router, prefix="/portfolio")
+    sample = random.Random(1).sample(user_ids, min(args.sample, len(user_ids)))
+    print(
+        f"{args.users} users x {args.holdings} holdings from {args.symbols} symbols "
+        f"(seeded in {seeded:.1f}s), {os.cpu_count()} CPUs"
+    )
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as http:
+        analytics_cache.clear()
+        on_demand = await _first_loads(http, sample)
+        print(
+            f"\non demand: first load p50 {statistics.median(on_demand):.1f} ms, "
+            f"~{statistics.median(on_demand) * args.users / 1000:.0f}s of request-path work for all users"
+        )
+
+        print(f"\n{'processes':>10} {'seconds':>9} {'users/s':>9} {'cached':>8}")
+        for processes in args.processes:
+            analytics_cache.clear()
+            job = AnalyticsPrecompute()
+            job.processes, job.batch_size = processes, args.batch_size
+            result = await job.run("bench", refresh=False)
+            assert result["phase"] == "done", result
+            print(
+                f"{processes:>10} {result['compute_seconds']:>9.2f} "
+                f"{result['users_per_second']:>9,.0f} {result['users_cached']:>8}"
+            )
+
+        after = await _first_loads(http, sample)
+        print(
+            f"\nafter precompute: first load p50 {statistics.median(after):.2f} ms "
+            f"({statistics.median(on_demand) / statistics.median(after):.0f}x faster)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--holdings", type=int, default=15)
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--sample", type=int, default=50, help="users whose first load is timed")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
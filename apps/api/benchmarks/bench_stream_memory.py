@@ -0,0 +1,119 @@
+"""
+Memory held per price-stream connection and per subscription.
+
+Registers N clients on a `FinnhubStreamManager` and subscribes each to K
+symbols drawn from a fixed universe, measuring traced allocations with
+`tracemalloc`. Symbols arrive through `json.loads` like a real subscribe
+message, so every client starts with its own string objects. The "legacy"
+rows rebuild the old layout: a dataclass session with a UUID id, a set of
+symbols, an `asyncio.Queue` and an `asyncio.Event`, indexed by UUID sets.
+
+Run from `apps/api`:
+
+    python -m benchmarks.bench_stream_memory
+    python -m benchmarks.bench_stream_memory --clients 100000 --symbols 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import tracemalloc
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Set
+
+from services.live_prices import FinnhubStreamManager
+
+UNIVERSE = [f"SYM{i:04d}" for i in range(2_000)]
+
+
+@dataclass
+class LegacySession:
+    id: str
+    symbols: Set[str] = field(default_factory=set)
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=100))
+    conflate_ms: int = 0
+    pending: Dict = field(default_factory=dict)
+    pending_event: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class LegacyIndex:
+    def __init__(self) -> None:
+        self.clients: Dict[str, LegacySession] = {}
+        self.symbol_clients: Dict[str, Set[str]] = defaultdict(set)
+
+    def register(self) -> str:
+        client_id = str(uuid.uuid4())
+        self.clients[client_id] = LegacySession(id=client_id)
+        return client_id
+
+    def subscribe(self, client_id: str, symbols) -> None:
+        session = self.clients[client_id]
+        for raw_symbol in symbols:
+            symbol = raw_symbol.upper().strip()
+            session.symbols.add(symbol)
+            self.symbol_clients[symbol].add(client_id)
+
+
+def _messages(n_clients: int, per_client: int) -> list[bytes]:
+    rng = random.Random(7)
+    return [
+        json.dumps({"action": "subscribe", "symbols": rng.sample(UNIVERSE, per_client)}).encode()
+        for _ in range(n_clients)
+    ]
+
+
+async def measure_current(n_clients: int, messages: list[bytes]) -> tuple[int, int]:
+    manager = FinnhubStreamManager()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    sessions = [await manager.register_client() for _ in range(n_clients)]
+    connected = tracemalloc.get_traced_memory()[0]
+    for session, message in zip(sessions, messages):
+        await manager.subscribe(session.handle, json.loads(message)["symbols"])
+    subscribed = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return connected - base, subscribed - connected
+
+
+async def measure_legacy(n_clients: int, messages: list[bytes]) -> tuple[int, int]:
+    index = LegacyIndex()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    client_ids = [index.register() for _ in range(n_clients)]
+    connected = tracemalloc.get_traced_memory()[0]
+    for client_id, message in zip(client_ids, messages):
+        index.subscribe(client_id, json.loads(message)["symbols"])
+    subscribed = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return connected - base, subscribed - connected
+
+
+async def run(sizes: list[int], per_client: int) -> None:
+    print(f"{per_client} subscriptions per client, {len(UNIVERSE)}-symbol universe")
+    print(f"{'clients':>8} {'layout':>8} {'B/connection':>13} {'B/subscription':>15} {'total MiB':>10}")
+    for n_clients in sizes:
+        messages = _messages(n_clients, per_client)
+        for name, measure in (("legacy", measure_legacy), ("current", measure_current)):
+            connections, subscriptions = await measure(n_clients, messages)
+            total = (connections + subscriptions) / 2**20
+            print(
+                f"{n_clients:>8} {name:>8} {connections / n_clients:>13,.0f} "
+                f"{subscriptions / (n_clients * per_client):>15,.0f} {total:>10,.1f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--symbols", type=int, default=10, help="subscriptions per client")
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.symbols))
+
+
+if __name__ == "__main__":
+    main()
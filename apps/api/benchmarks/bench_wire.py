@@ -0,0 +1,79 @@
+"""
+Bytes per trade and encode cost for each `/stream/prices` wire format.
+
+Encodes a synthetic tape (random-walk prices over a few dozen symbols) with
+every available format, then runs the same frames through permessage-deflate
+as browsers negotiate it by default (raw DEFLATE, shared context across
+messages, sync flush per message, trailing 00 00 ff ff stripped per RFC 7692).
+
+Run from `apps/api`:
+
+    python -m benchmarks.bench_wire
+    python -m benchmarks.bench_wire --trades 200000 --symbols 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import zlib
+
+from services.stream_wire import WireEncoder, available_encodings, orjson
+
+
+def _tape(n_trades: int, n_symbols: int) -> list[tuple[str, float, float | None, int]]:
+    rng = random.Random(11)
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    prices = {symbol: rng.uniform(5, 900) for symbol in symbols}
+    timestamp = 1_700_000_000_000
+    tape = []
+    for _ in range(n_trades):
+        symbol = rng.choice(symbols)
+        prices[symbol] = round(prices[symbol] * (1 + rng.gauss(0, 0.0005)), 2)
+        timestamp += rng.randint(0, 40)
+        volume = float(rng.choice((1, 5, 10, 100, 250))) if rng.random() > 0.05 else None
+        tape.append((symbol, prices[symbol], volume, timestamp))
+    return tape
+
+
+def _deflated_size(frames: list[bytes]) -> int:
+    compressor = zlib.compressobj(wbits=-15)
+    total = 0
+    for frame in frames:
+        total += len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+
+def run(n_trades: int, n_symbols: int) -> None:
+    tape = _tape(n_trades, n_symbols)
+    print(f"{n_trades} trades over {n_symbols} symbols; json encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'format':>8} {'bytes/trade':>12} {'deflated':>9} {'encode us/trade':>16} {'vs json':>8}")
+    baseline = None
+    for encoding in available_encodings():
+        wire = WireEncoder()
+        wire.time_base = tape[0][3]
+        started = time.perf_counter()
+        frames = [wire.trade(encoding, *trade) for trade in tape]
+        elapsed = time.perf_counter() - started
+
+        payloads = [frame.encode() if isinstance(frame, str) else frame for frame in frames]
+        raw = sum(map(len, payloads)) / n_trades
+        deflated = _deflated_size(payloads) / n_trades
+        baseline = baseline or raw
+        print(
+            f"{encoding:>8} {raw:>12.1f} {deflated:>9.1f} {elapsed / n_trades * 1e6:>16.2f} "
+            f"{baseline / raw:>7.1f}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=100_000)
+    parser.add_argument("--symbols", type=int, default=50)
+    args = parser.parse_args()
+    run(args.trades, args.symbols)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Batch writes, keyset-paged reads and the per-user version for holdings. Writes issue a handful of
+set-based statements (executemany for inserts and updates) inside the
+caller's transaction; committing is left to the route.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.holding import Holding
+from models.holdings_version import HoldingsVersion
+
+# Keep IN (...) lists well under driver parameter limits.
+DELETE_CHUNK = 1_000
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE.
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+async def insert_lots(db: AsyncSession, user_id: UUID, rows: Iterable[Tuple[str, float, float]]) -> int:
+    """Insert every row as its own lot."""
+    params = [
+        {"id": uuid.uuid4(), "user_id": user_id, "symbol": symbol, "quantity": quantity, "avg_cost": avg_cost}
+        for symbol, quantity, avg_cost in rows
+    ]
+    if params:
+        await db.execute(insert(Holding), params)
+    return len(params)
+
+
+async def upsert_positions(
+    db: AsyncSession, user_id: UUID, positions: Dict[str, Tuple[float, float]]
+) -> Dict[str, int]:
+    """
+    Make each symbol's holding equal `(quantity, avg_cost)`: update the user's
+    existing row for it, or insert one. Extra lots of an upserted symbol are
+    deleted so the symbol ends up as a single row.
+    """
+    existing = await db.execute(
+        select(Holding.id, Holding.symbol).where(Holding.user_id == user_id)
+    )
+    keep: Dict[str, UUID] = {}
+    extra = []
+    for holding_id, symbol in existing:
+        if symbol not in positions:
+            continue
+        if symbol in keep:
+            extra.append(holding_id)
+        else:
+            keep[symbol] = holding_id
+
+    updates = [
+        {"id": keep[symbol], "quantity": quantity, "avg_cost": avg_cost}
+        for symbol, (quantity, avg_cost) in positions.items()
+        if symbol in keep
+    ]
+    inserts = [
+        (symbol, quantity, avg_cost)
+        for symbol, (quantity, avg_cost) in positions.items()
+        if symbol not in keep
+    ]
+
+    if updates:
+        # ORM bulk UPDATE by primary key: one executemany.
+        await db.execute(update(Holding), updates)
+    inserted = await insert_lots(db, user_id, inserts)
+    for start in range(0, len(extra), DELETE_CHUNK):
+        await db.execute(delete(Holding).where(Holding.id.in_(extra[start:start + DELETE_CHUNK])))
+
+    return {"inserted": inserted, "updated": len(updates), "deleted": len(extra)}
+
+
+def encode_cursor(holding: Holding) -> str:
+    """Opaque cursor pointing just after `holding` in (symbol, id) order."""
+    raw = json.dumps([holding.symbol, str(holding.id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, UUID]:
+    """Inverse of `encode_cursor`; raises ValueError for anything malformed."""
+    try:
+        symbol, holding_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(symbol), UUID(holding_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+async def list_page(
+    db: AsyncSession, user_id: UUID, limit: int, after: Optional[Tuple[str, UUID]] = None
+) -> List[Holding]:
+    """
+    Up to `limit` holdings in (symbol, id) order, starting after the `after`
+    key. Served from the (user_id, symbol) index, so a deep page costs the
+    same as the first one, unlike OFFSET.
+    """
+    query = select(Holding).where(Holding.user_id == user_id)
+    if after is not None:
+        symbol, holding_id = after
+        query = query.where(
+            or_(Holding.symbol > symbol, and_(Holding.symbol == symbol, Holding.id > holding_id))
+        )
+    result = await db.scalars(query.order_by(Holding.symbol, Holding.id).limit(limit))
+    return list(result.all())
+
+
+async def positions(db: AsyncSession, user_id: UUID) -> Dict[str, float]:
+    """Total quantity per symbol, with lots of the same symbol merged."""
+    result = await db.execute(select(Holding.symbol, Holding.quantity).where(Holding.user_id == user_id))
+    totals: Dict[str, float] = {}
+    for symbol, quantity in result:
+        symbol = symbol.upper().strip()
+        totals[symbol] = totals.get(symbol, 0) + quantity
+    return totals
+
+
+async def lots(db: AsyncSession, user_id: UUID) -> List[Tuple[str, float, float]]:
+    """Every lot as `(symbol, quantity, avg_cost)`, in no particular order."""
+    result = await db.execute(
+        select(Holding.symbol, Holding.quantity, Holding.avg_cost).where(Holding.user_id == user_id)
+    )
+    return [(symbol, quantity, avg_cost) for symbol, quantity, avg_cost in result]
+
+
+async def holdings_version(db: AsyncSession, user_id: UUID) -> int:
+    """The user's current holdings version; 0 before their first write."""
+    version = await db.scalar(select(HoldingsVersion.version).where(HoldingsVersion.user_id == user_id))
+    return version or 0
+
+
+async def bump_version(db: AsyncSession, user_id: UUID) -> None:
+    """
+    Mark the user's holdings as changed. Call inside the write's transaction,
+    so the new version becomes visible exactly when the new holdings do.
+    """
+    make_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if make_insert is not None:
+        statement = make_insert(HoldingsVersion).values(user_id=user_id, version=1)
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[HoldingsVersion.user_id],
+                set_={"version": HoldingsVersion.version + 1},
+            )
+        )
+        return
+    result = await db.execute(
+        update(HoldingsVersion)
+        .where(HoldingsVersion.user_id == user_id)
+        .values(version=HoldingsVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        await db.execute(insert(HoldingsVersion).values(user_id=user_id, version=1))
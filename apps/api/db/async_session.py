@@ -0,0 +1,82 @@
+"""
+Async engine and session factory for request handlers.
+
+Uses the same `DATABASE_URL` as `db.session`, switched to an async driver
+(`postgresql://` -> asyncpg, `sqlite://` -> aiosqlite). Pool behaviour is
+tunable from the environment:
+
+    DB_POOL_SIZE=10                 connections kept open
+    DB_MAX_OVERFLOW=20              extra connections allowed under burst
+    DB_POOL_TIMEOUT_SECONDS=30      wait for a free connection before failing
+    DB_POOL_RECYCLE_SECONDS=1800    replace connections older than this
+    DB_POOL_PRE_PING=true           test a connection before handing it out
+    DB_STATEMENT_CACHE_SIZE=500     prepared statements cached per asyncpg connection
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+env_path = Path(__file__).resolve().parent.parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Swap a sync driver for its asyncio counterpart; async URLs pass through."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    parsed = make_url(url)
+    options: Dict[str, Any] = {
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite lives in a single connection; there is nothing to pool.
+        return options
+
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800")),
+    )
+    if parsed.get_dialect().driver == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500")),
+        }
+    return options
+
+
+def create_engine_from_url(url: str) -> AsyncEngine:
+    url = to_async_url(url)
+    return create_async_engine(url, **engine_options(url))
+
+
+ASYNC_DATABASE_URL = to_async_url(os.getenv("DATABASE_URL"))
+
+async_engine = create_engine_from_url(ASYNC_DATABASE_URL)
+# Loaded rows stay readable after commit, so handlers don't pay for a refresh.
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
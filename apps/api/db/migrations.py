@@ -0,0 +1,111 @@
+"""
+Schema changes for databases that already exist.
+
+The tables are managed outside the API (Supabase in production, a local file
+in development), so model changes such as new indexes are applied here. Each
+migration is idempotent and recorded in `schema_migrations`. Running the
+module again only applies what's missing. Run from `apps/api`:
+
+    python -m db.migrations            # apply pending migrations
+    python -m db.migrations --list     # show what's applied
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Callable, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+
+def _holdings_user_symbol_index(connection: Connection) -> None:
+    if connection.dialect.name == "postgresql":
+        # Build without locking writes; CONCURRENTLY can't run inside a transaction.
+        connection.execution_options(isolation_level="AUTOCOMMIT")
+        connection.execute(
+            text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_holdings_user_id_symbol "
+                "ON holdings (user_id, symbol)"
+            )
+        )
+    else:
+        connection.execute(
+            text("CREATE INDEX IF NOT EXISTS ix_holdings_user_id_symbol ON holdings (user_id, symbol)")
+        )
+
+
+def _holdings_versions_table(connection: Connection) -> None:
+    from models.holdings_version import HoldingsVersion
+
+    HoldingsVersion.__table__.create(connection, checkfirst=True)
+
+
+def _normalize_holding_symbols(connection: Connection) -> None:
+    # Rows written before symbols were normalized on every path; upserts match
+    # on the upper-case form. Bump the affected users' versions first so their
+    # cached analytics are recomputed from the merged lots.
+    connection.execute(
+        text(
+            "UPDATE holdings_versions SET version = version + 1 WHERE user_id IN "
+            "(SELECT user_id FROM holdings WHERE symbol <> UPPER(TRIM(symbol)))"
+        )
+    )
+    connection.execute(
+        text("UPDATE holdings SET symbol = UPPER(TRIM(symbol)) WHERE symbol <> UPPER(TRIM(symbol))")
+    )
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_holdings_user_id_symbol_index", _holdings_user_symbol_index),
+    ("0002_holdings_versions", _holdings_versions_table),
+    ("0003_normalize_holding_symbols", _normalize_holding_symbols),
+]
+
+
+def _applied(engine: Engine) -> set[str]:
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations "
+                "(name VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+            )
+        )
+        return {row[0] for row in connection.execute(text("SELECT name FROM schema_migrations"))}
+
+
+def migrate(engine: Engine) -> List[str]:
+    """Apply pending migrations in order and return their names."""
+    applied = _applied(engine)
+    ran = []
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+        with engine.connect() as connection:
+            migration(connection)
+            connection.commit()
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
+        ran.append(name)
+    return ran
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--list", action="store_true", help="list migrations and whether they're applied")
+    args = parser.parse_args()
+
+    from db.session import engine
+
+    if args.list:
+        applied = _applied(engine)
+        for name, _ in MIGRATIONS:
+            print(f"[{'x' if name in applied else ' '}] {name}")
+        return
+
+    ran = migrate(engine)
+    print("\n".join(f"applied {name}" for name in ran) or "nothing to apply")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from db.session import SessionLocal
+from db.async_session import AsyncSessionLocal
 from sqlalchemy.orm import Session
 from fastapi import Depends
 
@@ -8,3 +9,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,16 +1,21 @@
 # api/main.py
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from pathlib import Path
+
+# Load env variables before any module reads them at import time
+env_path = Path(__file__).resolve().parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
 from routes import portfolio
+from db.async_session import async_engine
+from services.analytics_precompute import analytics_precompute
 from services.live_prices import price_stream_manager
+from services.portfolio_stream import portfolio_stream_manager
+from services.rate_limiter import upstream_scheduler
+import asyncio
 import os
-import time
-time.sleep(12)  # Between requests
-# Load env variables
-env_path = Path(__file__).resolve().parent / ".env"
-load_dotenv(dotenv_path=env_path)
 
 app = FastAPI(title="Portfolio API")
 
@@ -32,6 +37,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browsers read the pagination cursor on GET /holdings.
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Routers
@@ -45,17 +52,40 @@ app.include_router(stream.router, prefix="/stream", tags=["Stream"])
 app.include_router(chatbot.router, prefix="/chatbot", tags=["Chatbot"])
 
 
+@app.on_event("startup")
+async def bind_upstream_scheduler():
+    # Worker-thread upstream calls queue on this loop for their rate-limit tokens.
+    upstream_scheduler.bind_loop(asyncio.get_running_loop())
+
+
 @app.on_event("startup")
 async def start_streaming():
     # Spawn the Finnhub stream bridge as soon as the API process is ready.
     await price_stream_manager.start()
+    await portfolio_stream_manager.start()
+
+
+@app.on_event("startup")
+async def schedule_analytics_precompute():
+    await analytics_precompute.start()
 
 
 @app.on_event("shutdown")
 async def stop_streaming():
+    await portfolio_stream_manager.stop()
     await price_stream_manager.stop()
 
 
+@app.on_event("shutdown")
+async def stop_analytics_precompute():
+    await analytics_precompute.stop()
+
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    await async_engine.dispose()
+
+
 
 
 # from fastapi import FastAPI, HTTPException
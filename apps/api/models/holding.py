@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, ForeignKey
+from sqlalchemy import Column, String, Float, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
@@ -11,3 +11,7 @@ class Holding(Base):
     quantity = Column(Float, nullable=False)
     avg_cost = Column(Float, nullable=False)
     user_id = Column(UUID(as_uuid=True), nullable=False)
+
+    # Every listing filters on user_id and pages in symbol order.
+    # Existing databases: `python -m db.migrations`.
+    __table_args__ = (Index("ix_holdings_user_id_symbol", "user_id", "symbol"),)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer
+from sqlalchemy.dialects.postgresql import UUID
+
+from db.base import Base
+
+
+class HoldingsVersion(Base):
+    """
+    Per-user counter bumped in the same transaction as every holdings write,
+    so results derived from a user's holdings can be cached by version.
+    """
+
+    __tablename__ = "holdings_versions"
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
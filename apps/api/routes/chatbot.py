@@ -1,10 +1,36 @@
+import json
+import time
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from services.chatbot import ChatbotConfigurationError, ask_gemini
+from services.chatbot import (
+    ChatbotBusyError,
+    ChatbotConfigurationError,
+    ChatbotTimeoutError,
+    ask,
+    cached_answer,
+    chat_limiter,
+    generate,
+    remember_answer,
+)
 
 router = APIRouter()
 
+SYSTEM_INSTRUCTION = (
+    "You are a helpful stock market assistant. "
+    "Answer concisely with relevant financial context. "
+    "If you are unsure, say you do not know."
+)
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+NO_ANSWER = (
+    "I couldn't find a clear answer. "
+    "Please try rephrasing your question or include more details."
+)
+
 
 class ChatbotRequest(BaseModel):
     question: str = Field(..., min_length=3, max_length=2000)
@@ -14,26 +40,80 @@ class ChatbotResponse(BaseModel):
     answer: str
 
 
+def _busy(exc: ChatbotBusyError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "5"})
+
+
 @router.post("/query", response_model=ChatbotResponse)
 async def query_chatbot(payload: ChatbotRequest) -> ChatbotResponse:
-    """Proxy the chat request to the Gemini API."""
+    """Proxy the chat request to the configured model and return the whole answer."""
     try:
-        answer = ask_gemini(
-            prompt=payload.question,
-            system_instruction=(
-                "You are a helpful stock market assistant. "
-                "Answer concisely with relevant financial context. "
-                "If you are unsure, say you do not know."
-            ),
-        )
-        if not answer:
-            answer = (
-                "I couldn't find a clear answer. "
-                "Please try rephrasing your question or include more details."
-            )
-        return ChatbotResponse(answer=answer)
+        answer = await ask(prompt=payload.question, system_instruction=SYSTEM_INSTRUCTION)
+        return ChatbotResponse(answer=answer or NO_ANSWER)
+    except ChatbotBusyError as exc:
+        raise _busy(exc) from exc
+    except ChatbotTimeoutError as exc:
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
     except ChatbotConfigurationError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     except Exception as exc:
         raise HTTPException(status_code=502, detail=str(exc)) from exc
 
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@router.post("/stream")
+async def stream_chatbot(payload: ChatbotRequest) -> StreamingResponse:
+    """
+    Stream the answer as server-sent events: `data: {"delta": ...}` per chunk,
+    then `event: done` with the full answer, or `event: error` if generation
+    fails midway. A 503 comes back before any events if no slot frees up.
+    Cached answers arrive as a single delta with `"cached": true` on `done`.
+    """
+    cached = await cached_answer(payload.question, SYSTEM_INSTRUCTION)
+    if cached is not None:
+
+        async def replay():
+            yield _sse({"delta": cached})
+            yield _sse({"answer": cached, "cached": True}, event="done")
+
+        return StreamingResponse(replay(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    async def events():
+        await chat_limiter.acquire()
+        # Released when the answer ends, fails, or the client disconnects.
+        try:
+            yield ": slot acquired\n\n"
+            parts = []
+            started = time.perf_counter()
+            try:
+                async for chunk in generate(payload.question, SYSTEM_INSTRUCTION):
+                    parts.append(chunk)
+                    yield _sse({"delta": chunk})
+                answer = "".join(parts).strip()
+                yield _sse({"answer": answer or NO_ANSWER}, event="done")
+                await remember_answer(
+                    payload.question, SYSTEM_INSTRUCTION, answer, time.perf_counter() - started
+                )
+            except Exception as exc:
+                yield _sse({"detail": str(exc)}, event="error")
+        finally:
+            chat_limiter.release()
+
+    # Start the generator here so queueing happens before the response status
+    # is sent, and so its `finally` runs even if the body is never read.
+    stream = events()
+    try:
+        opening = await stream.__anext__()
+    except ChatbotBusyError as exc:
+        raise _busy(exc) from exc
+
+    async def body():
+        yield opening
+        async for event in stream:
+            yield event
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers=SSE_HEADERS)
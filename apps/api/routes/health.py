@@ -1,5 +1,13 @@
 # api/api/routes/health.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+
+from services.analytics_cache import analytics_cache
+from services.analytics_precompute import analytics_precompute
+from services.chatbot import chat_cache, chat_limiter
+from services.live_prices import price_stream_manager
+from services.portfolio_stream import portfolio_stream_manager
+from services.rate_limiter import upstream_scheduler
+from services.singleflight import singleflight_stats
 
 router = APIRouter()
 
@@ -7,6 +15,30 @@ router = APIRouter()
 def health():
     return {"status": "ok"}
 
+@router.get("/ready")
+def ready(response: Response):
+    """Readiness probe: only report ready once the price stream is connected."""
+    if not price_stream_manager.streaming_enabled:
+        return {"status": "ready", "stream": "disabled"}
+    if price_stream_manager.is_connected:
+        return {"status": "ready", "stream": "connected"}
+    response.status_code = 503
+    return {"status": "starting", "stream": "connecting"}
+
+@router.get("/metrics")
+def metrics():
+    return {
+        "singleflight": singleflight_stats(),
+        "rate_limits": upstream_scheduler.stats(),
+        "stream_commands": price_stream_manager.command_stats(),
+        "stream_clients": price_stream_manager.client_stats(),
+        "portfolio_stream": portfolio_stream_manager.stats(),
+        "chatbot": chat_limiter.stats(),
+        "chatbot_cache": chat_cache.stats(),
+        "analytics_cache": analytics_cache.stats(),
+        "analytics_precompute": analytics_precompute.stats(),
+    }
+
 @router.get("/")
 def root():
     return {"message": "Welcome to the Portfolio API"}
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
 from uuid import UUID
+import time
+from crud.holding import bump_version, decode_cursor, encode_cursor, insert_lots, list_page, upsert_positions
+from db.async_session import AsyncSessionLocal
 from models.holding import Holding
-from deps import get_db
+from deps import get_async_db
+from services import holdings_io
+from services.portfolio_stream import portfolio_stream_manager
+from services.stream_wire import encode_event
 
 
 from schemas.holding import HoldingIn, HoldingOut
@@ -12,43 +20,201 @@ router = APIRouter()
 
 _DB: list[HoldingOut] = []
 
+IMPORT_MODES = ("upsert", "append")
+EXPORT_BATCH = 1_000
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1_000
+
+
+def _bulk_result(mode: str, received: int, counts: Dict[str, int], started: float) -> Dict[str, Any]:
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "received": received,
+        **counts,
+        "seconds": round(elapsed, 4),
+        "rows_per_second": round(received / elapsed) if elapsed else None,
+    }
+
+def _holding_json(holding: Holding) -> str:
+    # Same fields and order as HoldingOut.
+    return encode_event(
+        {
+            "symbol": holding.symbol,
+            "quantity": holding.quantity,
+            "avg_cost": holding.avg_cost,
+            "id": str(holding.id),
+            "user_id": str(holding.user_id),
+        }
+    )
+
+
+async def _stream_all(user_id: UUID):
+    """
+    The full listing as one JSON array, fetched in keyset batches. Each batch
+    checks a connection out only for its own query, so a slow reader never
+    pins a pooled connection.
+    """
+    yield "["
+    after = None
+    first = True
+    while True:
+        async with AsyncSessionLocal() as db:
+            batch = await list_page(db, user_id, EXPORT_BATCH, after)
+        if not batch:
+            break
+        body = ",".join(_holding_json(holding) for holding in batch)
+        yield body if first else "," + body
+        first = False
+        if len(batch) < EXPORT_BATCH:
+            break
+        after = (batch[-1].symbol, batch[-1].id)
+    yield "]"
+
+
 @router.get("/", response_model=List[HoldingOut])
-def list_holdings(user_id: UUID, db: Session = Depends(get_db)):
-    holdings = db.query(Holding).filter(Holding.user_id == user_id).all()
+async def list_holdings(
+    user_id: UUID,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """
+    Holdings in symbol order. Pass `limit` (and then the `X-Next-Cursor` header
+    value as `cursor`) to page through large accounts; without either the
+    whole list is streamed. Neither path takes a request-scoped session: the
+    stream opens one per batch and a page opens one for its single query.
+    """
+    if limit is None and cursor is None:
+        return StreamingResponse(_stream_all(user_id), media_type="application/json")
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = limit or DEFAULT_PAGE_SIZE
+    async with AsyncSessionLocal() as db:
+        holdings = await list_page(db, user_id, limit + 1, after)
+    if len(holdings) > limit:
+        holdings = holdings[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(holdings[-1])
     return holdings
 
 
 @router.post("/", response_model=HoldingOut)
-def create_holding(h: HoldingIn, user_id: UUID, db: Session = Depends(get_db)):
+async def create_holding(h: HoldingIn, user_id: UUID, db: AsyncSession = Depends(get_async_db)):
     new_holding = Holding(**h.model_dump(), user_id=user_id)
     db.add(new_holding)
-    db.commit()
-    db.refresh(new_holding)
+    await bump_version(db, user_id)
+    await db.commit()
+    portfolio_stream_manager.holdings_changed(user_id)
     return new_holding
 
+# Bulk routes are declared before "/{holding_id}" so their paths aren't read as IDs.
+@router.post("/import", response_model=dict)
+async def import_holdings(
+    request: Request,
+    user_id: UUID,
+    mode: str = "upsert",
+    format: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Load a CSV (`symbol,quantity,avg_cost` header) or NDJSON upload in one
+    transaction. `upsert` sets each symbol's position (lots in the file are
+    merged); `append` inserts every row as its own lot. Any invalid row rejects
+    the whole file.
+    """
+    fmt = holdings_io.detect_format(request.headers.get("content-type"), format)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson.")
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=400, detail="mode must be 'upsert' or 'append'.")
+
+    started = time.perf_counter()
+    try:
+        rows = await holdings_io.parse_rows(holdings_io.iter_lines(request.stream()), fmt)
+    except holdings_io.ImportErrors as exc:
+        raise HTTPException(status_code=422, detail={"valid_rows": exc.rows, "errors": exc.errors})
+
+    if mode == "append":
+        counts = {"inserted": await insert_lots(db, user_id, rows), "updated": 0, "deleted": 0}
+    else:
+        counts = await upsert_positions(db, user_id, holdings_io.merge_lots(rows))
+    await bump_version(db, user_id)
+    await db.commit()
+    portfolio_stream_manager.holdings_changed(user_id)
+    return _bulk_result(mode, len(rows), counts, started)
+
+
+@router.post("/batch", response_model=dict)
+async def batch_upsert_holdings(
+    items: List[HoldingIn], user_id: UUID, db: AsyncSession = Depends(get_async_db)
+):
+    """Upsert a JSON list of holdings by (user_id, symbol) in one transaction."""
+    started = time.perf_counter()
+    rows = [(h.symbol, h.quantity, h.avg_cost) for h in items]
+    counts = await upsert_positions(db, user_id, holdings_io.merge_lots(rows))
+    await bump_version(db, user_id)
+    await db.commit()
+    portfolio_stream_manager.holdings_changed(user_id)
+    return _bulk_result("upsert", len(rows), counts, started)
+
+
+@router.get("/export")
+async def export_holdings(user_id: UUID, format: str = "csv"):
+    """Stream every holding for a user as CSV or NDJSON."""
+    fmt = holdings_io.detect_format(None, format)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'.")
+
+    async def body():
+        yield holdings_io.export_header(fmt)
+        # The session lives as long as the response body, not the request handler.
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                select(Holding.id, Holding.symbol, Holding.quantity, Holding.avg_cost)
+                .where(Holding.user_id == user_id)
+                .execution_options(yield_per=EXPORT_BATCH)
+            )
+            async for rows in result.partitions():
+                yield holdings_io.encode_rows(fmt, rows)
+
+    return StreamingResponse(
+        body(),
+        media_type=holdings_io.CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="holdings.{fmt}"'},
+    )
+
 @router.delete("/{holding_id}", response_model=dict)
-def delete_holding(holding_id: UUID, db: Session = Depends(get_db)):
-    holding = db.query(Holding).filter(Holding.id == holding_id).first()
+async def delete_holding(holding_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    holding = await db.get(Holding, holding_id)
     if not holding:
         raise HTTPException(status_code=404, detail="Not found")
-    db.delete(holding)
-    db.commit()
+    user_id = holding.user_id
+    await db.delete(holding)
+    await bump_version(db, user_id)
+    await db.commit()
+    portfolio_stream_manager.holdings_changed(user_id)
     return {"status": "ok"}
 
 @router.get("/{holding_id}", response_model=HoldingOut)
-def get_holding(holding_id: UUID, db: Session = Depends(get_db)):
-    holding = db.query(Holding).filter(Holding.id == holding_id).first()
+async def get_holding(holding_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    holding = await db.get(Holding, holding_id)
     if not holding:
         raise HTTPException(status_code=404, detail="Not found")
     return holding
 
 @router.put("/{holding_id}", response_model=HoldingOut)
-def update_holding(holding_id: UUID, h: HoldingIn, db: Session = Depends(get_db)):
-    holding = db.query(Holding).filter(Holding.id == holding_id).first()
+async def update_holding(holding_id: UUID, h: HoldingIn, db: AsyncSession = Depends(get_async_db)):
+    holding = await db.get(Holding, holding_id)
     if not holding:
         raise HTTPException(status_code=404, detail="Not found")
     for key, value in h.model_dump().items():
         setattr(holding, key, value)
-    db.commit()
-    db.refresh(holding)
+    await bump_version(db, holding.user_id)
+    await db.commit()
+    portfolio_stream_manager.holdings_changed(holding.user_id)
     return holding
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Dict
-from services.finnhub_client import fetch_stock_history, get_unix_timestamp_days_ago
-from services.analytics import compute_portfolio_analytics
-import os
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import Dict, Optional
+from uuid import UUID
+from crud.holding import holdings_version, positions
+from db.async_session import AsyncSessionLocal
+from services.finnhub_client import fetch_histories, get_unix_timestamp_days_ago
+from services.analytics import analytics_payload, last_bar_dates
+from services.analytics_cache import analytics_cache, cache_key, get_benchmark_symbol
+from services.analytics_precompute import analytics_precompute
 
 router = APIRouter()
 
@@ -24,53 +28,92 @@ USER_HOLDINGS = {
 
 }
 
+def _database_user(user_id: str) -> Optional[UUID]:
+    try:
+        return UUID(user_id)
+    except ValueError:
+        return None
+
+
+async def _version(uid: Optional[UUID]) -> int:
+    if uid is None:
+        return 0
+    async with AsyncSessionLocal() as db:
+        return await holdings_version(db, uid)
+
+
+async def _shares(uid: Optional[UUID], user_id: str) -> Dict[str, float]:
+    """Shares per symbol from the database, falling back to the mock data."""
+    if uid is not None:
+        async with AsyncSessionLocal() as db:
+            shares = await positions(db, uid)
+        if shares:
+            return shares
+    mock: Dict[str, float] = {}
+    for holding in USER_HOLDINGS.get(user_id, []):
+        symbol = holding["symbol"].upper()
+        mock[symbol] = mock.get(symbol, 0) + holding["shares"]
+    return mock
+
+
 @router.get("/analytics")
 async def get_analytics(user_id: str = Query(...)):
-    holdings = USER_HOLDINGS.get(user_id)
+    from_unix = get_unix_timestamp_days_ago(365)
+    to_unix = get_unix_timestamp_days_ago(0)
+    benchmark_symbol = get_benchmark_symbol()
 
-    if not holdings:
+    uid = _database_user(user_id)
+    key = cache_key(user_id, from_unix, benchmark_symbol)
+    version = await _version(uid)
+    cached = await analytics_cache.get(key, version)
+    if cached is not None:
+        return cached
+
+    # The version was read before the holdings. If a write lands in between,
+    # the newer holdings get cached under the older version and are simply
+    # recomputed next time, never the other way round.
+    shares = await _shares(uid, user_id)
+    if not shares:
         raise HTTPException(status_code=404, detail="User not found or no holdings")
 
-    from_unix = get_unix_timestamp_days_ago(365)
-    to_unix = get_unix_timestamp_days_ago(0)
+    # The benchmark rides along in the same batch, so it shares the cache and
+    # the concurrency cap with the holdings.
+    histories, errors = await fetch_histories(
+        list(shares) + [benchmark_symbol], from_unix, to_unix
+    )
+    for symbol, error in errors.items():
+        print(f"[ERROR] Failed to fetch history for {symbol}: {error}")
 
-    raw_data: Dict[str, List[Dict]] = {}
-
-    for holding in holdings:
-        try:
-            history = fetch_stock_history(holding["symbol"], from_unix, to_unix)
-            raw_data[holding["symbol"]] = [
-                {
-                    **day,
-                    "shares": holding["shares"],
-                    "value": day["close"] * holding["shares"]
-                }
-                for day in history
-            ]
-        except Exception as e:
-            print(f"[ERROR] Failed to fetch history for {holding['symbol']}: {e}")
-            raise HTTPException(status_code=500, detail=f"{holding['symbol']}: {str(e)}")
-
-
-    analytics = compute_portfolio_analytics(raw_data)
-
-    # Optionally inject placeholders to match frontend fields
-    analytics.update({
-        "sharpe_ratio_change": "+0.12",  # You can leave as static or calculate
-        "beta": 1.1,
-        "beta_change": "+0.03",
-        "volatility": 15.6,
-        "volatility_change": "-0.7",
-        "drawdown_change": "-1.5",
-        "expected_shortfall": 4.2,
-        "correlation_to_sp500": 0.88,
-        "information_ratio": 0.67,
-        "sector_exposure": [
-            {"name": "Technology", "percentage": 60},
-            {"name": "Consumer", "percentage": 25},
-            {"name": "Healthcare", "percentage": 15}
-        ]
-    })
+    if not any(symbol in histories for symbol in shares):
+        raise HTTPException(
+            status_code=500,
+            detail="; ".join(f"{symbol}: {error}" for symbol, error in errors.items()),
+        )
 
+    analytics = analytics_payload(histories, shares, benchmark_symbol, errors)
+    if not errors:
+        # Key the result to the bars it was computed from, not whatever the
+        # store holds by now.
+        last_bars = last_bar_dates(histories, list(shares) + [benchmark_symbol])
+        if last_bars is not None:
+            analytics_cache.set(key, version, last_bars, analytics)
 
     return analytics
+
+
+@router.get("/precompute")
+async def precompute_status():
+    """Schedule, progress of a running end-of-day precompute and the last run's timings."""
+    return analytics_precompute.stats()
+
+
+@router.post("/precompute", status_code=202)
+async def trigger_precompute(response: Response, refresh: bool = True):
+    """
+    Refresh bars and recompute every user's analytics now, in the background.
+    `refresh=false` only recomputes from the bars already stored. 409 while a
+    run is in progress.
+    """
+    if not analytics_precompute.trigger(refresh):
+        response.status_code = 409
+    return analytics_precompute.stats()
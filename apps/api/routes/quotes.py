@@ -1,32 +1,157 @@
 # api/api/routes/quotes.py
-from fastapi import APIRouter, HTTPException
-import finnhub
+from fastapi import APIRouter, HTTPException, Query
+from functools import lru_cache
+import asyncio
 import os
+import time
 
-from schemas.quote import QuoteOut, SearchResult
+from schemas.quote import BatchQuoteOut, QuoteOut, SearchResult
+from services.live_prices import price_stream_manager
+from services.rate_limiter import INTERACTIVE, upstream_scheduler
+from services.singleflight import SingleFlight
 
 router = APIRouter()
 
-finnhub_client = finnhub.Client(api_key=os.getenv("FINNHUB_API_KEY"))
+@lru_cache
+def get_finnhub_client():
+    # Built on first use so importing the router stays cheap.
+    import finnhub
+
+    return finnhub.Client(api_key=os.getenv("FINNHUB_API_KEY"))
+
+# Dashboards tend to load together, so identical lookups are coalesced and
+# briefly cached instead of each hitting Finnhub's rate limit.
+quote_flight = SingleFlight(
+    "finnhub.quote", ttl=float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "2")), maxsize=2048
+)
+search_flight = SingleFlight("finnhub.symbol_lookup", ttl=300, maxsize=1024)
+
+def _call_finnhub(method_name: str, *args, acquired: bool = False):
+    if not acquired:
+        upstream_scheduler.acquire_blocking("finnhub", INTERACTIVE)
+    try:
+        return getattr(get_finnhub_client(), method_name)(*args)
+    except Exception as e:
+        if getattr(e, "status_code", None) == 429:
+            upstream_scheduler.penalize("finnhub", 1.0)
+        raise
+
+MAX_BATCH_SYMBOLS = 100
+PREVIOUS_CLOSE_MAX_AGE_SECONDS = 12 * 60 * 60
+
+# (previous close, fetched at) per symbol from the last REST quote, so prices
+# answered from the stream can still report the day's change.
+_previous_closes: dict[str, tuple[float, float]] = {}
+
+def _fetch_quote(symbol: str, acquired: bool = False) -> dict:
+    data = quote_flight.do(
+        ("quote", symbol), lambda: _call_finnhub("quote", symbol, acquired=acquired)
+    )
+    if data.get("pc"):
+        _previous_closes[symbol] = (data["pc"], time.time())
+    return {
+        "symbol": symbol,
+        "price": data.get("c"),
+        "day_change": data.get("d"),
+        "day_change_percent": data.get("dp"),
+    }
+
+def _unavailable(symbol: str) -> dict:
+    return {
+        "symbol": symbol,
+        "price": None,
+        "day_change": None,
+        "day_change_percent": None,
+        "source": "unavailable",
+    }
+
+async def _fetch_quote_batched(symbol: str) -> dict:
+    # Wait for the rate limiter on the event loop, so a worker thread is only
+    # taken for the HTTP call itself. A cached quote needs no token.
+    if ("quote", symbol) in quote_flight.cache:
+        return await asyncio.to_thread(_fetch_quote, symbol)
+    await upstream_scheduler.acquire("finnhub", INTERACTIVE)
+    return await asyncio.to_thread(_fetch_quote, symbol, True)
+
+def _quote_from_stream(symbol: str, max_age_ms: float) -> dict | None:
+    trade = price_stream_manager.last_trade(symbol)
+    if trade is None or time.time() * 1000 - trade.timestamp > max_age_ms:
+        return None
+    previous_close, fetched_at = _previous_closes.get(symbol, (None, 0.0))
+    if time.time() - fetched_at > PREVIOUS_CLOSE_MAX_AGE_SECONDS:
+        previous_close = None
+    day_change = trade.price - previous_close if previous_close else None
+    return {
+        "symbol": symbol,
+        "price": trade.price,
+        "day_change": day_change,
+        "day_change_percent": day_change / previous_close * 100 if previous_close else None,
+        "volume": trade.volume,
+        "timestamp": trade.timestamp,
+        "source": "stream",
+    }
 
 @router.get("/", response_model=QuoteOut)
 def get_quote(symbol: str):
     try:
-        data = finnhub_client.quote(symbol.upper())
-        return {
-            "symbol": symbol.upper(),
-            "price": data.get("c"),
-            "day_change": data.get("d"),
-            "day_change_percent": data.get("dp"),
-        }
+        return _fetch_quote(symbol.upper())
     except Exception as e:
         print("Finnhub quote error:", e)
         raise HTTPException(status_code=500, detail="Failed to fetch quote data")
 
+@router.get("/batch", response_model=list[BatchQuoteOut])
+async def get_quotes_batch(
+    symbols: str = Query(..., description="Comma-separated tickers, e.g. AAPL,MSFT"),
+):
+    """
+    Quotes for a whole watchlist in one request. Symbols with a fresh trade on
+    the live stream are answered from memory; only the rest go to Finnhub.
+
+    At most `QUOTE_BATCH_MAX_UPSTREAM` of those are looked up per request, and
+    only for `QUOTE_BATCH_TIMEOUT_SECONDS`. Anything left over comes back as
+    "unavailable" rather than holding the request behind the rate limit.
+    """
+    tickers = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    if len(tickers) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SYMBOLS} symbols per request")
+
+    max_age_ms = float(os.getenv("QUOTE_STREAM_MAX_AGE_SECONDS", "60")) * 1000
+    quotes = {ticker: _quote_from_stream(ticker, max_age_ms) for ticker in tickers}
+    missing = [ticker for ticker, quote in quotes.items() if quote is None]
+
+    max_upstream = int(os.getenv("QUOTE_BATCH_MAX_UPSTREAM", "10"))
+    budget = float(os.getenv("QUOTE_BATCH_TIMEOUT_SECONDS", "3"))
+    for ticker in missing[max_upstream:]:
+        quotes[ticker] = _unavailable(ticker)
+    missing = missing[:max_upstream]
+
+    # Finnhub has no multi-symbol quote endpoint; the remaining lookups run
+    # concurrently and still go through the coalescing cache and rate limiter.
+    tasks = {ticker: asyncio.create_task(_fetch_quote_batched(ticker)) for ticker in missing}
+    if tasks:
+        _, pending = await asyncio.wait(tasks.values(), timeout=budget)
+        for task in pending:
+            # Waiters cancelled in the limiter queue never take a token.
+            task.cancel()
+    for ticker, task in tasks.items():
+        if not task.done() or task.cancelled():
+            quotes[ticker] = _unavailable(ticker)
+        elif task.exception() is not None:
+            print(f"Finnhub quote error for {ticker}:", task.exception())
+            quotes[ticker] = _unavailable(ticker)
+        else:
+            quotes[ticker] = {**task.result(), "source": "rest"}
+
+    return [quotes[ticker] for ticker in tickers]
+
 @router.get("/search/{symbol}", response_model=list[SearchResult])
 def search_symbol(symbol: str):
     try:
-        data = finnhub_client.symbol_lookup(symbol)
+        data = search_flight.do(
+            ("symbol_lookup", symbol), lambda: _call_finnhub("symbol_lookup", symbol)
+        )
         return [
             {"symbol": item["symbol"], "description": item["description"]}
             for item in data.get("result", [])[:1]
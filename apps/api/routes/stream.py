@@ -11,11 +11,13 @@ from __future__ import annotations
 
 import asyncio
 from typing import Any
-from uuid import uuid4
+from uuid import UUID
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from services.live_prices import get_finnhub_ws_url, price_stream_manager
+from services.live_prices import price_stream_manager
+from services.portfolio_stream import portfolio_stream_manager
+from services.stream_wire import BINARY, JSON, available_encodings
 
 router = APIRouter()
 
@@ -25,11 +27,14 @@ async def price_stream(websocket: WebSocket) -> None:
     """
     Accept a dashboard client, keep it wired to the stream manager, and translate
     `subscribe`/`unsubscribe` messages into Finnhub subscriptions.
+
+    Trade frames are JSON unless the client connects with `?encoding=msgpack`
+    or `?encoding=binary`; the `ready` message confirms the choice.
     """
 
     await websocket.accept()
 
-    if not get_finnhub_ws_url():
+    if not price_stream_manager.streaming_enabled:
         await websocket.send_json(
             {
                 "type": "error",
@@ -38,18 +43,51 @@ async def price_stream(websocket: WebSocket) -> None:
         )
         await websocket.close()
         return
-    client_id = str(uuid4())
-    await price_stream_manager.register_client(client_id)
+    encoding = websocket.query_params.get("encoding", JSON)
+    if encoding not in available_encodings():
+        await websocket.send_json(
+            {
+                "type": "error",
+                "message": f"Unsupported encoding {encoding!r}. Use one of: {', '.join(available_encodings())}.",
+            }
+        )
+        await websocket.close()
+        return
+
+    session = await price_stream_manager.register_client(encoding=encoding)
+    client_id = session.handle
 
     async def websocket_send(payload: dict[str, Any]) -> None:
         await websocket.send_json(payload)
 
-    sender_task = asyncio.create_task(
-        price_stream_manager.forward_client_messages(client_id, websocket_send)
-    )
+    async def send_frame(frame: str | bytes) -> None:
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+
+    async def forward() -> None:
+        # Trade frames arrive pre-encoded from the manager, so send them as-is.
+        reason = await price_stream_manager.forward_client_messages(client_id, send_frame)
+        if reason:
+            # Evicted as a slow consumer; its server-side state is already gone.
+            try:
+                await asyncio.wait_for(websocket.close(code=1013, reason=reason), timeout=5)
+            except Exception:
+                pass
+
+    sender_task = asyncio.create_task(forward())
 
     # Let the client know the server connection is up before we start reading.
-    await websocket_send({"type": "ready", "clientId": client_id})
+    ready: dict[str, Any] = {
+        "type": "ready",
+        "clientId": str(client_id),
+        "encoding": encoding,
+        "encodings": available_encodings(),
+    }
+    if encoding == BINARY:
+        ready["timeBase"] = price_stream_manager.wire.time_base
+    await websocket_send(ready)
 
     try:
         while True:
@@ -60,15 +98,40 @@ async def price_stream(websocket: WebSocket) -> None:
             if not isinstance(symbols, list):
                 symbols = []
 
+            # Optional per-client conflation interval, e.g. {"conflateMs": 250}.
+            if "conflateMs" in message:
+                await price_stream_manager.set_conflation(client_id, message["conflateMs"])
+            # What to do when this client falls behind: "drop-oldest", "latest" or "disconnect".
+            if "backpressure" in message:
+                policy = await price_stream_manager.set_backpressure(client_id, message["backpressure"])
+                if policy is None:
+                    await websocket_send(
+                        {
+                            "type": "error",
+                            "message": "Unknown backpressure policy. Use 'drop-oldest', 'latest' or 'disconnect'.",
+                        }
+                    )
+
             if action == "subscribe":
                 await price_stream_manager.subscribe(client_id, symbols)
+                # Catch up from the server's trade buffer: the last price, or
+                # everything after `since` (epoch ms) for a reconnecting client.
+                since = message.get("since")
+                if not isinstance(since, (int, float)) or isinstance(since, bool):
+                    since = None
+                await price_stream_manager.send_snapshot(
+                    client_id, symbols, int(since) if since is not None else None
+                )
             elif action == "unsubscribe":
                 await price_stream_manager.unsubscribe(client_id, symbols)
+            elif action == "configure":
+                # Options such as `conflateMs` and `backpressure` were applied above.
+                pass
             else:
                 await websocket_send(
                     {
                         "type": "error",
-                        "message": "Unknown action. Use 'subscribe' or 'unsubscribe'.",
+                        "message": "Unknown action. Use 'subscribe', 'unsubscribe' or 'configure'.",
                     }
                 )
     except WebSocketDisconnect:
@@ -81,3 +144,48 @@ async def price_stream(websocket: WebSocket) -> None:
         except asyncio.CancelledError:
             pass
         await price_stream_manager.unregister_client(client_id)
+
+
+@router.websocket("/portfolio")
+async def portfolio_stream(websocket: WebSocket, user_id: UUID) -> None:
+    """
+    Push a user's live portfolio value and P&L. The first message is a
+    `portfolio_snapshot` with every holding; after that `portfolio` messages
+    carry the running totals whenever a held symbol trades.
+    """
+
+    await websocket.accept()
+
+    if not price_stream_manager.streaming_enabled:
+        await websocket.send_json(
+            {
+                "type": "error",
+                "message": "Live streaming is disabled on the server (missing FINNHUB_API_KEY).",
+            }
+        )
+        await websocket.close()
+        return
+
+    key = str(user_id)
+    try:
+        session = await portfolio_stream_manager.watch(key)
+    except Exception as exc:
+        print(f"[portfolio_stream] failed to load holdings for {key}: {exc}")
+        await websocket.send_json({"type": "error", "message": "Failed to load holdings."})
+        await websocket.close()
+        return
+
+    sender_task = asyncio.create_task(portfolio_stream_manager.forward(session, websocket.send_text))
+    try:
+        # Nothing to act on from the client; just wait for it to go away.
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender_task.cancel()
+        try:
+            await sender_task
+        except asyncio.CancelledError:
+            pass
+        await portfolio_stream_manager.unwatch(key, session)
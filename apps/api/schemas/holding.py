@@ -1,11 +1,21 @@
 # api/schemas/holding.py
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from uuid import UUID
 
 class HoldingIn(BaseModel):
     symbol: str
     quantity: float
     avg_cost: float = Field(..., alias="avg_cost")
+
+    @field_validator("symbol")
+    @classmethod
+    def normalize_symbol(cls, value: str) -> str:
+        # Every write path stores the same form, so upserts match existing lots.
+        symbol = value.upper().strip()
+        if not symbol:
+            raise ValueError("symbol is required")
+        return symbol
+
     model_config = {
         "from_attributes": True,
         "populate_by_name": True,
@@ -8,6 +8,11 @@ class QuoteOut(BaseModel):
     day_change: float | None
     day_change_percent: float | None
 
+class BatchQuoteOut(QuoteOut):
+    volume: float | None = None
+    timestamp: int | None = None
+    source: str
+
 class SearchResult(BaseModel):
     symbol: str
     description: str
@@ -1,12 +1,26 @@
 # services/analytics.py
-from typing import List, Dict
-import pandas as pd
+from datetime import date
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple, Union
+import numpy as np
+
+from services.daily_series import DailySeries, epoch_day, last_day
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+TRADING_DAYS = 252
+
+# --- pandas path -----------------------------------------------------------
+# Kept for reference and for `benchmarks/bench_analytics.py`; the request path
+# uses the NumPy engine further down, so pandas is only imported here.
+
+def merge_portfolio_history(raw_data: Dict[str, List[Dict]]) -> "pd.Series":
+    import pandas as pd
 
-def merge_portfolio_history(raw_data: Dict[str, List[Dict]]) -> pd.Series:
     df_list = []
     for symbol, history in raw_data.items():
         df = pd.DataFrame(history)
-        
+
         # Convert to datetime if it's in UNIX timestamp
         df["date"] = pd.to_datetime(df["date"], unit="s", errors="coerce")
         df = df.set_index("date")[["value"]]
@@ -18,24 +32,24 @@ def merge_portfolio_history(raw_data: Dict[str, List[Dict]]) -> pd.Series:
     portfolio_series.name = "total_value"
     return portfolio_series
 
-def calculate_daily_returns(portfolio_series: pd.Series) -> pd.Series:
+def calculate_daily_returns(portfolio_series: "pd.Series") -> "pd.Series":
     return portfolio_series.pct_change().dropna()
 
-def calculate_sharpe_ratio(daily_returns: pd.Series, risk_free_rate=0.01):
+def calculate_sharpe_ratio(daily_returns: "pd.Series", risk_free_rate=0.01):
     excess_returns = daily_returns - (risk_free_rate / 252)
     sharpe = (excess_returns.mean() / excess_returns.std()) * (252 ** 0.5)
     return round(sharpe, 2)
 
-def calculate_var(daily_returns: pd.Series, confidence_level=0.05):
+def calculate_var(daily_returns: "pd.Series", confidence_level=0.05):
     var = daily_returns.quantile(confidence_level)
     return round(var * 100, 2)
 
-def calculate_max_drawdown(portfolio_series: pd.Series):
+def calculate_max_drawdown(portfolio_series: "pd.Series"):
     running_max = portfolio_series.cummax()
     drawdown = (portfolio_series - running_max) / running_max
     return round(drawdown.min() * 100, 2)
 
-def compute_portfolio_analytics(raw_data: Dict[str, List[Dict]]):
+def compute_portfolio_analytics_pandas(raw_data: Dict[str, List[Dict]]):
     portfolio_series = merge_portfolio_history(raw_data)
     daily_returns = calculate_daily_returns(portfolio_series)
 
@@ -44,3 +58,243 @@ def compute_portfolio_analytics(raw_data: Dict[str, List[Dict]]):
         "value_at_risk": f"{calculate_var(daily_returns)}%",
         "max_drawdown": f"{calculate_max_drawdown(portfolio_series)}%"
     }
+
+# --- NumPy engine ----------------------------------------------------------
+
+# Look-back used for the `*_change` deltas and for rolling volatility.
+CHANGE_PERIOD = 21
+VOLATILITY_WINDOW = 21
+
+def _round(value: float, digits: int = 2):
+    # NaN/inf would break JSON encoding; report them as missing instead.
+    return round(float(value), digits) if np.isfinite(value) else None
+
+def _percent(value: float, digits: int = 2):
+    """A ratio as the "-4.2%" string the dashboard shows, or None when missing."""
+    return f"{_round(value * 100, digits)}%" if np.isfinite(value) else None
+
+def _signed(value: float, digits: int = 2):
+    """Format a delta the way the dashboard shows it, e.g. "+0.12"."""
+    return f"{value:+.{digits}f}" if np.isfinite(value) else None
+
+# A history is a `DailySeries` (what the history store returns), or a list of
+# `{"date", "close"}` bars as the pandas path and its benchmark build them.
+History = Union[DailySeries, List[Dict]]
+
+def _history_columns(history: History) -> DailySeries:
+    if isinstance(history, tuple):
+        return history
+    days = np.fromiter((epoch_day(bar["date"]) for bar in history), dtype=np.int64, count=len(history))
+    closes = np.fromiter((bar["close"] for bar in history), dtype=np.float64, count=len(history))
+    return days, closes
+
+def align_price_matrix(histories: Dict[str, History]) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """
+    Align every symbol's closes onto one ascending date axis.
+
+    Returns `(days, symbols, closes)` where `days` holds epoch days, and
+    `closes` is a dense `len(days) x len(symbols)` float64 matrix with NaN
+    where a symbol has no bar for that day.
+    """
+    symbols = list(histories)
+    columns = [_history_columns(histories[symbol]) for symbol in symbols]
+    if not columns:
+        return np.empty(0, dtype=np.int64), symbols, np.empty((0, 0))
+
+    days = np.unique(np.concatenate([column_days for column_days, _ in columns]))
+    closes = np.full((days.size, len(symbols)), np.nan)
+    for column, (column_days, column_closes) in enumerate(columns):
+        closes[np.searchsorted(days, column_days), column] = column_closes
+    return days, symbols, closes
+
+def align_series_to(days: np.ndarray, history: History) -> np.ndarray:
+    """Closes of one series on the `days` axis, carrying the last bar forward over gaps."""
+    series_days, series_closes = _history_columns(history)
+    if not series_days.size:
+        return np.full(days.size, np.nan)
+    positions = np.searchsorted(series_days, days, side="right") - 1
+    return np.where(positions >= 0, series_closes[positions.clip(0)], np.nan)
+
+def portfolio_values(closes: np.ndarray, shares: np.ndarray) -> np.ndarray:
+    # Missing bars count as zero, matching the pandas path's fillna(0).
+    return np.nan_to_num(closes, nan=0.0) @ shares
+
+def simple_returns(values: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return values[1:] / values[:-1] - 1.0
+
+def _prefix_sums(rows: List[np.ndarray]) -> np.ndarray:
+    """Stack the given per-observation rows and prefix-sum them (with a leading 0)."""
+    stacked = np.vstack(rows)
+    prefix = np.zeros((stacked.shape[0], stacked.shape[1] + 1))
+    np.cumsum(stacked, axis=1, out=prefix[:, 1:])
+    return prefix
+
+def _window(prefix: np.ndarray, start: int, end: int) -> np.ndarray:
+    return prefix[:, end] - prefix[:, max(start, 0)]
+
+def _sample_var(n: float, total: float, total_sq: float) -> float:
+    return (total_sq - total * total / n) / (n - 1) if n > 1 else np.nan
+
+def _sharpe(window: np.ndarray, risk_free_rate: float) -> float:
+    n, total, total_sq = window
+    var = _sample_var(n, total, total_sq)
+    if not var > 0:
+        return np.nan
+    return (total / n - risk_free_rate / TRADING_DAYS) / var ** 0.5 * TRADING_DAYS ** 0.5
+
+def _volatility(window: np.ndarray) -> float:
+    var = _sample_var(*window)
+    return var ** 0.5 * TRADING_DAYS ** 0.5 if var >= 0 else np.nan
+
+def _relative(window: np.ndarray) -> Tuple[float, float, float]:
+    """Beta, correlation and information ratio from joint (portfolio, benchmark) sums."""
+    n, sum_p, sum_b, sum_pp, sum_bb, sum_pb = window
+    if n < 2:
+        return np.nan, np.nan, np.nan
+    var_p = _sample_var(n, sum_p, sum_pp)
+    var_b = _sample_var(n, sum_b, sum_bb)
+    cov = (sum_pb - sum_p * sum_b / n) / (n - 1)
+    var_active = var_p + var_b - 2 * cov
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = cov / var_b
+        correlation = cov / (var_p * var_b) ** 0.5
+        information_ratio = (sum_p - sum_b) / n / var_active ** 0.5 * TRADING_DAYS ** 0.5 if var_active > 0 else np.nan
+    return beta, correlation, information_ratio
+
+def _quantile_sorted(sorted_values: np.ndarray, q: float) -> float:
+    """Linear-interpolated quantile (numpy/pandas default) of an already sorted array."""
+    if not sorted_values.size:
+        return np.nan
+    position = q * (sorted_values.size - 1)
+    lower = int(position)
+    upper = min(lower + 1, sorted_values.size - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def compute_portfolio_analytics(
+    histories: Dict[str, History],
+    shares: Dict[str, float],
+    benchmark_history: History | None = None,
+    risk_free_rate: float = 0.01,
+    confidence_level: float = 0.05,
+):
+    """
+    Portfolio and benchmark-relative risk metrics from daily closes.
+
+    Prices are aligned into a single date x symbol matrix once. Every
+    mean/variance/covariance (current window, the window `CHANGE_PERIOD`
+    observations earlier, and rolling volatility) is read off one set of
+    prefix sums, VaR and CVaR share one sort, and drawdown deltas come from
+    the same running-max pass.
+    """
+    days, symbols, closes = align_price_matrix(histories)
+    share_vector = np.array([shares[symbol] for symbol in symbols], dtype=np.float64)
+
+    values = portfolio_values(closes, share_vector)
+    all_returns = simple_returns(values)
+    returns = all_returns[~np.isnan(all_returns)]
+    n = returns.size
+    previous_end = n - CHANGE_PERIOD
+
+    # Portfolio-only moments: Sharpe (full and prior window) and rolling volatility.
+    moments = _prefix_sums([np.ones(n), returns, returns * returns])
+    sharpe = _sharpe(_window(moments, 0, n), risk_free_rate)
+    volatility = _volatility(_window(moments, n - VOLATILITY_WINDOW, n))
+    if previous_end > 1:
+        previous_sharpe = _sharpe(_window(moments, 0, previous_end), risk_free_rate)
+        previous_volatility = _volatility(_window(moments, previous_end - VOLATILITY_WINDOW, previous_end))
+    else:
+        previous_sharpe = previous_volatility = np.nan
+
+    # Tail risk: one sort feeds both VaR and CVaR.
+    sorted_returns = np.sort(returns)
+    var = _quantile_sorted(sorted_returns, confidence_level)
+    tail = sorted_returns[: np.searchsorted(sorted_returns, var, side="right")]
+    expected_shortfall = tail.mean() if tail.size else np.nan
+
+    # Drawdown: running minimum of the drawdown curve gives every prefix window.
+    if values.size:
+        running_max = np.maximum.accumulate(values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drawdown = np.fmin.accumulate((values - running_max) / running_max)
+        max_drawdown = drawdown[-1]
+        previous_drawdown = drawdown[-1 - CHANGE_PERIOD] if values.size > CHANGE_PERIOD else np.nan
+    else:
+        max_drawdown = previous_drawdown = np.nan
+
+    beta = correlation = information_ratio = previous_beta = np.nan
+    if benchmark_history is not None and len(_history_columns(benchmark_history)[0]):
+        benchmark_returns = simple_returns(align_series_to(days, benchmark_history))
+        paired = np.isfinite(all_returns) & np.isfinite(benchmark_returns)
+        p = np.where(paired, all_returns, 0.0)
+        b = np.where(paired, benchmark_returns, 0.0)
+        joint = _prefix_sums([paired.astype(np.float64), p, b, p * p, b * b, p * b])
+        end = joint.shape[1] - 1
+        beta, correlation, information_ratio = _relative(_window(joint, 0, end))
+        if end - CHANGE_PERIOD > 1:
+            previous_beta = _relative(_window(joint, 0, end - CHANGE_PERIOD))[0]
+
+    last_values = np.nan_to_num(closes[-1], nan=0.0) * share_vector if values.size else share_vector * 0
+    total = last_values.sum()
+    weights = last_values / total if total else np.zeros_like(last_values)
+
+    return {
+        "sharpe_ratio": _round(sharpe),
+        "sharpe_ratio_change": _signed(sharpe - previous_sharpe),
+        "value_at_risk": _percent(var),
+        # Reported as a positive loss, like the placeholder the dashboard was built on.
+        "expected_shortfall": _round(-expected_shortfall * 100),
+        "max_drawdown": _percent(max_drawdown),
+        "drawdown_change": _signed((max_drawdown - previous_drawdown) * 100),
+        "volatility": _round(volatility * 100),
+        "volatility_change": _signed((volatility - previous_volatility) * 100),
+        "beta": _round(beta),
+        "beta_change": _signed(beta - previous_beta),
+        "correlation_to_sp500": _round(correlation),
+        "information_ratio": _round(information_ratio),
+        "weights": {symbol: _round(weight * 100) for symbol, weight in zip(symbols, weights)},
+    }
+
+
+def analytics_payload(
+    histories: Dict[str, History],
+    shares: Dict[str, float],
+    benchmark_symbol: str,
+    errors: Optional[Dict[str, str]] = None,
+) -> Dict:
+    """
+    The `/portfolio/analytics` body: analytics over the holdings that have a
+    history (at least one must), plus the benchmark and any fetch errors.
+    """
+    held_histories = {symbol: histories[symbol] for symbol in shares if symbol in histories}
+    analytics = compute_portfolio_analytics(
+        held_histories,
+        {symbol: shares[symbol] for symbol in held_histories},
+        benchmark_history=histories.get(benchmark_symbol),
+    )
+    analytics["benchmark_symbol"] = benchmark_symbol
+
+    # Optionally inject placeholders to match frontend fields
+    analytics.update({
+        "sector_exposure": [
+            {"name": "Technology", "percentage": 60},
+            {"name": "Consumer", "percentage": 25},
+            {"name": "Healthcare", "percentage": 15}
+        ]
+    })
+    if errors:
+        # Partial result: analytics cover only the symbols that loaded.
+        analytics["errors"] = errors
+    return analytics
+
+
+def last_bar_dates(histories: Dict[str, DailySeries], symbols: List[str]) -> Optional[Dict[str, date]]:
+    """Date of each symbol's last bar, or None if any of them has no bars."""
+    last_bars = {}
+    for symbol in symbols:
+        series = histories.get(symbol)
+        day = last_day(series) if series is not None else None
+        if day is None:
+            return None
+        last_bars[symbol] = day
+    return last_bars
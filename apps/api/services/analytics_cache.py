@@ -0,0 +1,234 @@
+"""
+Result cache for `/portfolio/analytics`.
+
+A result only depends on the user's holdings, the daily bars of those symbols
+(plus the benchmark) and the date window. Each user keeps their latest result
+together with what it was computed from:
+
+    (user_id, window start, benchmark)  ->  holdings version, last bar dates, result
+
+and it is served only while both still match. The holdings version is bumped
+in the same transaction as every holdings write (`crud.holding.bump_version`),
+so an edit always forces a recompute. The bar dates are compared against the
+history store, so once a symbol gains a bar, or is due for a refresh from
+upstream, the analytics are recomputed as well.
+
+Re-reading the bar dates on every hit would cost a query per request, so an
+entry also remembers the store's `data_version` and freshness deadline from
+its last check. While neither has moved, nothing was written to the store
+(by this process or any other) and the dates are known to be unchanged.
+
+Results precomputed after the close (`services.analytics_precompute`) go into
+the same cache. With ANALYTICS_STORE_PATH set they are also written to a
+SQLite file, and any process that misses in memory looks there before
+recomputing. That way one process can precompute for every API worker.
+
+    ANALYTICS_CACHE_SIZE=1000           results kept in memory (LRU; 0 disables the cache)
+    ANALYTICS_CACHE_TTL_SECONDS=86400   upper bound on an entry's lifetime
+    ANALYTICS_STORE_PATH=               SQLite file shared with the precompute job
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+from services.history_cache import get_history_max_age_seconds, get_history_store
+from services.singleflight import TTLCache
+
+# (user_id, window start, benchmark symbol)
+AnalyticsKey = Tuple[str, date, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_results (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    last_bars TEXT NOT NULL,
+    result TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def get_benchmark_symbol() -> str:
+    return os.getenv("ANALYTICS_BENCHMARK_SYMBOL", "SPY").upper()
+
+
+def cache_key(user_id: Any, from_unix: int, benchmark_symbol: str) -> AnalyticsKey:
+    """
+    Results are per user, window start (as a UTC date) and benchmark. Database
+    users are keyed by their canonical UUID, so the precompute job and a
+    request spelling the same id differently share one entry.
+    """
+    try:
+        user_id = str(UUID(str(user_id)))
+    except ValueError:
+        user_id = str(user_id)
+    return user_id, datetime.fromtimestamp(from_unix, timezone.utc).date(), benchmark_symbol
+
+
+def _stored_key(key: AnalyticsKey) -> str:
+    user_id, from_date, benchmark_symbol = key
+    return f"{user_id}|{from_date.isoformat()}|{benchmark_symbol}"
+
+
+class _Entry:
+    __slots__ = ("version", "last_bars", "result", "store_version", "fresh_until", "expires_at")
+
+    def __init__(self, version: int, last_bars: Dict[str, date], result: Dict[str, Any]) -> None:
+        self.version = version
+        self.last_bars = last_bars
+        self.result = result
+        # Not checked against the store yet; the first hit does that.
+        self.store_version: Optional[int] = None
+        self.fresh_until = 0.0
+        self.expires_at = 0.0
+
+
+class AnalyticsCache:
+    def __init__(self, maxsize: int, ttl: float, path: Optional[Path] = None) -> None:
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.path = path
+        self._schema_ready = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_versions = 0
+        self.stale_bars = 0
+        self.bar_checks = 0
+        self.store_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._entries.maxsize > 0 and self._entries.ttl > 0
+
+    async def get(self, key: AnalyticsKey, version: int) -> Optional[Dict[str, Any]]:
+        """The cached result if it was computed from `version` and the current bars."""
+        if not self.enabled:
+            return None
+        found, entry = self._entries.get(key)
+        if not found and self.path is not None:
+            entry = await asyncio.to_thread(self._read, key)
+            found = entry is not None
+            if found:
+                self._count(store_hits=1)
+                self._entries.set(key, entry, ttl=entry.expires_at - time.time())
+        if not found:
+            return self._count(misses=1)
+        if entry.version != version:
+            return self._count(misses=1, stale_versions=1)
+
+        store = get_history_store()
+        # A PRAGMA on the WAL-mode store never waits on writers; no thread hop needed.
+        store_version = store.data_version()
+        if store_version != entry.store_version or time.time() >= entry.fresh_until:
+            # Read the version first: a write landing during the query below
+            # then shows up as a changed version on the next request.
+            state = await asyncio.to_thread(
+                store.last_bar_dates, entry.last_bars, get_history_max_age_seconds()
+            )
+            self._count(bar_checks=1)
+            if state is None or state[0] != entry.last_bars:
+                return self._count(misses=1, stale_bars=1)
+            entry.store_version, entry.fresh_until = store_version, state[1]
+        self._count(hits=1)
+        return entry.result
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def set(self, key: AnalyticsKey, version: int, last_bars: Dict[str, date], result: Dict[str, Any]) -> None:
+        """Keep a result in this process's memory."""
+        if self.enabled:
+            self._entries.set(key, _Entry(version, last_bars, result))
+
+    def store(self, results: Iterable[Tuple[AnalyticsKey, int, Dict[str, date], Dict[str, Any]]]) -> int:
+        """
+        `set` a batch of results and, with a store path, write them to disk for
+        other processes. Blocking; call from a worker thread.
+        """
+        rows = []
+        expires_at = time.time() + self._entries.ttl
+        for key, version, last_bars, result in results:
+            self.set(key, version, last_bars, result)
+            rows.append((
+                _stored_key(key),
+                version,
+                json.dumps({symbol: day.isoformat() for symbol, day in last_bars.items()}),
+                json.dumps(result),
+                expires_at,
+            ))
+        if self.path is not None and rows and self.enabled:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM analytics_results WHERE expires_at <= ?", (time.time(),))
+                conn.executemany("INSERT OR REPLACE INTO analytics_results VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._schema_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _read(self, key: AnalyticsKey) -> Optional[_Entry]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT version, last_bars, result, expires_at FROM analytics_results "
+                "WHERE key = ? AND expires_at > ?",
+                (_stored_key(key), time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        version, last_bars, result, expires_at = row
+        entry = _Entry(
+            version,
+            {symbol: date.fromisoformat(day) for symbol, day in json.loads(last_bars).items()},
+            json.loads(result),
+        )
+        entry.expires_at = expires_at
+        return entry
+
+    def clear(self) -> None:
+        """Forget every result held in memory (the shared store is left alone)."""
+        self._entries = TTLCache(maxsize=self._entries.maxsize, ttl=self._entries.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_versions": self.stale_versions,
+            "stale_bars": self.stale_bars,
+            "bar_checks": self.bar_checks,
+            "store_hits": self.store_hits,
+            "persistent": self.path is not None,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def create_analytics_cache() -> AnalyticsCache:
+    path = os.getenv("ANALYTICS_STORE_PATH")
+    return AnalyticsCache(
+        maxsize=int(os.getenv("ANALYTICS_CACHE_SIZE", "1000")),
+        ttl=float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "86400")),
+        path=Path(path) if path else None,
+    )
+
+
+analytics_cache = create_analytics_cache()
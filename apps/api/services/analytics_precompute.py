@@ -0,0 +1,331 @@
+"""
+End-of-day precompute for `/portfolio/analytics`.
+
+Analytics only change when a new daily close arrives, so after the close
+`AnalyticsPrecompute`:
+
+1. refreshes the daily bars of every held symbol (plus the benchmark) once,
+   at background priority so interactive requests keep their rate limit;
+2. streams every user's holdings from the database and recomputes their
+   analytics in batches on a process pool, reading the bars from the history
+   store in each worker;
+3. puts the results in `analytics_cache`, keyed on each user's holdings
+   version and the bars used, so the next dashboard load is a cache hit.
+
+    ANALYTICS_PRECOMPUTE_ENABLED=0          run the job in this process
+    ANALYTICS_PRECOMPUTE_AT=20:15           New York time, Sunday to Thursday
+    ANALYTICS_PRECOMPUTE_PROCESSES=         worker processes (default: CPU count)
+    ANALYTICS_PRECOMPUTE_BATCH_SIZE=50      users per worker task
+
+The default time is late on purpose. The analytics window is based on the
+UTC date, which rolls over at 19:00 or 20:00 in New York. Results computed
+before that would be keyed to a window the next day's requests no longer use.
+For the same reason the job runs Sunday to Thursday evenings: those runs are
+keyed to Monday to Friday. Friday's close is picked up by the Sunday run, in
+time for Monday.
+
+Users from the mock `USER_HOLDINGS` in `routes/portfolio.py` are still
+computed on demand. The job is off by default. Enable it in one process
+only: each one would otherwise spawn its own pool and force-refresh every
+held symbol against the Alpha Vantage limit. With several API workers, set
+ANALYTICS_STORE_PATH so they all read its results.
+
+`GET /portfolio/precompute` reports progress and timings, and
+`POST /portfolio/precompute` starts a run immediately.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time as clock, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from services.analytics import analytics_payload, last_bar_dates
+from services.analytics_cache import analytics_cache, cache_key, get_benchmark_symbol
+from services.daily_series import DailySeries
+from services.history_cache import get_history_store
+from services.rate_limiter import BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+NEW_YORK = ZoneInfo("America/New_York")
+# Sunday to Thursday (`date.weekday()`): their evenings fall on the UTC dates
+# of Monday to Friday, the days whose dashboards the results are keyed to.
+RUN_DAYS = (6, 0, 1, 2, 3)
+
+# (user_id, holdings version, shares per symbol)
+Job = Tuple[str, int, Dict[str, float]]
+# (user_id, holdings version, result, last bar dates); result None when the
+# user's bars are incomplete and the request path should handle them.
+JobResult = Tuple[str, int, Optional[Dict[str, Any]], Optional[Dict[str, date]]]
+
+
+def get_precompute_time() -> clock:
+    hours, minutes = os.getenv("ANALYTICS_PRECOMPUTE_AT", "20:15").split(":")
+    return clock(int(hours), int(minutes))
+
+
+def next_run_after(now: datetime, at: clock) -> datetime:
+    """The first run day at `at` New York time strictly after `now`."""
+    local = now.astimezone(NEW_YORK)
+    candidate = datetime.combine(local.date(), at, tzinfo=NEW_YORK)
+    while candidate <= local or candidate.weekday() not in RUN_DAYS:
+        candidate = datetime.combine(candidate.date() + timedelta(days=1), at, tzinfo=NEW_YORK)
+    return candidate
+
+
+def compute_batch(jobs: List[Job], from_unix: int, to_unix: int, benchmark_symbol: str) -> List[JobResult]:
+    """
+    Worker-process entry point: analytics for a batch of users from the bars
+    already in the history store. Each symbol is read once per batch.
+    """
+    store = get_history_store()
+    from_date = datetime.fromtimestamp(from_unix, timezone.utc).date()
+    to_date = datetime.fromtimestamp(to_unix, timezone.utc).date()
+    histories: Dict[str, DailySeries] = {}
+
+    def history(symbol: str) -> DailySeries:
+        if symbol not in histories:
+            histories[symbol] = store.read_series(symbol, from_date, to_date)
+        return histories[symbol]
+
+    results: List[JobResult] = []
+    for user_id, version, shares in jobs:
+        symbols = list(shares) + [benchmark_symbol]
+        user_histories = {symbol: history(symbol) for symbol in symbols}
+        last_bars = last_bar_dates(user_histories, symbols)
+        if last_bars is None:
+            results.append((user_id, version, None, None))
+            continue
+        results.append((user_id, version, analytics_payload(user_histories, shares, benchmark_symbol), last_bars))
+    return results
+
+
+class AnalyticsPrecompute:
+    def __init__(self) -> None:
+        self.enabled = os.getenv("ANALYTICS_PRECOMPUTE_ENABLED", "0").strip().lower() in {"1", "true", "yes", "on"}
+        self.at = get_precompute_time()
+        self.processes = int(os.getenv("ANALYTICS_PRECOMPUTE_PROCESSES") or os.cpu_count() or 1)
+        self.batch_size = max(int(os.getenv("ANALYTICS_PRECOMPUTE_BATCH_SIZE", "50")), 1)
+        self.next_run_at: Optional[datetime] = None
+        self.current: Optional[Dict[str, Any]] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.runs = 0
+        self._schedule_task: Optional[asyncio.Task] = None
+        self._run_task: Optional[asyncio.Task] = None
+
+    # --- lifecycle ----------------------------------------------------------
+    async def start(self) -> None:
+        if self.enabled and (self._schedule_task is None or self._schedule_task.done()):
+            self._schedule_task = asyncio.create_task(self._schedule())
+
+    async def stop(self) -> None:
+        for task in (self._schedule_task, self._run_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    async def _schedule(self) -> None:
+        while True:
+            self.next_run_at = next_run_after(datetime.now(timezone.utc), self.at)
+            await asyncio.sleep(max((self.next_run_at - datetime.now(timezone.utc)).total_seconds(), 0))
+            if not self.running:
+                self._run_task = asyncio.create_task(self.run("schedule"))
+                await asyncio.shield(self._run_task)
+
+    @property
+    def running(self) -> bool:
+        return self._run_task is not None and not self._run_task.done()
+
+    def trigger(self, refresh: bool = True) -> bool:
+        """Start a run now in the background; False if one is already going."""
+        if self.running:
+            return False
+        self._run_task = asyncio.create_task(self.run("manual", refresh))
+        return True
+
+    # --- one run ------------------------------------------------------------
+    async def run(self, trigger: str = "manual", refresh: bool = True) -> Dict[str, Any]:
+        """
+        One full pass. `refresh=False` skips the upstream refresh and
+        recomputes from the bars already stored (e.g. after a manual warm).
+        """
+        # The Finnhub/AlphaVantage client is heavy; keep it out of the worker processes.
+        from services.finnhub_client import get_unix_timestamp_days_ago
+
+        started = time.perf_counter()
+        progress: Dict[str, Any] = {
+            "trigger": trigger,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "phase": "refreshing",
+            "symbols": 0,
+            "symbols_refreshed": 0,
+            "symbols_failed": {},
+            "users": 0,
+            "users_cached": 0,
+            "users_skipped": 0,
+            "batches": 0,
+            "batches_done": 0,
+        }
+        self.current = progress
+        try:
+            from_unix = get_unix_timestamp_days_ago(365)
+            to_unix = get_unix_timestamp_days_ago(0)
+            benchmark_symbol = get_benchmark_symbol()
+
+            symbols = sorted(set(await _held_symbols()) | {benchmark_symbol})
+            progress["symbols"] = len(symbols)
+            if refresh:
+                await self._refresh(symbols, progress)
+            progress["refresh_seconds"] = round(time.perf_counter() - started, 3)
+
+            progress["phase"] = "computing"
+            computing = time.perf_counter()
+            await self._compute(from_unix, to_unix, benchmark_symbol, progress)
+            progress["compute_seconds"] = round(time.perf_counter() - computing, 3)
+            progress["phase"] = "done"
+        except Exception as exc:
+            logger.exception("analytics precompute failed")
+            progress["phase"] = "failed"
+            progress["error"] = str(exc)
+        finally:
+            elapsed = time.perf_counter() - started
+            progress["seconds"] = round(elapsed, 3)
+            if progress.get("compute_seconds"):
+                progress["users_per_second"] = round(progress["users"] / progress["compute_seconds"], 1)
+            progress["finished_at"] = datetime.now(timezone.utc).isoformat()
+            self.runs += 1
+            self.last_run, self.current = progress, None
+            logger.info(
+                "analytics precompute %s: %d symbols, %d/%d users cached in %.1fs",
+                progress["phase"], progress["symbols"], progress["users_cached"], progress["users"], elapsed,
+            )
+        return progress
+
+    async def _refresh(self, symbols: List[str], progress: Dict[str, Any]) -> None:
+        from services.finnhub_client import get_history_fetch_concurrency, refresh_stock_history
+
+        # Force: bars fetched during the day still look fresh, but the close is new.
+        limit = asyncio.Semaphore(get_history_fetch_concurrency())
+
+        async def refresh(symbol: str) -> None:
+            async with limit:
+                try:
+                    await asyncio.to_thread(refresh_stock_history, symbol, True, BACKGROUND)
+                    progress["symbols_refreshed"] += 1
+                except Exception as exc:
+                    # Whatever is cached still gets used; the request path retries later.
+                    progress["symbols_failed"][symbol] = str(exc)
+
+        await asyncio.gather(*(refresh(symbol) for symbol in symbols))
+
+    async def _compute(self, from_unix: int, to_unix: int, benchmark_symbol: str, progress: Dict[str, Any]) -> None:
+        loop = asyncio.get_running_loop()
+        pending: set = set()
+        max_pending = self.processes * 2
+
+        async def collect(done) -> None:
+            for future in done:
+                results = await future
+                stored = [
+                    (cache_key(user_id, from_unix, benchmark_symbol), version, last_bars, result)
+                    for user_id, version, result, last_bars in results
+                    if result is not None
+                ]
+                await asyncio.to_thread(analytics_cache.store, stored)
+                progress["users_cached"] += len(stored)
+                progress["users_skipped"] += len(results) - len(stored)
+                progress["batches_done"] += 1
+
+        # Fresh interpreters rather than forks of a process full of threads and sockets.
+        pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            async for batch in _portfolio_batches(self.batch_size):
+                if len(pending) >= max_pending:
+                    # Bound what's queued so a large user base isn't all held in memory.
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    await collect(done)
+                pending.add(loop.run_in_executor(pool, compute_batch, batch, from_unix, to_unix, benchmark_symbol))
+                progress["users"] += len(batch)
+                progress["batches"] += 1
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                await collect(done)
+        finally:
+            # Joining the workers blocks, so keep it off the event loop.
+            await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "at": f"{self.at:%H:%M} America/New_York",
+            "processes": self.processes,
+            "batch_size": self.batch_size,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+            "running": self.running,
+            "runs": self.runs,
+            "current": self.current,
+            "last_run": self.last_run,
+        }
+
+
+async def _held_symbols() -> List[str]:
+    from sqlalchemy import select
+
+    from db.async_session import AsyncSessionLocal
+    from models.holding import Holding
+
+    async with AsyncSessionLocal() as db:
+        symbols = await db.scalars(select(Holding.symbol).distinct())
+        return [symbol.upper().strip() for symbol in symbols]
+
+
+async def _portfolio_batches(batch_size: int):
+    """
+    Every user's (version, shares) in batches, streamed in user order. All
+    versions are read before any holdings, so a write racing the job leaves
+    the result under an older version (recomputed on request), never newer.
+    """
+    from sqlalchemy import select
+
+    from db.async_session import AsyncSessionLocal
+    from models.holding import Holding
+    from models.holdings_version import HoldingsVersion
+
+    async with AsyncSessionLocal() as db:
+        versions: Dict[UUID, int] = dict((await db.execute(select(HoldingsVersion.user_id, HoldingsVersion.version))).all())
+        result = await db.stream(
+            select(Holding.user_id, Holding.symbol, Holding.quantity)
+            .order_by(Holding.user_id)
+            .execution_options(yield_per=5_000)
+        )
+        batch: List[Job] = []
+        user_id: Optional[UUID] = None
+        shares: Dict[str, float] = {}
+        async for owner, symbol, quantity in result:
+            if owner != user_id:
+                if user_id is not None:
+                    batch.append((str(user_id), versions.get(user_id, 0), shares))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                user_id, shares = owner, {}
+            symbol = symbol.upper().strip()
+            shares[symbol] = shares.get(symbol, 0) + quantity
+        if user_id is not None:
+            batch.append((str(user_id), versions.get(user_id, 0), shares))
+        if batch:
+            yield batch
+
+
+analytics_precompute = AnalyticsPrecompute()
@@ -0,0 +1,330 @@
+"""
+Answer cache for the chatbot.
+
+Answers are keyed on the normalized question, the system instruction and the
+model name, so changing `GEMINI_MODEL` or the prompt never serves stale
+answers. Entries live in an in-memory LRU with a TTL:
+
+    CHATBOT_CACHE_SIZE=1000            entries kept (0 disables the cache)
+    CHATBOT_CACHE_TTL_SECONDS=3600     how long an answer is reused
+    CHATBOT_CACHE_PATH=                SQLite file to persist answers across restarts
+    CHATBOT_CACHE_NEAR_DUPLICATES=0    also match reworded questions (see below)
+    CHATBOT_CACHE_SIMILARITY=0.8       minimum word-shingle Jaccard for a near match
+
+Near-duplicate lookup drops filler words ("what's", "the", "please", ...),
+shingles the remaining words in order, and keeps a MinHash signature of each
+cached question in an LSH band index. That way candidates are found without
+comparing against every entry. A candidate is only served when it has exactly
+the same non-filler words and its shingle similarity (word order) clears the
+threshold. "What is the P/E of AAPL?" can then reuse "what's the p/e of
+aapl", but never an answer about MSFT.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from services.singleflight import TTLCache
+
+# Words that can differ between two questions without changing what's asked.
+# Tense and time words ("was", "did", "today", "current") are not filler:
+# "what was the price" and "what is the current price" want different answers.
+# Nor are modal verbs: "should I buy TSLA" and "can I buy TSLA" differ.
+FILLER_WORDS = frozenset(
+    """
+    a an the is are be am
+    please pls tell me us i we you my our your what whats what's how hows how's
+    s about on for of to in at by with right just
+    hey hi hello thanks thank quick quickly explain give show know
+    """.split()
+)
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_answers (
+    key TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    generation_seconds REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def normalize(text: str) -> str:
+    """Lowercase, unify quotes, drop trailing punctuation and collapse whitespace."""
+    text = text.lower().replace("’", "'").replace("‘", "'")
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!. ")
+
+
+def _tokens(normalized: str) -> List[str]:
+    return re.findall(r"[a-z0-9][a-z0-9'/.$%-]*", normalized)
+
+
+def content_words(tokens: List[str]) -> List[str]:
+    return [token for token in tokens if token not in FILLER_WORDS]
+
+
+def shingles(words: List[str]) -> FrozenSet[str]:
+    """Word unigrams plus bigrams; enough structure for short questions."""
+    return frozenset(words) | frozenset(f"{a} {b}" for a, b in zip(words, words[1:]))
+
+
+def _stable_hash(value: str) -> int:
+    # Python's hash() is salted per process; persisted entries need stable hashes.
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+
+def _permutations() -> List[Tuple[int, int]]:
+    params = []
+    for index in range(NUM_PERMUTATIONS):
+        seed = _stable_hash(f"perm-{index}")
+        params.append((seed % (_MERSENNE_PRIME - 1) + 1, (seed >> 7) % _MERSENNE_PRIME))
+    return params
+
+
+_PERMUTATIONS = _permutations()
+
+
+def minhash(items: FrozenSet[str]) -> Tuple[int, ...]:
+    hashes = [_stable_hash(item) for item in items] or [0]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+class _Entry:
+    __slots__ = ("key", "answer", "generation_seconds", "content", "shingles")
+
+    def __init__(self, key: str, answer: str, generation_seconds: float, words: List[str]) -> None:
+        self.key = key
+        self.answer = answer
+        self.generation_seconds = generation_seconds
+        self.content = frozenset(words)
+        self.shingles = shingles(words)
+
+
+class ChatCache:
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        path: Optional[Path] = None,
+        near_duplicates: bool = False,
+        similarity: float = 0.8,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.near_duplicates = near_duplicates
+        self.similarity = similarity
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # LSH: (scope, band index, band values) -> cache keys. Scope is model +
+        # system instruction, so near matches never cross them.
+        self._bands: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = {}
+        self._signatures: Dict[str, Tuple[str, Tuple[int, ...]]] = {}
+        self._lock = threading.Lock()
+        self._loaded = path is None
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    @staticmethod
+    def _scope(system_instruction: Optional[str], model: str) -> str:
+        return hashlib.sha256(f"{model}\0{system_instruction or ''}".encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _key(scope: str, normalized: str) -> str:
+        return hashlib.sha256(f"{scope}\0{normalized}".encode()).hexdigest()
+
+    # --- lookups ------------------------------------------------------------
+    def get(self, question: str, system_instruction: Optional[str], model: str) -> Optional[str]:
+        """Return a cached answer for this question (or a reworded one), or None."""
+        if not self.enabled:
+            return None
+        self.load()
+        normalized = normalize(question)
+        scope = self._scope(system_instruction, model)
+        hit, entry = self._entries.get(self._key(scope, normalized))
+        if hit:
+            return self._count_hit(entry, near=False)
+        if self.near_duplicates:
+            entry = self._near(scope, content_words(_tokens(normalized)))
+            if entry is not None:
+                return self._count_hit(entry, near=True)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _count_hit(self, entry: _Entry, near: bool) -> str:
+        with self._lock:
+            if near:
+                self.near_hits += 1
+            else:
+                self.hits += 1
+            self.saved_seconds += entry.generation_seconds
+        return entry.answer
+
+    def _near(self, scope: str, words: List[str]) -> Optional[_Entry]:
+        if not words:
+            # Nothing but filler ("hi there"): too little to call two questions alike.
+            return None
+        items = shingles(words)
+        content = frozenset(words)
+        signature = minhash(items)
+        candidates: Set[str] = set()
+        with self._lock:
+            for band in range(BANDS):
+                bucket = self._bands.get((scope, band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+                if bucket:
+                    candidates.update(bucket)
+
+        best: Optional[_Entry] = None
+        best_key = None
+        best_score = self.similarity
+        for key in candidates:
+            # Only the match counts as a use; rejected candidates keep their LRU place.
+            hit, entry = self._entries.peek(key)
+            if not hit:
+                continue
+            if entry.content != content:
+                continue
+            score = len(items & entry.shingles) / len(items | entry.shingles)
+            if score >= best_score:
+                best, best_key, best_score = entry, key, score
+        if best is not None:
+            self._entries.get(best_key)
+        return best
+
+    # --- writes -------------------------------------------------------------
+    def set(
+        self,
+        question: str,
+        system_instruction: Optional[str],
+        model: str,
+        answer: str,
+        generation_seconds: float,
+    ) -> None:
+        if not self.enabled or not answer:
+            return
+        self.load()
+        normalized = normalize(question)
+        scope = self._scope(system_instruction, model)
+        key = self._key(scope, normalized)
+        self._remember(scope, key, normalized, answer, generation_seconds, self.ttl)
+        if self.path is not None:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO chat_answers VALUES (?, ?, ?, ?, ?)",
+                    (f"{scope}:{key}", normalized, answer, generation_seconds, time.time() + self.ttl),
+                )
+
+    def _remember(
+        self, scope: str, key: str, normalized: str, answer: str, generation_seconds: float, ttl: float
+    ) -> None:
+        words = content_words(_tokens(normalized))
+        self._entries.set(key, _Entry(key, answer, generation_seconds, words), ttl=ttl)
+        if not self.near_duplicates or not words:
+            return
+        signature = minhash(shingles(words))
+        with self._lock:
+            self._signatures[key] = (scope, signature)
+            for band in range(BANDS):
+                self._bands.setdefault(
+                    (scope, band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]), set()
+                ).add(key)
+            if len(self._signatures) > 2 * self.maxsize:
+                self._prune_index()
+
+    def _prune_index(self) -> None:
+        """Drop index entries whose answers the LRU has evicted or expired."""
+        for key in [key for key in self._signatures if key not in self._entries]:
+            scope, signature = self._signatures.pop(key)
+            for band in range(BANDS):
+                band_key = (scope, band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+                bucket = self._bands.get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._bands[band_key]
+
+    # --- persistence --------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self) -> None:
+        """Warm memory from disk once: the newest live answers, up to maxsize."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM chat_answers WHERE expires_at <= ?", (now,))
+            rows = conn.execute(
+                "SELECT key, question, answer, generation_seconds, expires_at FROM chat_answers "
+                "ORDER BY expires_at DESC LIMIT ?",
+                (self.maxsize,),
+            ).fetchall()
+        # Oldest first so the LRU order matches recency.
+        for stored_key, question, answer, generation_seconds, expires_at in reversed(rows):
+            scope, key = stored_key.split(":", 1)
+            self._remember(scope, key, question, answer, generation_seconds, expires_at - now)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else None,
+            "saved_seconds": round(self.saved_seconds, 2),
+            "persistent": self.path is not None,
+            "near_duplicates": self.near_duplicates,
+        }
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "0").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def create_chat_cache() -> ChatCache:
+    path = os.getenv("CHATBOT_CACHE_PATH")
+    return ChatCache(
+        maxsize=int(os.getenv("CHATBOT_CACHE_SIZE", "1000")),
+        ttl=float(os.getenv("CHATBOT_CACHE_TTL_SECONDS", "3600")),
+        path=Path(path) if path else None,
+        near_duplicates=_env_flag("CHATBOT_CACHE_NEAR_DUPLICATES"),
+        similarity=float(os.getenv("CHATBOT_CACHE_SIMILARITY", "0.8")),
+    )
@@ -1,15 +1,33 @@
+import asyncio
 import os
+import time
+from collections import deque
 from functools import lru_cache
-from typing import Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, Optional
 
-from google import genai
+from services.chat_cache import create_chat_cache
+from services.rate_limiter import INTERACTIVE, upstream_scheduler
+
+if TYPE_CHECKING:
+    from google import genai
 
 class ChatbotConfigurationError(RuntimeError):
     """Raised when the Gemini configuration is missing or invalid."""
 
 
+class ChatbotBusyError(RuntimeError):
+    """Raised when every generation slot is taken and the queue is full or too slow."""
+
+
+class ChatbotTimeoutError(RuntimeError):
+    """Raised when an answer takes longer than CHATBOT_TIMEOUT_SECONDS."""
+
+
 @lru_cache
-def _build_client() -> genai.Client:
+def _build_client() -> "genai.Client":
+    # google-genai is slow to import, so only pay for it on the first question.
+    from google import genai
+
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ChatbotConfigurationError(
@@ -19,23 +37,205 @@ def _build_client() -> genai.Client:
     return genai.Client(api_key=api_key)
 
 
-def ask_gemini(prompt: str, system_instruction: Optional[str] = None) -> str:
-    """Send the user prompt to the Gemini API and return the generated answer."""
+async def stream_gemini(prompt: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+    """Stream the answer from Gemini's async API, yielding text as it arrives."""
+    # The first call imports google-genai; keep that off the event loop too.
+    client = await asyncio.to_thread(_build_client)
+    await upstream_scheduler.acquire("gemini", INTERACTIVE)
+    model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    contents = [system_instruction, prompt] if system_instruction else prompt
     try:
-        client = _build_client()
-        model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+        stream = await client.aio.models.generate_content_stream(model=model_name, contents=contents)
+        async for chunk in stream:
+            text = getattr(chunk, "text", "") or ""
+            if text:
+                yield text
+    except Exception as exc:  # pragma: no cover - defensive logging
+        raise RuntimeError(f"Gemini API request failed: {exc}") from exc
+
+
+async def stream_fake(prompt: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Local stand-in for load tests (CHATBOT_BACKEND=fake): waits
+    CHATBOT_FAKE_FIRST_TOKEN_MS, then yields CHATBOT_FAKE_TOKENS words
+    CHATBOT_FAKE_TOKEN_MS apart. No network, no rate limit.
+    """
+    await asyncio.sleep(float(os.getenv("CHATBOT_FAKE_FIRST_TOKEN_MS", "400")) / 1000)
+    token_delay = float(os.getenv("CHATBOT_FAKE_TOKEN_MS", "15")) / 1000
+    words = f"Fake answer to: {prompt}".split()
+    for index in range(int(os.getenv("CHATBOT_FAKE_TOKENS", "60"))):
+        if index:
+            await asyncio.sleep(token_delay)
+        yield ("" if index == 0 else " ") + words[index % len(words)]
 
-        contents = (
-            [system_instruction, prompt] if system_instruction else prompt
+
+BACKENDS = {
+    "gemini": stream_gemini,
+    "fake": stream_fake,
+}
+
+
+def _backend():
+    name = os.getenv("CHATBOT_BACKEND", "gemini").lower()
+    if name not in BACKENDS:
+        raise ChatbotConfigurationError(
+            f"Unknown CHATBOT_BACKEND {name!r}. Use one of: {', '.join(BACKENDS)}."
         )
+    return BACKENDS[name]
+
+
+class ChatLimiter:
+    """
+    Caps concurrent generations. Callers beyond the cap wait in a bounded queue;
+    a full queue or a wait longer than `queue_timeout` raises ChatbotBusyError
+    instead of piling up requests.
+    """
+
+    def __init__(self, concurrency: int, max_queue: int, queue_timeout: float) -> None:
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.generation_timeouts = 0
+        self.errors = 0
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self._first_tokens: Deque[float] = deque(maxlen=1000)
+
+    async def acquire(self) -> None:
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise ChatbotBusyError("The assistant is busy. Please try again shortly.")
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.queue_timeouts += 1
+            raise ChatbotBusyError("The assistant is busy. Please try again shortly.") from None
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self._waits.append(time.perf_counter() - started)
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def record_first_token(self, seconds: float) -> None:
+        self._first_tokens.append(seconds)
 
-        response = client.models.generate_content(
-            model=model_name,
-            contents=contents,
+    def stats(self) -> Dict[str, Any]:
+        def percentile_ms(samples: Deque[float], q: float) -> Optional[float]:
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+        return {
+            "backend": os.getenv("CHATBOT_BACKEND", "gemini").lower(),
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "generation_timeouts": self.generation_timeouts,
+            "errors": self.errors,
+            "queue_wait_p50_ms": percentile_ms(self._waits, 0.5),
+            "queue_wait_p95_ms": percentile_ms(self._waits, 0.95),
+            "first_token_p50_ms": percentile_ms(self._first_tokens, 0.5),
+            "first_token_p95_ms": percentile_ms(self._first_tokens, 0.95),
+        }
+
+
+chat_limiter = ChatLimiter(
+    concurrency=max(int(os.getenv("CHATBOT_MAX_CONCURRENCY", "8")), 1),
+    max_queue=max(int(os.getenv("CHATBOT_MAX_QUEUE", "32")), 0),
+    queue_timeout=float(os.getenv("CHATBOT_QUEUE_TIMEOUT_SECONDS", "10")),
+)
+
+
+chat_cache = create_chat_cache()
+
+
+def _model_name() -> str:
+    backend = os.getenv("CHATBOT_BACKEND", "gemini").lower()
+    return os.getenv("GEMINI_MODEL", "gemini-2.5-flash") if backend == "gemini" else backend
+
+
+async def cached_answer(prompt: str, system_instruction: Optional[str] = None) -> Optional[str]:
+    """A previous answer to this (or, if enabled, a reworded) question, or None."""
+    if not chat_cache.loaded:
+        # First lookup reads the persisted answers from disk.
+        await asyncio.to_thread(chat_cache.load)
+    return chat_cache.get(prompt, system_instruction, _model_name())
+
+
+async def remember_answer(
+    prompt: str, system_instruction: Optional[str], answer: str, generation_seconds: float
+) -> None:
+    if chat_cache.path is None:
+        chat_cache.set(prompt, system_instruction, _model_name(), answer, generation_seconds)
+    else:
+        await asyncio.to_thread(
+            chat_cache.set, prompt, system_instruction, _model_name(), answer, generation_seconds
         )
-        text = getattr(response, "text", "") or ""
-        return text.strip()
-    except ChatbotConfigurationError:
+
+
+async def generate(prompt: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Stream an answer from the configured backend. The caller must already hold
+    a `chat_limiter` slot. Raises ChatbotTimeoutError once the whole answer
+    has taken longer than CHATBOT_TIMEOUT_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + float(os.getenv("CHATBOT_TIMEOUT_SECONDS", "60"))
+    stream = _backend()(prompt, system_instruction)
+    first = True
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), max(deadline - loop.time(), 0))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                chat_limiter.generation_timeouts += 1
+                raise ChatbotTimeoutError("The assistant took too long to answer.") from None
+            if first:
+                chat_limiter.record_first_token(loop.time() - started)
+                first = False
+            yield chunk
+        chat_limiter.completed += 1
+    except (ChatbotTimeoutError, ChatbotConfigurationError):
         raise
-    except Exception as exc:  # pragma: no cover - defensive logging
-        raise RuntimeError(f"Gemini API request failed: {exc}") from exc
+    except Exception:
+        chat_limiter.errors += 1
+        raise
+    finally:
+        await stream.aclose()
+
+
+async def ask(prompt: str, system_instruction: Optional[str] = None) -> str:
+    """
+    Return a complete answer: from the cache when possible, otherwise generated
+    under a limiter slot and cached.
+    """
+    cached = await cached_answer(prompt, system_instruction)
+    if cached is not None:
+        return cached
+    await chat_limiter.acquire()
+    try:
+        started = time.perf_counter()
+        parts = [chunk async for chunk in generate(prompt, system_instruction)]
+        elapsed = time.perf_counter() - started
+    finally:
+        chat_limiter.release()
+    answer = "".join(parts).strip()
+    await remember_answer(prompt, system_instruction, answer, elapsed)
+    return answer
@@ -0,0 +1,55 @@
+"""
+Columnar daily price series.
+
+A `DailySeries` is a pair of equal-length NumPy arrays in ascending day order:
+
+    days    int64    days since 1970-01-01 (numpy's datetime64[D] epoch)
+    closes  float64  closing price
+
+Provider payloads are parsed straight into this shape, the history store
+reads it back without building a `date` per row, and the analytics engine
+aligns on `days` directly. Ranges are filtered with integer comparisons on
+`days`; `date` objects are only made at the edges (a request's window, the
+last bar of a series).
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Iterable, Tuple
+
+import numpy as np
+
+DailySeries = Tuple[np.ndarray, np.ndarray]
+
+EPOCH = date(1970, 1, 1)
+
+
+def epoch_day(day: date) -> int:
+    return (day - EPOCH).days
+
+
+def to_date(day: int) -> date:
+    return EPOCH + timedelta(days=int(day))
+
+
+def empty_series() -> DailySeries:
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+
+def series_from_bars(bars: Iterable[Tuple[date, float]]) -> DailySeries:
+    """Build a series from `(date, close)` pairs given in any order."""
+    bars = sorted(bars)
+    days = np.fromiter((epoch_day(day) for day, _ in bars), dtype=np.int64, count=len(bars))
+    closes = np.fromiter((close for _, close in bars), dtype=np.float64, count=len(bars))
+    return days, closes
+
+
+def iso_days(days: np.ndarray) -> np.ndarray:
+    """`YYYY-MM-DD` strings for `days`, converted in one vectorized pass."""
+    return days.astype("datetime64[D]").astype(str)
+
+
+def last_day(series: DailySeries) -> date | None:
+    days, _ = series
+    return to_date(days[-1]) if days.size else None
@@ -1,40 +1,222 @@
+import asyncio
+import json
 import os
+import re
 import requests
-from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from services.daily_series import DailySeries, empty_series, epoch_day
+from services.history_cache import get_history_max_age_seconds, get_history_store
+from services.rate_limiter import BACKGROUND, INTERACTIVE, upstream_scheduler
+from services.singleflight import SingleFlight, TTLCache
 
 ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
 
+# Alpha Vantage's "compact" payload holds the latest 100 trading days.
+COMPACT_OUTPUT_DAYS = 100
+
+# Concurrent refreshes of the same symbol share one Alpha Vantage download.
+history_flight = SingleFlight(
+    "alphavantage.time_series_daily",
+    ttl=float(os.getenv("HISTORY_REFRESH_CACHE_TTL_SECONDS", "30")),
+)
+
+# Symbols Alpha Vantage has no series for (delisted, mistyped) keep failing;
+# remember the error briefly instead of spending a call on every request.
+history_failures = TTLCache(
+    maxsize=1024, ttl=float(os.getenv("HISTORY_FAILURE_CACHE_TTL_SECONDS", "300"))
+)
+
+class HistoryUnavailable(Exception):
+    """Alpha Vantage answered with an error instead of a series for the symbol."""
+
+def get_history_fetch_concurrency() -> int:
+    return max(1, int(os.getenv("HISTORY_FETCH_CONCURRENCY", "4")))
+
+def get_history_fetch_timeout() -> float:
+    return float(os.getenv("HISTORY_FETCH_TIMEOUT_SECONDS", "15"))
+
 def get_unix_timestamp_days_ago(days: int) -> int:
     return int(datetime.now(timezone.utc).timestamp() - (days * 86400))
 
-def fetch_stock_history(symbol: str, from_unix: int, to_unix: int):
-    # Use timezone-aware datetime objects
-    from_date = datetime.fromtimestamp(from_unix, timezone.utc).date()
-    to_date = datetime.fromtimestamp(to_unix, timezone.utc).date()
+# One match per trading day: the date key and the "4. close" field of its
+# object. `[^}]*` cannot leave that object, so it may be greedy.
+_DAILY_CLOSE = re.compile(rb'"(\d{4}-\d\d-\d\d)"\s*:\s*\{[^}]*"4\. close"\s*:\s*"([^"]*)"')
+
+def parse_daily_series(payload: bytes, since: date | None = None) -> DailySeries:
+    """
+    Columnar closes from a raw TIME_SERIES_DAILY body, keeping only bars newer
+    than `since`.
+
+    The body is scanned as bytes, so no per-day dicts, strings, `date`s or
+    floats are built. Dates and closes are converted to int64 epoch days and
+    float64 in one vectorized pass each, and `since` is applied as an integer
+    mask. Only when that pass hits a malformed value are the days converted
+    one by one, and the bad ones skipped.
+    """
+    matches = _DAILY_CLOSE.findall(payload)
+    if not matches:
+        return empty_series()
+    fields = np.array(matches)
+    try:
+        days = fields[:, 0].astype("datetime64[D]").astype(np.int64)
+        closes = fields[:, 1].astype(np.float64)
+    except ValueError:
+        days, closes = _parse_rows(matches)
+
+    if since is not None:
+        newer = days > epoch_day(since)
+        days, closes = days[newer], closes[newer]
+    # Alpha Vantage lists the newest day first.
+    order = np.argsort(days, kind="stable")
+    return days[order], closes[order]
 
+def _parse_rows(matches) -> DailySeries:
+    days, closes = [], []
+    for date_str, close in matches:
+        try:
+            day = np.datetime64(date_str.decode(), "D").astype(np.int64)
+            closes.append(float(close))
+            days.append(day)
+        except ValueError as e:
+            print(f"Skipping invalid data point {date_str.decode()}: {e}")
+    return np.array(days, dtype=np.int64), np.array(closes, dtype=np.float64)
+
+def _download_daily_bars(symbol: str, since: date | None, priority: int = INTERACTIVE) -> DailySeries:
+    """Pull daily closes from Alpha Vantage, keeping only bars newer than `since`."""
+    today = datetime.now(timezone.utc).date()
+    if since is None:
+        output_size = os.getenv("ALPHA_VANTAGE_OUTPUT_SIZE", "compact")
+    elif (today - since).days < COMPACT_OUTPUT_DAYS:
+        output_size = "compact"
+    else:
+        # The gap is wider than the compact window; only the full series backfills it.
+        output_size = "full"
+
+    api_key = os.getenv("ALPHA_VANTAGE_API_KEY", ALPHA_VANTAGE_API_KEY)
     url = (
         f"https://www.alphavantage.co/query?"
-        f"function=TIME_SERIES_DAILY&symbol={symbol}&apikey={ALPHA_VANTAGE_API_KEY}"
+        f"function=TIME_SERIES_DAILY&symbol={symbol}&outputsize={output_size}&apikey={api_key}"
     )
-    resp = requests.get(url)
-    data = resp.json()
+    upstream_scheduler.acquire_blocking("alphavantage", priority)
+    resp = requests.get(url, timeout=get_history_fetch_timeout())
+    payload = resp.content
+
+    if b'"Time Series (Daily)"' not in payload:
+        # Error bodies are small; decode them to report what went wrong.
+        data = json.loads(payload)
+        if "Note" in data or "Information" in data:
+            # Alpha Vantage reports throttling as a 200 with a note; slow down.
+            upstream_scheduler.penalize("alphavantage", 60)
+            raise Exception(data.get("Note") or data.get("Information"))
+        raise HistoryUnavailable(data.get("Error Message") or str(data))
 
-    if "Time Series (Daily)" not in data:
-        raise Exception(data.get("Note") or data.get("Error Message") or data.get("Information") or str(data))
+    return parse_daily_series(payload, since)
 
-    time_series = data["Time Series (Daily)"]
-    result = []
+def refresh_stock_history(symbol: str, force: bool = False, priority: int = INTERACTIVE) -> int | None:
+    """
+    Bring the cached bars for `symbol` up to date. Returns the number of new
+    bars written, or None when the cache was still fresh.
 
-    for date_str, day_data in time_series.items():
+    A symbol Alpha Vantage recently had no series for fails straight away with
+    the same error, for HISTORY_FAILURE_CACHE_TTL_SECONDS. `force` skips that.
+    """
+    symbol = symbol.upper()
+    store = get_history_store()
+    if not force and store.is_fresh(symbol, get_history_max_age_seconds()):
+        return None
+    if not force:
+        failed, error = history_failures.get(symbol)
+        if failed:
+            raise HistoryUnavailable(error)
+
+    def refresh() -> int:
         try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-            if from_date <= date_obj <= to_date:
-                result.append({
-                    "date": date_obj,
-                    "close": float(day_data["4. close"])
-                })
+            days, closes = _download_daily_bars(symbol, store.last_bar_date(symbol), priority)
+        except HistoryUnavailable as e:
+            history_failures.set(symbol, str(e))
+            raise
+        return store.write_series(symbol, days, closes)
+
+    return history_flight.do(("TIME_SERIES_DAILY", symbol), refresh, use_cache=not force)
+
+def fetch_stock_history(symbol: str, from_unix: int, to_unix: int) -> DailySeries:
+    # Use timezone-aware datetime objects
+    from_date = datetime.fromtimestamp(from_unix, timezone.utc).date()
+    to_date = datetime.fromtimestamp(to_unix, timezone.utc).date()
+    symbol = symbol.upper()
+    store = get_history_store()
+
+    try:
+        refresh_stock_history(symbol)
+    except Exception as e:
+        # Serve what we already have rather than failing the whole request.
+        if store.last_bar_date(symbol) is None:
+            raise
+        print(f"[WARN] Serving cached history for {symbol}, refresh failed: {e}")
+
+    return store.read_series(symbol, from_date, to_date)
+
+def warm_history_cache(symbols: Iterable[str], force: bool = False) -> Dict[str, str]:
+    """Preload the history cache, reporting per-symbol outcome instead of raising."""
+    results: Dict[str, str] = {}
+    for symbol in dict.fromkeys(s.upper().strip() for s in symbols if s.strip()):
+        try:
+            written = refresh_stock_history(symbol, force=force, priority=BACKGROUND)
+            results[symbol] = "fresh" if written is None else f"{written} new bars"
         except Exception as e:
-            print(f"Skipping invalid data point {date_str}: {e}")
-            continue
+            results[symbol] = f"error: {e}"
+    return results
+
+_history_executor: ThreadPoolExecutor | None = None
+
+def _get_history_executor() -> ThreadPoolExecutor:
+    # Dedicated pool so history fetches can't starve FastAPI's own threadpool.
+    global _history_executor
+    if _history_executor is None:
+        _history_executor = ThreadPoolExecutor(
+            max_workers=get_history_fetch_concurrency(),
+            thread_name_prefix="history-fetch",
+        )
+    return _history_executor
+
+async def fetch_histories(
+    symbols: Iterable[str], from_unix: int, to_unix: int
+) -> Tuple[Dict[str, DailySeries], Dict[str, str]]:
+    """
+    Fetch several symbols concurrently without blocking the event loop.
+
+    Returns `(histories, errors)`; a symbol that fails or times out only shows
+    up in `errors` and never discards the histories fetched for the others.
+
+    Only the upstream HTTP call is timed (HISTORY_FETCH_TIMEOUT_SECONDS).
+    Waiting for a pool thread or an Alpha Vantage token is not, so a cold
+    portfolio queued behind the rate limit is not failed while its fetches
+    are still in line.
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_history_executor()
+    unique_symbols = list(dict.fromkeys(s.upper() for s in symbols))
+
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, fetch_stock_history, symbol, from_unix, to_unix)
+            for symbol in unique_symbols
+        ),
+        return_exceptions=True,
+    )
 
-    return sorted(result, key=lambda x: x["date"])
+    histories: Dict[str, DailySeries] = {}
+    errors: Dict[str, str] = {}
+    for symbol, result in zip(unique_symbols, results):
+        if isinstance(result, requests.Timeout):
+            errors[symbol] = "timed out"
+        elif isinstance(result, Exception):
+            errors[symbol] = str(result)
+        else:
+            histories[symbol] = result
+    return histories, errors
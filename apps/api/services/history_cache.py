@@ -0,0 +1,205 @@
+"""
+Local on-disk store for daily closing prices, keyed by (symbol, date).
+
+`services.finnhub_client.fetch_stock_history` reads through this store so that
+analytics requests are normally answered from disk. Upstream (Alpha Vantage) is
+only asked for the bars after the last cached one, and only once the symbol's
+last refresh is older than the configured staleness window. Bars go in and come
+out as columnar `services.daily_series.DailySeries` arrays.
+
+Warm the cache ahead of time with:
+
+    python -m services.history_cache AAPL MSFT TSLA
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from services.daily_series import DailySeries, iso_days, series_from_bars
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / "history_cache.sqlite3"
+DEFAULT_MAX_AGE_SECONDS = 12 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_bars (
+    symbol TEXT NOT NULL,
+    day TEXT NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (symbol, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS symbol_refreshes (
+    symbol TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+
+def get_history_cache_path() -> Path:
+    return Path(os.getenv("HISTORY_CACHE_PATH") or DEFAULT_CACHE_PATH)
+
+
+def get_history_max_age_seconds() -> int:
+    """How long a symbol's cached bars are trusted before asking upstream again."""
+    return int(os.getenv("HISTORY_CACHE_MAX_AGE_SECONDS", DEFAULT_MAX_AGE_SECONDS))
+
+
+class HistoryStore:
+    """
+    Thin SQLite wrapper. Every call opens its own connection, so the store can
+    be shared between the event loop and worker threads without extra locking.
+    Only `data_version` keeps one connection open, behind its own lock.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._watch: sqlite3.Connection | None = None
+        self._watch_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def last_bar_date(self, symbol: str) -> date | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT MAX(day) FROM daily_bars WHERE symbol = ?", (symbol,)
+            ).fetchone()
+        return date.fromisoformat(row[0]) if row and row[0] else None
+
+    def refreshed_at(self, symbol: str) -> float | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT refreshed_at FROM symbol_refreshes WHERE symbol = ?", (symbol,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, symbol: str, max_age_seconds: int) -> bool:
+        refreshed_at = self.refreshed_at(symbol)
+        return refreshed_at is not None and time.time() - refreshed_at < max_age_seconds
+
+    def data_version(self) -> int:
+        """
+        Changes whenever any connection, in this process or another, commits
+        to the store. One PRAGMA on a long-lived connection, so it is cheap
+        enough to check on every request before re-reading anything.
+        """
+        with self._watch_lock:
+            if self._watch is None:
+                self._connect().close()
+                self._watch = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_bar_dates(
+        self, symbols: Iterable[str], max_age_seconds: int
+    ) -> Tuple[Dict[str, date], float] | None:
+        """
+        `(last cached bar per symbol, time until which all of them stay fresh)`
+        in one query, or None if any symbol is missing or already due for a
+        refresh (a read would go upstream first).
+        """
+        symbols = list(symbols)
+        placeholders = ",".join("?" * len(symbols))
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT r.symbol, r.refreshed_at, "
+                "(SELECT MAX(day) FROM daily_bars d WHERE d.symbol = r.symbol) "
+                f"FROM symbol_refreshes r WHERE r.symbol IN ({placeholders})",
+                symbols,
+            ).fetchall()
+        if len(rows) < len(set(symbols)) or not all(day for _, _, day in rows):
+            return None
+        fresh_until = min(refreshed_at for _, refreshed_at, _ in rows) + max_age_seconds
+        if fresh_until <= time.time():
+            return None
+        return {symbol: date.fromisoformat(day) for symbol, _, day in rows}, fresh_until
+
+    def read_series(self, symbol: str, from_date: date, to_date: date) -> DailySeries:
+        """
+        Cached bars in ascending order as `(epoch days, closes)`. SQLite turns
+        each day into its epoch-day number, so no `date` is built per row.
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT CAST(julianday(day) - 2440587.5 AS INTEGER), close FROM daily_bars "
+                "WHERE symbol = ? AND day BETWEEN ? AND ? ORDER BY day",
+                (symbol, from_date.isoformat(), to_date.isoformat()),
+            ).fetchall()
+        bars = np.array(rows, dtype=[("day", np.int64), ("close", np.float64)])
+        return np.ascontiguousarray(bars["day"]), np.ascontiguousarray(bars["close"])
+
+    def write(self, symbol: str, bars: Iterable[Tuple[date, float]]) -> int:
+        """`write_series` for `(date, close)` pairs."""
+        return self.write_series(symbol, *series_from_bars(bars))
+
+    def write_series(self, symbol: str, days: np.ndarray, closes: np.ndarray) -> int:
+        """Upsert bars and stamp the symbol as refreshed. Returns rows written."""
+        rows = list(zip([symbol] * len(days), iso_days(days).tolist(), closes.tolist()))
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_bars (symbol, day, close) VALUES (?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO symbol_refreshes (symbol, refreshed_at) VALUES (?, ?)",
+                (symbol, time.time()),
+            )
+        return len(rows)
+
+
+_store: HistoryStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Process-wide store, created on first use so the path can come from `.env`."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore(get_history_cache_path())
+    return _store
+
+
+def main(argv: List[str] | None = None) -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
+
+    from services.finnhub_client import warm_history_cache
+
+    parser = argparse.ArgumentParser(description="Preload daily bars into the history cache.")
+    parser.add_argument("symbols", nargs="+", help="Ticker symbols to preload")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Refresh even if the cached bars are still within the staleness window",
+    )
+    args = parser.parse_args(argv)
+
+    for symbol, result in warm_history_cache(args.symbols, force=args.force).items():
+        print(f"{symbol}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+CSV / NDJSON parsing and serialization for bulk holdings import and export.
+
+Uploads are parsed as the request body streams in, one line at a time, so a
+large file never has to be held as text. Both formats use the same columns as
+the single-row API: `symbol`, `quantity`, `avg_cost` (`avgCost`, `ticker` and
+`qty` are accepted too). Rows are validated here; nothing touches the
+database.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import math
+from typing import Any, AsyncIterator, Dict, Iterable, List, Tuple
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (CSV, NDJSON)
+
+CONTENT_TYPES = {
+    CSV: "text/csv",
+    NDJSON: "application/x-ndjson",
+}
+
+COLUMNS = ("symbol", "quantity", "avg_cost")
+# Exports also carry the row id; imports ignore it.
+EXPORT_COLUMNS = ("id",) + COLUMNS
+_ALIASES = {"avgcost": "avg_cost", "avg cost": "avg_cost", "ticker": "symbol", "qty": "quantity"}
+
+# Stop collecting errors after this many; the upload is rejected either way.
+MAX_REPORTED_ERRORS = 50
+
+# (symbol, quantity, avg_cost)
+HoldingRow = Tuple[str, float, float]
+
+
+class ImportErrors(Exception):
+    def __init__(self, errors: List[Dict[str, Any]], rows: int) -> None:
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+        self.rows = rows
+
+
+def detect_format(content_type: str | None, requested: str | None = None) -> str | None:
+    if requested:
+        return requested.lower() if requested.lower() in FORMATS else None
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return CSV
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return NDJSON
+    return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed body into decoded lines without buffering the whole body."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8-sig")
+    if buffer.strip():
+        yield buffer.rstrip(b"\r").decode("utf-8-sig")
+
+
+def _row(record: Dict[str, Any]) -> HoldingRow:
+    symbol = str(record.get("symbol") or "").upper().strip()
+    if not symbol:
+        raise ValueError("symbol is required")
+    try:
+        quantity = float(record["quantity"])
+        avg_cost = float(record["avg_cost"])
+    except KeyError as exc:
+        raise ValueError(f"{exc.args[0]} is required") from None
+    except (TypeError, ValueError):
+        raise ValueError("quantity and avg_cost must be numbers") from None
+    if not (math.isfinite(quantity) and math.isfinite(avg_cost)):
+        raise ValueError("quantity and avg_cost must be finite")
+    return symbol, quantity, avg_cost
+
+
+async def parse_rows(lines: AsyncIterator[str], fmt: str) -> List[HoldingRow]:
+    """
+    Parse and validate every row. Raises `ImportErrors` listing the bad rows
+    (by 1-based line number) if any fail, so a bad file is rejected as a whole.
+    """
+    rows: List[HoldingRow] = []
+    errors: List[Dict[str, Any]] = []
+    header: List[str] | None = None
+    line_no = 0
+
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            if fmt == CSV:
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = [_ALIASES.get(name.strip().lower(), name.strip().lower()) for name in values]
+                    missing = [column for column in COLUMNS if column not in header]
+                    if missing:
+                        raise ValueError(f"header is missing {', '.join(missing)}")
+                    continue
+                record = dict(zip(header, values))
+            else:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("each line must be a JSON object")
+                record = {_ALIASES.get(key.lower(), key): value for key, value in record.items()}
+            rows.append(_row(record))
+        except (ValueError, csv.Error) as exc:
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line_no, "error": str(exc)})
+
+    if errors:
+        raise ImportErrors(errors, len(rows))
+    return rows
+
+
+def merge_lots(rows: Iterable[HoldingRow]) -> Dict[str, Tuple[float, float]]:
+    """Collapse rows to one position per symbol: summed quantity, weighted avg cost."""
+    merged: Dict[str, Tuple[float, float]] = {}
+    for symbol, quantity, avg_cost in rows:
+        held, cost = merged.get(symbol, (0.0, 0.0))
+        merged[symbol] = (held + quantity, cost + quantity * avg_cost)
+    return {
+        symbol: (quantity, cost / quantity if quantity else 0.0)
+        for symbol, (quantity, cost) in merged.items()
+    }
+
+
+def export_header(fmt: str) -> str:
+    return ",".join(EXPORT_COLUMNS) + "\n" if fmt == CSV else ""
+
+
+def encode_rows(fmt: str, rows: Iterable[Tuple[Any, str, float, float]]) -> str:
+    """Serialize `(id, symbol, quantity, avg_cost)` rows to one chunk of output."""
+    if fmt == NDJSON:
+        return "".join(
+            json.dumps({"id": str(id_), "symbol": symbol, "quantity": quantity, "avg_cost": avg_cost}) + "\n"
+            for id_, symbol, quantity, avg_cost in rows
+        )
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerows((str(id_), symbol, quantity, avg_cost) for id_, symbol, quantity, avg_cost in rows)
+    return out.getvalue()
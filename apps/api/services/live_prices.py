@@ -11,12 +11,20 @@ from browsers, and keep subscribe/unsubscribe logic in one place.
 from __future__ import annotations
 
 import asyncio
+import itertools
 import json
 import os
+import socket
+import sys
 import time
-from collections import defaultdict
-from dataclasses import dataclass, field
-from typing import Any, Dict, Iterable, Set
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Set, Tuple
+
+from services.price_bus import PriceBus, create_price_bus
+from services.stream_commands import SubscriptionCoalescer
+from services.trade_ring import TradeRings, get_replay_grace_seconds
+from services.stream_wire import BINARY, JSON, WireEncoder, encode_event
 
 import websockets
 from websockets.exceptions import ConnectionClosed
@@ -33,121 +41,664 @@ def get_finnhub_ws_url() -> str | None:
     return f"wss://ws.finnhub.io?token={token}"
 
 
+MIN_CONFLATE_MS = 50
+MAX_CONFLATE_MS = 10_000
+
+
+def get_default_conflate_ms() -> int:
+    return clamp_conflate_ms(os.getenv("STREAM_CONFLATE_MS", "0"))
+
+
+def clamp_conflate_ms(value: Any) -> int:
+    """0 disables conflation; anything else is kept within sane bounds."""
+    try:
+        interval = int(value)
+    except (TypeError, ValueError):
+        return 0
+    if interval <= 0:
+        return 0
+    return max(MIN_CONFLATE_MS, min(interval, MAX_CONFLATE_MS))
+
+
 @dataclass
+class ConflationWindow:
+    """Trades for one symbol folded together until the client's next flush."""
+
+    price: float
+    volume: float
+    trades: int
+    timestamp: int
+
+
+CLIENT_QUEUE_SIZE = 100
+
+# What happens when a client's queue is full:
+#   drop-oldest - discard the oldest queued frame (default)
+#   latest      - stop queueing and keep only the latest trade per symbol until it catches up
+#   disconnect  - evict the client, also once it lags more than STREAM_MAX_LAG_MS
+DROP_OLDEST = "drop-oldest"
+LATEST = "latest"
+DISCONNECT = "disconnect"
+BACKPRESSURE_POLICIES = (DROP_OLDEST, LATEST, DISCONNECT)
+
+
+def get_default_backpressure() -> str:
+    policy = os.getenv("STREAM_BACKPRESSURE_POLICY", DROP_OLDEST)
+    return policy if policy in BACKPRESSURE_POLICIES else DROP_OLDEST
+
+
+def get_max_lag_seconds() -> float:
+    return float(os.getenv("STREAM_MAX_LAG_MS", "5000")) / 1000
+
+
+def get_send_timeout_seconds() -> float:
+    return float(os.getenv("STREAM_SEND_TIMEOUT_SECONDS", "10"))
+
+
+# Shortest sleep between slow-client sweeps, however small the limits are.
+WATCHDOG_MIN_INTERVAL = 0.05
+
+
 class ClientSession:
-    """Small container for the state we keep per connected dashboard client."""
+    """
+    State kept per connected dashboard client. Tens of thousands of these can be
+    alive at once, so there's no instance dict, outgoing frames sit in a capped
+    deque, and a waiter future only exists while the forwarder is idle.
+    """
 
-    id: str
-    symbols: Set[str] = field(default_factory=set)
-    queue: asyncio.Queue[dict[str, Any]] = field(
-        default_factory=lambda: asyncio.Queue(maxsize=100)
+    __slots__ = (
+        "handle", "symbols", "queue", "conflate_ms", "pending", "_waiter",
+        "policy", "drops", "sending_since", "evicted", "task", "encoding", "controls",
     )
 
+    def __init__(
+        self, handle: int, conflate_ms: int = 0, policy: str = DROP_OLDEST, encoding: str = JSON
+    ) -> None:
+        self.handle = handle
+        # Trade frame format negotiated at connect (see `services.stream_wire`).
+        self.encoding = encoding
+        self.symbols: Set[str] = set()
+        # (monotonic enqueue time, pre-encoded text or binary frame, is control).
+        # Holds at most CLIENT_QUEUE_SIZE trade frames; once full, pushing drops
+        # the oldest one. Control frames are never dropped.
+        self.queue: Deque[Tuple[float, str | bytes, bool]] = deque()
+        # Control frames currently queued.
+        self.controls = 0
+        # When > 0 the client gets at most one update per symbol per interval.
+        self.conflate_ms = conflate_ms
+        # At most one window per subscribed symbol, whatever the trade rate.
+        self.pending: Dict[str, ConflationWindow] = {}
+        self._waiter: asyncio.Future | None = None
+        self.policy = policy
+        # Frames discarded or folded away because the client fell behind.
+        self.drops = 0
+        # Monotonic time the in-progress socket write started (0 = not writing).
+        self.sending_since = 0.0
+        # Reason the client was evicted, once it has been.
+        self.evicted: str | None = None
+        self.task: asyncio.Task | None = None
+
+    def push(self, frame: str | bytes, control: bool = False) -> None:
+        """
+        Queue a frame. `control` marks frames later ones can't be decoded
+        without (binary symbol IDs, a moved time base). They keep their place
+        in line but never count toward the limit or get dropped.
+        """
+        queue = self.queue
+        if control:
+            self.controls += 1
+        elif len(queue) - self.controls >= CLIENT_QUEUE_SIZE:
+            self.drops += 1
+            self._drop_oldest_trade()
+        queue.append((time.monotonic(), frame, control))
+        self.wake()
+
+    def _drop_oldest_trade(self) -> None:
+        queue = self.queue
+        if not queue[0][2]:
+            queue.popleft()
+            return
+        for index, (_, _, control) in enumerate(queue):
+            if not control:
+                del queue[index]
+                return
+
+    def pop(self) -> str | bytes:
+        _, frame, control = self.queue.popleft()
+        if control:
+            self.controls -= 1
+        return frame
+
+    def is_full(self) -> bool:
+        return len(self.queue) - self.controls >= CLIENT_QUEUE_SIZE
+
+    def clear(self, keep_control: bool = True) -> None:
+        """Discard queued trade frames (and control frames unless `keep_control`)."""
+        if keep_control and self.controls:
+            self.queue = deque(entry for entry in self.queue if entry[2])
+        else:
+            self.queue.clear()
+            self.controls = 0
+
+    def lag(self, now: float) -> float:
+        """Seconds the oldest undelivered frame has been waiting."""
+        return now - self.queue[0][0] if self.queue else 0.0
+
+    def wake(self) -> None:
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def wait(self) -> None:
+        """Return once there is a queued frame or a pending conflation window."""
+        if self.queue or self.pending:
+            return
+        self._waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+
+
+@dataclass
+class LastTrade:
+    """Most recent trade seen on the stream for one symbol."""
+
+    price: float
+    volume: float | None
+    timestamp: int
+
+
+STREAM_MODES = ("standalone", "owner", "worker")
+
 
 class FinnhubStreamManager:
     """
     Coordinates a background task that keeps Finnhub's WebSocket alive and
     dispatches each trade event to the matching UI subscribers.
+
+    `mode` (default `PRICE_STREAM_MODE`) decides where trades come from:
+    `standalone` owns its own upstream socket, `owner` additionally publishes
+    trades on the price bus for other workers, and `worker` never connects to
+    Finnhub and receives its symbols from the owner over the bus instead.
     """
 
-    def __init__(self) -> None:
-        self._clients: Dict[str, ClientSession] = {}
-        self._symbol_clients: Dict[str, Set[str]] = defaultdict(set)
+    def __init__(self, mode: str | None = None, bus: PriceBus | None = None) -> None:
+        self.mode = mode or os.getenv("PRICE_STREAM_MODE", "standalone")
+        if self.mode not in STREAM_MODES:
+            raise ValueError(f"PRICE_STREAM_MODE must be one of {STREAM_MODES}, got {self.mode!r}")
+        self._bus = bus
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{id(self):x}"
+        # Owner only: symbols each worker needs, and how many workers need each.
+        self._worker_interest: Dict[str, Set[str]] = {}
+        self._bus_refcounts: Dict[str, int] = {}
+        self._handles = itertools.count(1)
+        self.wire = WireEncoder()
+        self._watchdog_task: asyncio.Task | None = None
+        self._evictions = 0
+        self._dropped_from_closed = 0
+        self._clients: Dict[int, ClientSession] = {}
+        # Sessions themselves (hashed by identity), so fan-out needs no lookups.
+        self._symbol_clients: Dict[str, Set[ClientSession]] = defaultdict(set)
+        self._last_trades: Dict[str, LastTrade] = {}
+        # In-process consumers (e.g. portfolio valuation): symbols they keep
+        # streamed, refcounted, and callbacks fed every dispatched trade.
+        self._retained: Dict[str, int] = {}
+        self._trade_listeners: List[Callable[[str, float, int], None]] = []
+        # Recent trades per symbol for snapshots and reconnect replay. Unlike
+        # `_last_trades` these outlive the subscription (bounded LRU).
+        self._rings = TradeRings()
+        # Symbols nobody watches any more that stay streamed for
+        # STREAM_REPLAY_GRACE_SECONDS, so a reconnecting client's gap is still
+        # recorded. Values are the timers that finally release them.
+        self._lingering: Dict[str, asyncio.TimerHandle] = {}
         self._connection_task: asyncio.Task | None = None
         self._ws_lock = asyncio.Lock()
         self._send_queue: asyncio.Queue[str] = asyncio.Queue()
+        # Upstream subscribe/unsubscribe frames go through the coalescer.
+        self._commands = SubscriptionCoalescer(self._send_queue.put_nowait)
+        self._interest_task: asyncio.Task | None = None
+        self._interest_dirty = False
         self._connected_event = asyncio.Event()
         self._shutdown_event = asyncio.Event()
 
+    @property
+    def streaming_enabled(self) -> bool:
+        # Workers get trades from the owner, so they don't need the API key.
+        return self.mode == "worker" or get_finnhub_ws_url() is not None
+
+    @property
+    def is_connected(self) -> bool:
+        """True while trades can flow: upstream socket open, or bus joined for workers."""
+        if self.mode == "worker":
+            return self._bus is not None and self._bus.is_connected
+        return self._connected_event.is_set()
+
+    def last_trade(self, symbol: str) -> LastTrade | None:
+        """Latest streamed trade for `symbol`, if anyone is subscribed to it."""
+        return self._last_trades.get(symbol)
+
     async def start(self) -> None:
         """Launch the connection manager once FastAPI finishes booting."""
+        if self._watchdog_task is None or self._watchdog_task.done():
+            self._watchdog_task = asyncio.create_task(self._watch_slow_clients())
+        if self.mode != "standalone" and self._bus is None:
+            self._bus = create_price_bus()
+        if self.mode == "worker":
+            await self._bus.connect_worker(self.worker_id, self._on_bus_trade)
+            await self._bus.set_interest(self.worker_id, self._watched_symbols())
+            return
+        if self.mode == "owner":
+            await self._bus.serve_owner(self._on_worker_interest)
+
         ws_url = get_finnhub_ws_url()
         if not ws_url:
             logger.warning(
                 "FINNHUB_API_KEY is not set; real-time price streaming is disabled."
             )
             return
+        self._commands.start()
         if self._connection_task is None or self._connection_task.done():
             self._connection_task = asyncio.create_task(self._connection_loop())
 
     async def stop(self) -> None:
         """Signal the background task to stop and wait for a graceful exit."""
         self._shutdown_event.set()
+        for timer in self._lingering.values():
+            timer.cancel()
+        self._lingering.clear()
+        if self._watchdog_task:
+            self._watchdog_task.cancel()
         if self._connection_task:
             self._connection_task.cancel()
             try:
                 await self._connection_task
             except asyncio.CancelledError:
                 pass
-
-    async def register_client(self, client_id: str) -> ClientSession:
-        """Create a new session bucket for a frontend connection."""
-        session = ClientSession(id=client_id)
-        self._clients[client_id] = session
+        await self._commands.stop()
+        if self._bus is not None:
+            if self.mode == "worker":
+                await self._bus.disconnect_worker(self.worker_id)
+            await self._bus.close()
+
+    async def register_client(self, encoding: str = JSON) -> ClientSession:
+        """Create a session for a frontend connection; `session.handle` identifies it."""
+        session = ClientSession(
+            next(self._handles),
+            conflate_ms=get_default_conflate_ms(),
+            policy=get_default_backpressure(),
+            encoding=encoding,
+        )
+        self._clients[session.handle] = session
         return session
 
-    async def unregister_client(self, client_id: str) -> None:
+    async def unregister_client(self, client_id: int) -> None:
         """Drop the client and clean up subscriptions that nobody else uses."""
-        session = self._clients.pop(client_id, None)
+        session = self._clients.get(client_id)
         if not session:
             return
 
+        # Detach symbols while the session is still registered, otherwise
+        # `_remove_client_symbol` can't find it and upstream never hears about it.
         for symbol in list(session.symbols):
             await self._remove_client_symbol(client_id, symbol)
+        self._clients.pop(client_id, None)
+        self._dropped_from_closed += session.drops
 
-    async def subscribe(self, client_id: str, symbols: Iterable[str]) -> None:
+    async def subscribe(self, client_id: int, symbols: Iterable[str]) -> None:
         """Attach a client to a list of tickers, subscribing upstream as needed."""
         session = self._clients.get(client_id)
         if not session:
             return
 
+        added = []
+        for raw_symbol in symbols:
+            # Interned so every session shares one string object per ticker.
+            symbol = sys.intern(raw_symbol.upper().strip())
+            if symbol and symbol not in session.symbols:
+                session.symbols.add(symbol)
+                added.append(symbol)
+        if added and session.encoding == BINARY:
+            # Binary trade records carry IDs; tell the client before any can arrive.
+            session.push(
+                encode_event(
+                    {"type": "symbols", "ids": {symbol: self.wire.symbol_id(symbol) for symbol in added}}
+                ),
+                control=True,
+            )
+
+        for symbol in added:
+            watchers = self._symbol_clients[symbol]
+            watchers.add(session)
+            # Go upstream only when this is the very first watcher.
+            if len(watchers) == 1 and symbol not in self._retained:
+                await self._symbol_watched(symbol)
+
+    async def send_snapshot(
+        self, client_id: int, symbols: Iterable[str], since: int | None = None
+    ) -> None:
+        """
+        Catch a client up from the trade rings. Without `since` it gets the last
+        known trade per symbol (`snapshot`); with `since` (epoch ms) it gets
+        every buffered trade newer than that, oldest first (`replay`).
+        """
+        session = self._clients.get(client_id)
+        if not session:
+            return
+
+        entries = []
+        truncated = False
         for raw_symbol in symbols:
             symbol = raw_symbol.upper().strip()
-            if not symbol or symbol in session.symbols:
+            ring = self._rings.get(symbol)
+            if ring is None or symbol not in session.symbols:
                 continue
-            session.symbols.add(symbol)
-            self._symbol_clients[symbol].add(client_id)
-            # Tell Finnhub only when this is the very first watcher.
-            if len(self._symbol_clients[symbol]) == 1:
-                await self._send_command({"type": "subscribe", "symbol": symbol})
+            if since is not None:
+                trades = ring.since(since)
+                truncated = truncated or not ring.covers(since)
+            else:
+                trades = [ring.latest()]
+            entries.extend((timestamp, symbol, price, volume) for timestamp, price, volume in trades)
+        if not entries:
+            return
+        if since is not None:
+            entries.sort(key=lambda entry: entry[0])
+
+        if session.conflate_ms:
+            # Conflated clients get the catch-up folded into their next window.
+            for timestamp, symbol, price, volume in entries:
+                self._conflate(session, symbol, price, volume, timestamp)
+            return
 
-    async def unsubscribe(self, client_id: str, symbols: Iterable[str]) -> None:
+        trades = [
+            {"symbol": symbol, "price": price, "volume": volume, "timestamp": timestamp}
+            for timestamp, symbol, price, volume in entries
+        ]
+        if since is None:
+            event = {"type": "snapshot", "trades": trades}
+        else:
+            # `truncated` means older missed trades fell out of the buffer.
+            event = {"type": "replay", "since": since, "truncated": truncated, "trades": trades}
+        session.push(encode_event(event))
+
+    async def set_conflation(self, client_id: int, interval_ms: Any) -> int:
+        """Switch a client between per-trade delivery and conflated windows."""
+        session = self._clients.get(client_id)
+        if not session:
+            return 0
+
+        interval = clamp_conflate_ms(interval_ms)
+        if interval == session.conflate_ms:
+            return interval
+        session.conflate_ms = interval
+        if interval:
+            # Per-trade frames already queued would bypass the new window.
+            session.clear()
+        elif session.policy != LATEST:
+            self._flush_pending(session)
+        return interval
+
+    async def set_backpressure(self, client_id: int, policy: Any) -> str | None:
+        """Pick what happens when this client falls behind; None if `policy` is unknown."""
+        session = self._clients.get(client_id)
+        if not session or policy not in BACKPRESSURE_POLICIES:
+            return None
+        session.policy = policy
+        if policy != LATEST and not session.conflate_ms:
+            self._flush_pending(session)
+        return policy
+
+    def _flush_pending(self, session: ClientSession) -> None:
+        """
+        Queue windows folded under `latest` as ordinary frames. Left pending,
+        they would be sent after newer queued trades, and `disconnect` would
+        take them for a client that is still behind.
+        """
+        pending, session.pending = session.pending, {}
+        for symbol, window in pending.items():
+            session.push(
+                self.wire.trade(
+                    session.encoding, symbol, window.price, window.volume, window.timestamp, trades=window.trades
+                )
+            )
+
+    async def unsubscribe(self, client_id: int, symbols: Iterable[str]) -> None:
         """Detach a client from specific tickers."""
         for raw_symbol in symbols:
             symbol = raw_symbol.upper().strip()
             await self._remove_client_symbol(client_id, symbol)
 
-    async def _remove_client_symbol(self, client_id: str, symbol: str) -> None:
+    async def _remove_client_symbol(self, client_id: int, symbol: str) -> None:
         session = self._clients.get(client_id)
         if not session or symbol not in session.symbols:
             return
 
         session.symbols.discard(symbol)
+        session.pending.pop(symbol, None)
         clients = self._symbol_clients.get(symbol)
-        if clients and client_id in clients:
-            clients.remove(client_id)
+        if clients is not None:
+            clients.discard(session)
         if clients is not None and len(clients) == 0:
             self._symbol_clients.pop(symbol, None)
-            await self._send_command({"type": "unsubscribe", "symbol": symbol})
+            if symbol not in self._retained:
+                await self._symbol_unwatched(symbol)
+
+    async def retain(self, symbols: Iterable[str]) -> None:
+        """Keep `symbols` streamed for an in-process consumer, with or without clients."""
+        for symbol in symbols:
+            count = self._retained.get(symbol, 0) + 1
+            self._retained[symbol] = count
+            if count == 1 and symbol not in self._symbol_clients:
+                await self._symbol_watched(symbol)
+
+    async def release(self, symbols: Iterable[str]) -> None:
+        """Undo one `retain` per symbol."""
+        for symbol in symbols:
+            count = self._retained.get(symbol, 0) - 1
+            if count > 0:
+                self._retained[symbol] = count
+                continue
+            if self._retained.pop(symbol, None) is not None and symbol not in self._symbol_clients:
+                await self._symbol_unwatched(symbol)
+
+    def add_trade_listener(self, listener: Callable[[str, float, int], None]) -> None:
+        """Call `listener(symbol, price, timestamp)` for every trade on a watched symbol."""
+        self._trade_listeners.append(listener)
+
+    def _is_watched(self, symbol: str) -> bool:
+        return symbol in self._symbol_clients or symbol in self._retained
+
+    def _is_streamed(self, symbol: str) -> bool:
+        """Watched locally, or still inside its replay grace period."""
+        return self._is_watched(symbol) or symbol in self._lingering
 
-    async def forward_client_messages(self, client_id: str, websocket_send) -> None:
+    def _watched_symbols(self) -> Set[str]:
+        return self._symbol_clients.keys() | self._retained.keys() | self._lingering.keys()
+
+    async def _symbol_watched(self, symbol: str) -> None:
+        """First local watcher for `symbol` arrived."""
+        timer = self._lingering.pop(symbol, None)
+        if timer is not None:
+            # Never stopped streaming; nothing to ask for.
+            timer.cancel()
+            return
+        if self.mode == "worker":
+            self._schedule_interest()
+        elif not self._bus_refcounts.get(symbol):
+            self._commands.want(symbol)
+
+    async def _symbol_unwatched(self, symbol: str) -> None:
+        """Last local watcher for `symbol` left."""
+        # Only watchers read it, so the last trade would silently go stale.
+        self._last_trades.pop(symbol, None)
+        grace = get_replay_grace_seconds()
+        if grace > 0:
+            self._lingering[symbol] = asyncio.get_running_loop().call_later(
+                grace, self._stop_streaming, symbol
+            )
+        else:
+            self._stop_streaming(symbol)
+
+    def _stop_streaming(self, symbol: str) -> None:
+        self._lingering.pop(symbol, None)
+        if self.mode == "worker":
+            self._schedule_interest()
+        elif not self._bus_refcounts.get(symbol):
+            self._commands.release(symbol)
+
+    def _schedule_interest(self) -> None:
+        """Worker: publish the interest set once the current burst of changes settles."""
+        self._interest_dirty = True
+        if self._interest_task is None or self._interest_task.done():
+            self._interest_task = asyncio.create_task(self._publish_interest())
+
+    async def _publish_interest(self) -> None:
+        while self._interest_dirty:
+            await asyncio.sleep(self._commands.debounce)
+            self._interest_dirty = False
+            if self._bus is not None:
+                await self._bus.set_interest(self.worker_id, self._watched_symbols())
+
+    async def _on_worker_interest(self, worker_id: str, symbols: Set[str]) -> None:
+        """Owner: a worker replaced its interest set; adjust upstream refcounts."""
+        previous = self._worker_interest.pop(worker_id, set())
+        if symbols:
+            self._worker_interest[worker_id] = set(symbols)
+
+        for symbol in symbols - previous:
+            self._bus_refcounts[symbol] = self._bus_refcounts.get(symbol, 0) + 1
+            if self._bus_refcounts[symbol] == 1 and not self._is_streamed(symbol):
+                self._commands.want(symbol)
+        for symbol in previous - symbols:
+            remaining = self._bus_refcounts.get(symbol, 0) - 1
+            if remaining > 0:
+                self._bus_refcounts[symbol] = remaining
+                continue
+            self._bus_refcounts.pop(symbol, None)
+            if not self._is_streamed(symbol):
+                self._commands.release(symbol)
+
+    async def _on_bus_trade(self, trade: Dict[str, Any]) -> None:
+        """Worker: a trade for one of our symbols arrived from the owner."""
+        await self._dispatch_trade(
+            trade["symbol"], trade["price"], trade["timestamp"], trade.get("volume")
+        )
+
+    async def forward_client_messages(self, client_id: int, websocket_send) -> str | None:
         """
         Continuously drain the client's queue and push events into its WebSocket.
 
         `websocket_send` is injected by the FastAPI route so this service remains
         framework-agnostic; it simply has to be an `await`-able callable that
-        accepts a JSON-serializable dict.
+        accepts an already JSON-encoded text frame.
+
+        Returns the eviction reason if the client was dropped as a slow consumer;
+        the caller should then close the socket.
         """
         session = self._clients.get(client_id)
         if not session:
-            return
+            return None
 
+        session.task = asyncio.current_task()
+        try:
+            while True:
+                await session.wait()
+                while session.queue:
+                    session.sending_since = time.monotonic()
+                    await websocket_send(session.pop())
+                session.sending_since = 0.0
+
+                if session.pending:
+                    pending, session.pending = session.pending, {}
+                    for symbol, window in pending.items():
+                        session.sending_since = time.monotonic()
+                        await websocket_send(
+                            self.wire.trade(
+                                session.encoding,
+                                symbol,
+                                window.price,
+                                window.volume,
+                                window.timestamp,
+                                trades=window.trades,
+                            )
+                        )
+                    session.sending_since = 0.0
+                    if session.conflate_ms:
+                        await asyncio.sleep(session.conflate_ms / 1000)
+        except asyncio.CancelledError:
+            # `_evict` cancels us to break out of a stuck send; anything else is
+            # a real cancellation.
+            if session.evicted is None:
+                raise
+        finally:
+            session.task = None
+
+        await self.unregister_client(client_id)
+        return session.evicted
+
+    def _evict(self, session: ClientSession, reason: str) -> None:
+        """Cut off a slow consumer and free what it holds. Safe to call mid-fan-out."""
+        if session.evicted is not None:
+            return
+        session.evicted = reason
+        self._evictions += 1
+        logger.warning("evicting price stream client %s: %s", session.handle, reason)
+        session.clear(keep_control=False)
+        session.pending = {}
+        if session.task is not None:
+            session.task.cancel()
+
+    async def _watch_slow_clients(self) -> None:
+        """
+        Evict clients whose socket write is stuck or who lag past the limit.
+        A limit of 0 turns that check off.
+        """
+        send_timeout = get_send_timeout_seconds()
+        max_lag = get_max_lag_seconds()
+        limits = [limit for limit in (send_timeout, max_lag) if limit > 0]
+        if not limits:
+            return
+        interval = max(WATCHDOG_MIN_INTERVAL, min(1.0, *(limit / 4 for limit in limits)))
         while True:
-            payload = await session.queue.get()
-            await websocket_send(payload)
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for session in self._clients.values():
+                if send_timeout > 0 and session.sending_since and now - session.sending_since > send_timeout:
+                    self._evict(session, "send timed out")
+                elif max_lag > 0 and session.policy == DISCONNECT and session.lag(now) > max_lag:
+                    self._evict(session, "lagging")
+
+    def client_stats(self, slowest: int = 5) -> Dict[str, Any]:
+        now = time.monotonic()
+        sessions = list(self._clients.values())
+        lagging = sorted(
+            (session for session in sessions if session.queue),
+            key=lambda session: session.queue[0][0],
+        )
+        policies: Dict[str, int] = defaultdict(int)
+        for session in sessions:
+            policies[session.policy] += 1
+        return {
+            "connected": len(sessions),
+            "policies": dict(policies),
+            "evicted": self._evictions,
+            "drops": self._dropped_from_closed + sum(session.drops for session in sessions),
+            "lagging": len(lagging),
+            "max_lag_ms": round(lagging[0].lag(now) * 1000) if lagging else 0,
+            "slowest": [
+                {
+                    "client": session.handle,
+                    "policy": session.policy,
+                    "lag_ms": round(session.lag(now) * 1000),
+                    "queued": len(session.queue),
+                    "drops": session.drops,
+                }
+                for session in lagging[:slowest]
+            ],
+        }
 
     async def _send_command(self, payload: dict[str, Any]) -> None:
-        """Queue an instruction (`subscribe`/`unsubscribe`/`pong`)."""
+        """Queue an instruction that bypasses the coalescer (`pong`)."""
         await self._send_queue.put(json.dumps(payload))
 
     async def _connection_loop(self) -> None:
@@ -164,7 +715,7 @@ class FinnhubStreamManager:
                 async with websockets.connect(ws_url) as ws:
                     self._connected_event.set()
                     backoff = 1.0  # Reset once we successfully connect.
-                    await self._resubscribe_all()
+                    self._resubscribe_all()
                     sender = asyncio.create_task(self._sender(ws))
                     receiver = asyncio.create_task(self._receiver(ws))
                     await asyncio.wait(
@@ -178,6 +729,7 @@ class FinnhubStreamManager:
                 print(f"[FinnhubStreamManager] connection error: {exc}")
             finally:
                 self._connected_event.clear()
+                self._commands.on_disconnected()
 
             if self._shutdown_event.is_set():
                 break
@@ -185,11 +737,16 @@ class FinnhubStreamManager:
             await asyncio.sleep(backoff)
             backoff = min(backoff * 2, 30)
 
-    async def _resubscribe_all(self) -> None:
+    def _resubscribe_all(self) -> None:
         """When we reconnect, replay all active subscriptions."""
-        active_symbols = list(self._symbol_clients.keys())
-        for symbol in active_symbols:
-            await self._send_command({"type": "subscribe", "symbol": symbol})
+        # Frames queued for the old socket are stale; the coalescer re-derives
+        # what the new one needs from the desired set.
+        while not self._send_queue.empty():
+            self._send_queue.get_nowait()
+        self._commands.on_connected()
+
+    def command_stats(self) -> Dict[str, Any]:
+        return self._commands.stats()
 
     async def _sender(self, ws: websockets.WebSocketClientProtocol) -> None:
         """Forward queued commands to Finnhub."""
@@ -229,38 +786,89 @@ class FinnhubStreamManager:
             volume = trade.get("v")
             if not symbol or price is None:
                 continue
-            await self._broadcast_trade(symbol, price, ts, volume)
+            ts = ts or int(time.time() * 1000)
+            await self._dispatch_trade(symbol, price, ts, volume)
+            if self._bus is not None and self._bus_refcounts.get(symbol):
+                await self._bus.publish(
+                    {"symbol": symbol, "price": price, "volume": volume, "timestamp": ts}
+                )
+
+    async def _dispatch_trade(
+        self, symbol: str, price: float, timestamp: int, volume: float | None
+    ) -> None:
+        """Record the trade for local readers and fan it out to local clients."""
+        if self._is_watched(symbol):
+            self._last_trades[symbol] = LastTrade(price=price, volume=volume, timestamp=timestamp)
+            self._rings.append(symbol, timestamp, price, volume)
+            for listener in self._trade_listeners:
+                listener(symbol, price, timestamp)
+        elif symbol in self._lingering:
+            # Nobody is watching, but a reconnecting client may ask for a replay.
+            self._rings.append(symbol, timestamp, price, volume)
+        await self._broadcast_trade(symbol, price, timestamp, volume)
 
     async def _broadcast_trade(
         self, symbol: str, price: float, timestamp: int | None, volume: float | None
     ) -> None:
-        """Push a normalized trade payload into every interested client's queue."""
+        """
+        Push a normalized trade into every interested client's queue. The event
+        is encoded once per wire format and that frame is shared by all clients.
+        """
         clients = self._symbol_clients.get(symbol)
         if not clients:
             return
 
-        event = {
-            "type": "trade",
-            "symbol": symbol,
-            "price": price,
-            "volume": volume,
-            "timestamp": timestamp or int(time.time() * 1000),
-            "source": "finnhub",
-        }
-
-        for client_id in list(clients):
-            connection = self._clients.get(client_id)
-            if not connection:
+        timestamp = timestamp or int(time.time() * 1000)
+        if self.wire.needs_rebase(timestamp):
+            self._announce_time_base()
+        # One encoded frame per wire format, shared by every client using it.
+        frames: Dict[str, str | bytes] = {}
+
+        # Nothing below awaits or changes subscriptions, so the set can be
+        # iterated in place instead of copied for every trade.
+        for connection in clients:
+            if connection.conflate_ms:
+                self._conflate(connection, symbol, price, volume, timestamp)
                 continue
-            try:
-                connection.queue.put_nowait(event)
-            except asyncio.QueueFull:
-                # Drop the oldest item to keep latency low if a client is slow.
-                try:
-                    connection.queue.get_nowait()
-                except asyncio.QueueEmpty:
-                    pass
-                connection.queue.put_nowait(event)
+            if connection.is_full() or symbol in connection.pending:
+                # Client is behind (or still catching up on this symbol).
+                if connection.policy == LATEST:
+                    connection.drops += 1
+                    self._conflate(connection, symbol, price, volume, timestamp)
+                    continue
+                if connection.policy == DISCONNECT:
+                    self._evict(connection, "queue full")
+                    continue
+            frame = frames.get(connection.encoding)
+            if frame is None:
+                frame = frames[connection.encoding] = self.wire.trade(
+                    connection.encoding, symbol, price, volume, timestamp
+                )
+            connection.push(frame)
+
+    def _announce_time_base(self) -> None:
+        """Binary clients must learn a moved time base before the next record."""
+        frame = encode_event({"type": "timeBase", "timeBase": self.wire.time_base})
+        for session in self._clients.values():
+            if session.encoding == BINARY:
+                session.push(frame, control=True)
+
+    @staticmethod
+    def _conflate(
+        connection: ClientSession, symbol: str, price: float, volume: float | None, timestamp: int
+    ) -> None:
+        """Fold a trade into the client's pending window for `symbol`."""
+        window = connection.pending.get(symbol)
+        if window is None:
+            connection.pending[symbol] = ConflationWindow(
+                price=price, volume=volume or 0, trades=1, timestamp=timestamp
+            )
+        else:
+            window.price = price
+            window.volume += volume or 0
+            window.trades += 1
+            window.timestamp = timestamp
+        connection.wake()
 
 
 price_stream_manager = FinnhubStreamManager()
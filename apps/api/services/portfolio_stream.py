@@ -0,0 +1,347 @@
+"""
+Live portfolio valuation pushed over `/stream/portfolio`.
+
+For every user with at least one connected client, the holdings are loaded
+once and indexed by symbol. Trades only record the symbol's latest price
+(O(1) per trade, however many portfolios hold it). On each tick, every symbol
+that moved applies one delta per holder:
+
+    value += quantity * (new_price - previous_price)
+
+and each portfolio that changed sends one update with its running total and
+P&L against `avg_cost`. Whole portfolios are only re-summed on load and
+periodically, to wash out floating-point drift.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+from services.live_prices import ClientSession, FinnhubStreamManager, encode_event, price_stream_manager
+
+logger = logging.getLogger(__name__)
+
+# (symbol, quantity, avg_cost) rows for one user.
+HoldingRow = Tuple[str, float, float]
+HoldingsLoader = Callable[[str], Awaitable[List[HoldingRow]]]
+
+# Re-sum a portfolio from scratch after this many incremental updates.
+RESUM_EVERY = 10_000
+
+
+def get_tick_seconds() -> float:
+    return max(float(os.getenv("PORTFOLIO_STREAM_INTERVAL_MS", "250")), 10.0) / 1000
+
+
+async def load_holdings_from_db(user_id: str) -> List[HoldingRow]:
+    """Read a user's holdings rows through the async engine."""
+    from uuid import UUID
+
+    from crud.holding import lots
+    from db.async_session import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        return await lots(db, UUID(user_id))
+
+
+class Position:
+    __slots__ = ("quantity", "cost")
+
+    def __init__(self, quantity: float, cost: float) -> None:
+        self.quantity = quantity
+        # Total cost basis (quantity * avg_cost, summed over lots).
+        self.cost = cost
+
+
+class Portfolio:
+    """Running valuation of one user's holdings."""
+
+    __slots__ = (
+        "user_id", "positions", "value", "priced_cost", "unpriced",
+        "watchers", "updates", "updated_at", "unloaded",
+    )
+
+    def __init__(self, user_id: str, positions: Dict[str, Position]) -> None:
+        self.user_id = user_id
+        self.positions = positions
+        self.value = 0.0
+        # Cost basis of the positions that have a price; P&L ignores the rest.
+        self.priced_cost = 0.0
+        self.unpriced = len(positions)
+        self.watchers: Set[ClientSession] = set()
+        self.updates = 0
+        self.updated_at = 0
+        # Set once its symbols were released; a portfolio is never reused after.
+        self.unloaded = False
+
+    def resum(self, prices: Dict[str, float | None]) -> None:
+        self.value = self.priced_cost = 0.0
+        self.unpriced = 0
+        for symbol, position in self.positions.items():
+            price = prices.get(symbol)
+            if price is None:
+                self.unpriced += 1
+                continue
+            self.value += position.quantity * price
+            self.priced_cost += position.cost
+        self.updates = 0
+
+    def totals(self) -> Dict[str, Any]:
+        pnl = self.value - self.priced_cost
+        return {
+            "userId": self.user_id,
+            "value": round(self.value, 2),
+            "cost": round(self.priced_cost, 2),
+            "pnl": round(pnl, 2),
+            "pnlPercent": round(pnl / self.priced_cost * 100, 2) if self.priced_cost else None,
+            "positions": len(self.positions),
+            "unpriced": self.unpriced,
+            "timestamp": self.updated_at,
+        }
+
+
+class SymbolHolders:
+    """Every loaded portfolio holding one symbol, and the price last applied to them."""
+
+    __slots__ = ("price", "applied_price", "timestamp", "holders")
+
+    def __init__(self, price: float | None) -> None:
+        self.price = price
+        self.applied_price = price
+        self.timestamp = 0
+        self.holders: Dict[Portfolio, Position] = {}
+
+
+class PortfolioStreamManager:
+    def __init__(
+        self,
+        prices: FinnhubStreamManager,
+        load_holdings: HoldingsLoader = load_holdings_from_db,
+    ) -> None:
+        self._prices = prices
+        self._load_holdings = load_holdings
+        self._portfolios: Dict[str, Portfolio] = {}
+        self._index: Dict[str, SymbolHolders] = {}
+        self._moved: Set[str] = set()
+        self._handles = 0
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._tick_task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        prices.add_trade_listener(self._on_trade)
+        self.ticks = 0
+        self.deltas_applied = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self._tick_task is None or self._tick_task.done():
+            self._tick_task = asyncio.create_task(self._tick_loop())
+
+    async def stop(self) -> None:
+        if self._tick_task is not None:
+            self._tick_task.cancel()
+            try:
+                await self._tick_task
+            except asyncio.CancelledError:
+                pass
+
+    # --- trades -------------------------------------------------------------
+    def _on_trade(self, symbol: str, price: float, timestamp: int) -> None:
+        entry = self._index.get(symbol)
+        if entry is None:
+            return
+        entry.price = price
+        entry.timestamp = timestamp
+        self._moved.add(symbol)
+
+    async def _tick_loop(self) -> None:
+        interval = get_tick_seconds()
+        while True:
+            await asyncio.sleep(interval)
+            self._tick()
+
+    def _tick(self) -> None:
+        """Apply the symbols that moved since the last tick and push changed totals."""
+        if not self._moved:
+            return
+        moved, self._moved = self._moved, set()
+        changed: Set[Portfolio] = set()
+        for symbol in moved:
+            entry = self._index.get(symbol)
+            if entry is None or entry.price == entry.applied_price:
+                continue
+            previous, entry.applied_price = entry.applied_price, entry.price
+            for portfolio, position in entry.holders.items():
+                if previous is None:
+                    # First price for this symbol: the position joins the totals.
+                    portfolio.value += position.quantity * entry.price
+                    portfolio.priced_cost += position.cost
+                    portfolio.unpriced -= 1
+                else:
+                    portfolio.value += position.quantity * (entry.price - previous)
+                portfolio.updates += 1
+                portfolio.updated_at = max(portfolio.updated_at, entry.timestamp)
+                changed.add(portfolio)
+            self.deltas_applied += len(entry.holders)
+
+        self.ticks += 1
+        for portfolio in changed:
+            if portfolio.updates > RESUM_EVERY:
+                portfolio.resum(self._applied_prices(portfolio))
+            frame = encode_event({"type": "portfolio", **portfolio.totals()})
+            for watcher in portfolio.watchers:
+                watcher.push(frame)
+
+    def _applied_prices(self, portfolio: Portfolio) -> Dict[str, float | None]:
+        return {symbol: self._index[symbol].applied_price for symbol in portfolio.positions}
+
+    # --- clients ------------------------------------------------------------
+    async def watch(self, user_id: str) -> ClientSession:
+        """Register a client for `user_id`'s valuation; loads the portfolio if needed."""
+        portfolio = self._portfolios.get(user_id)
+        if portfolio is None:
+            portfolio = await self._load(user_id)
+        self._handles += 1
+        session = ClientSession(self._handles)
+        portfolio.watchers.add(session)
+        session.push(self._snapshot(portfolio))
+        return session
+
+    async def unwatch(self, user_id: str, session: ClientSession) -> None:
+        portfolio = self._portfolios.get(user_id)
+        if portfolio is None:
+            return
+        portfolio.watchers.discard(session)
+        if not portfolio.watchers:
+            await self._unload(portfolio)
+
+    async def forward(self, session: ClientSession, send) -> None:
+        """Drain a watcher's frames into its socket until cancelled."""
+        while True:
+            await session.wait()
+            while session.queue:
+                await send(session.pop())
+
+    def holdings_changed(self, user_id: Any) -> None:
+        """
+        Reload a watched user's holdings after a write. Safe to call from the
+        worker threads that run the sync holdings routes.
+        """
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._schedule_reload, str(user_id))
+
+    def _schedule_reload(self, user_id: str) -> None:
+        if user_id in self._portfolios and user_id not in self._loading:
+            self._loading[user_id] = asyncio.create_task(self._reload(user_id))
+
+    async def _reload(self, user_id: str) -> None:
+        try:
+            old = self._portfolios.get(user_id)
+            if old is None:
+                return
+            watchers = old.watchers
+            new = await self._load(user_id, replace=old)
+            if new.watchers:
+                # Everyone left during the reload and a new watcher has since
+                # loaded a fresh portfolio; that one is current.
+                return
+            new.watchers = watchers
+            if not watchers:
+                # Everyone left while we were reloading.
+                await self._unload(new)
+                return
+            snapshot = self._snapshot(new)
+            for watcher in watchers:
+                watcher.push(snapshot)
+        except Exception as exc:
+            logger.warning("reloading portfolio %s failed: %s", user_id, exc)
+        finally:
+            self._loading.pop(user_id, None)
+
+    # --- loading ------------------------------------------------------------
+    async def _load(self, user_id: str, replace: Portfolio | None = None) -> Portfolio:
+        rows = await self._load_holdings(user_id)
+        positions: Dict[str, Position] = {}
+        for symbol, quantity, avg_cost in rows:
+            symbol = symbol.upper().strip()
+            position = positions.get(symbol)
+            if position is None:
+                positions[symbol] = Position(quantity, quantity * avg_cost)
+            else:
+                position.quantity += quantity
+                position.cost += quantity * avg_cost
+
+        # Someone may have loaded it while we were reading the database.
+        current = self._portfolios.get(user_id)
+        if current is not None and current is not replace:
+            return current
+
+        portfolio = Portfolio(user_id, positions)
+        await self._prices.retain(positions)
+        for symbol, position in positions.items():
+            entry = self._index.get(symbol)
+            if entry is None:
+                last = self._prices.last_trade(symbol)
+                entry = self._index[symbol] = SymbolHolders(last.price if last else None)
+                if last:
+                    entry.timestamp = last.timestamp
+            entry.holders[portfolio] = position
+        portfolio.resum(self._applied_prices(portfolio))
+        portfolio.updated_at = int(time.time() * 1000)
+
+        if replace is not None:
+            await self._unload(replace)
+        self._portfolios[user_id] = portfolio
+        return portfolio
+
+    async def _unload(self, portfolio: Portfolio) -> None:
+        # A reload can race the last unwatch; release the symbols only once.
+        if portfolio.unloaded:
+            return
+        portfolio.unloaded = True
+        if self._portfolios.get(portfolio.user_id) is portfolio:
+            del self._portfolios[portfolio.user_id]
+        for symbol in portfolio.positions:
+            entry = self._index.get(symbol)
+            if entry is None:
+                continue
+            entry.holders.pop(portfolio, None)
+            if not entry.holders:
+                del self._index[symbol]
+                self._moved.discard(symbol)
+        await self._prices.release(portfolio.positions)
+
+    def _snapshot(self, portfolio: Portfolio) -> str:
+        positions = []
+        for symbol, position in portfolio.positions.items():
+            price = self._index[symbol].applied_price
+            value = position.quantity * price if price is not None else None
+            positions.append(
+                {
+                    "symbol": symbol,
+                    "quantity": position.quantity,
+                    "avgCost": round(position.cost / position.quantity, 4) if position.quantity else None,
+                    "price": price,
+                    "value": round(value, 2) if value is not None else None,
+                    "pnl": round(value - position.cost, 2) if value is not None else None,
+                }
+            )
+        return encode_event({"type": "portfolio_snapshot", **portfolio.totals(), "holdings": positions})
+
+    def stats(self) -> Dict[str, Any]:
+        holders = [len(entry.holders) for entry in self._index.values()]
+        return {
+            "portfolios": len(self._portfolios),
+            "watchers": sum(len(portfolio.watchers) for portfolio in self._portfolios.values()),
+            "symbols": len(self._index),
+            "max_holders_per_symbol": max(holders, default=0),
+            "ticks": self.ticks,
+            "deltas_applied": self.deltas_applied,
+        }
+
+
+portfolio_stream_manager = PortfolioStreamManager(price_stream_manager)
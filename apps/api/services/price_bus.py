@@ -0,0 +1,409 @@
+"""
+Pub/sub backbone that lets several API processes share one Finnhub stream.
+
+One process owns the upstream WebSocket (`PRICE_STREAM_MODE=owner`, or the
+headless `python -m services.price_bus`). Every other API worker runs with
+`PRICE_STREAM_MODE=worker`: it never talks to Finnhub and instead tells the
+owner which symbols its own clients need, then receives normalized trades for
+just those symbols over the bus.
+
+Workers always announce their *full* interest set, so the owner can keep exact
+per-worker reference counts, and a worker that disappears is reported once with
+an empty set. Backends are picked by `PRICE_BUS_URL`:
+
+- `memory://`: in-process, for tests and single-process setups.
+- `unix:///path/to/prices.sock`: owner listens on a Unix socket, workers on the
+  same host connect to it.
+- `redis://host:6379/0`: any Redis-compatible server (needs the `redis` package).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Iterable, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger("price_bus")
+
+TradeHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+InterestHandler = Callable[[str, Set[str]], Awaitable[None]]
+
+DEFAULT_BUS_URL = "unix:///tmp/portfolio-prices.sock"
+
+
+def get_heartbeat_seconds() -> float:
+    return float(os.getenv("PRICE_BUS_HEARTBEAT_SECONDS", "10"))
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class PriceBus(ABC):
+    """Transport between the upstream owner and API workers."""
+
+    # --- owner side -------------------------------------------------------
+    @abstractmethod
+    async def serve_owner(self, on_interest: InterestHandler) -> None:
+        """Start accepting worker interest updates."""
+
+    @abstractmethod
+    async def publish(self, trade: Dict[str, Any]) -> None:
+        """Send one normalized trade to the workers interested in its symbol."""
+
+    # --- worker side ------------------------------------------------------
+    @abstractmethod
+    async def connect_worker(self, worker_id: str, on_trade: TradeHandler) -> None:
+        """Start receiving trades for this worker."""
+
+    @abstractmethod
+    async def set_interest(self, worker_id: str, symbols: Iterable[str]) -> None:
+        """Replace the set of symbols this worker needs."""
+
+    @abstractmethod
+    async def disconnect_worker(self, worker_id: str) -> None:
+        """Withdraw all interest for this worker and stop receiving trades."""
+
+    @property
+    def is_connected(self) -> bool:
+        return True
+
+    async def close(self) -> None:
+        return None
+
+
+class InProcessPriceBus(PriceBus):
+    """Owner and workers live in the same event loop; used by tests."""
+
+    def __init__(self) -> None:
+        self._on_interest: InterestHandler | None = None
+        self._workers: Dict[str, TradeHandler] = {}
+        self._interest: Dict[str, Set[str]] = {}
+
+    async def serve_owner(self, on_interest: InterestHandler) -> None:
+        self._on_interest = on_interest
+        for worker_id, symbols in self._interest.items():
+            await on_interest(worker_id, set(symbols))
+
+    async def publish(self, trade: Dict[str, Any]) -> None:
+        symbol = trade["symbol"]
+        for worker_id, on_trade in list(self._workers.items()):
+            if symbol in self._interest.get(worker_id, ()):
+                await on_trade(dict(trade))
+
+    async def connect_worker(self, worker_id: str, on_trade: TradeHandler) -> None:
+        self._workers[worker_id] = on_trade
+
+    async def set_interest(self, worker_id: str, symbols: Iterable[str]) -> None:
+        self._interest[worker_id] = set(symbols)
+        if self._on_interest is not None:
+            await self._on_interest(worker_id, set(self._interest[worker_id]))
+
+    async def disconnect_worker(self, worker_id: str) -> None:
+        self._workers.pop(worker_id, None)
+        if self._interest.pop(worker_id, None) and self._on_interest is not None:
+            await self._on_interest(worker_id, set())
+
+
+class _UnixWorkerConnection:
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.worker_id: str | None = None
+        self.symbols: Set[str] = set()
+
+
+class UnixSocketPriceBus(PriceBus):
+    """
+    Newline-delimited JSON over a Unix socket. The owner filters trades per
+    connection, so a worker only ever reads the symbols it asked for.
+    """
+
+    # Drop a worker whose socket buffer backs up this far; it will reconnect
+    # and re-announce its interest.
+    MAX_BUFFERED_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._server: asyncio.AbstractServer | None = None
+        self._on_interest: InterestHandler | None = None
+        self._connections: Set[_UnixWorkerConnection] = set()
+        # Worker side
+        self._worker_task: asyncio.Task | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._symbols: Set[str] = set()
+        self._worker_id: str | None = None
+
+    # --- owner ------------------------------------------------------------
+    async def serve_owner(self, on_interest: InterestHandler) -> None:
+        self._on_interest = on_interest
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_worker, path=self.path)
+
+    async def _handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = _UnixWorkerConnection(writer)
+        self._connections.add(connection)
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                if message.get("op") == "interest":
+                    connection.worker_id = message["worker"]
+                    connection.symbols = set(message.get("symbols", []))
+                    await self._on_interest(connection.worker_id, set(connection.symbols))
+        except Exception as exc:
+            logger.warning("price bus worker connection failed: %s", exc)
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+            # A worker that already reconnected has announced its interest on
+            # the new connection; clearing it here would unsubscribe it.
+            if connection.worker_id is not None and not any(
+                other.worker_id == connection.worker_id for other in self._connections
+            ):
+                await self._on_interest(connection.worker_id, set())
+
+    async def publish(self, trade: Dict[str, Any]) -> None:
+        symbol = trade["symbol"]
+        line: bytes | None = None
+        for connection in list(self._connections):
+            if symbol not in connection.symbols:
+                continue
+            if line is None:
+                line = _encode({"op": "trade", **trade})
+            transport = connection.writer.transport
+            if transport.get_write_buffer_size() > self.MAX_BUFFERED_BYTES:
+                logger.warning("dropping slow price bus worker %s", connection.worker_id)
+                transport.abort()
+                continue
+            connection.writer.write(line)
+
+    # --- worker -----------------------------------------------------------
+    @property
+    def is_connected(self) -> bool:
+        return self._server is not None or self._writer is not None
+
+    async def connect_worker(self, worker_id: str, on_trade: TradeHandler) -> None:
+        self._worker_id = worker_id
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self._worker_loop(on_trade))
+
+    async def _worker_loop(self, on_trade: TradeHandler) -> None:
+        backoff = 0.5
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self._writer = writer
+                backoff = 0.5
+                await self._send_interest()
+                async for line in reader:
+                    message = json.loads(line)
+                    if message.pop("op", None) == "trade":
+                        await on_trade(message)
+            except Exception as exc:
+                logger.warning("price bus connection to owner failed: %s", exc)
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
+                self._writer = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 10)
+
+    async def _send_interest(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.write(
+            _encode({"op": "interest", "worker": self._worker_id, "symbols": sorted(self._symbols)})
+        )
+        await self._writer.drain()
+
+    async def set_interest(self, worker_id: str, symbols: Iterable[str]) -> None:
+        self._symbols = set(symbols)
+        try:
+            await self._send_interest()
+        except ConnectionError:
+            # The reconnect loop re-sends the latest interest.
+            pass
+
+    async def disconnect_worker(self, worker_id: str) -> None:
+        self._symbols = set()
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for connection in list(self._connections):
+                connection.writer.close()
+            self._server = None
+
+
+class RedisPriceBus(PriceBus):
+    """
+    Redis pub/sub: trades go to `prices:trade:<SYMBOL>` so each worker only
+    subscribes to its own symbols. Interest is announced on `prices:interest`
+    and repeated as a heartbeat; the owner forgets workers that go quiet.
+    """
+
+    TRADE_PREFIX = "prices:trade:"
+    INTEREST_CHANNEL = "prices:interest"
+    SYNC_CHANNEL = "prices:interest:sync"
+
+    def __init__(self, url: str) -> None:
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("PRICE_BUS_URL=redis://... requires the `redis` package") from exc
+
+        self._redis = redis_asyncio.from_url(url)
+        self._pubsub = self._redis.pubsub()
+        self._tasks: list[asyncio.Task] = []
+        self._heartbeat = get_heartbeat_seconds()
+        # Owner side
+        self._on_interest: InterestHandler | None = None
+        self._last_seen: Dict[str, float] = {}
+        # Worker side
+        self._on_trade: TradeHandler | None = None
+        self._worker_id: str | None = None
+        self._symbols: Set[str] = set()
+        self._connected = False
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def _reader(self) -> None:
+        while True:
+            message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None:
+                continue
+            self._connected = True
+            channel = message["channel"].decode()
+            if channel == self.INTEREST_CHANNEL and self._on_interest is not None:
+                payload = json.loads(message["data"])
+                worker_id = payload["worker"]
+                self._last_seen[worker_id] = time.monotonic()
+                await self._on_interest(worker_id, set(payload.get("symbols", [])))
+            elif channel == self.SYNC_CHANNEL and self._worker_id is not None:
+                await self._announce()
+            elif channel.startswith(self.TRADE_PREFIX) and self._on_trade is not None:
+                await self._on_trade(json.loads(message["data"]))
+
+    def _ensure_reader(self) -> None:
+        if not self._tasks:
+            self._tasks.append(asyncio.create_task(self._reader()))
+
+    # --- owner ------------------------------------------------------------
+    async def serve_owner(self, on_interest: InterestHandler) -> None:
+        self._on_interest = on_interest
+        await self._pubsub.subscribe(self.INTEREST_CHANNEL)
+        self._ensure_reader()
+        self._tasks.append(asyncio.create_task(self._expire_workers()))
+        # Ask running workers to re-announce, e.g. after an owner restart.
+        await self._redis.publish(self.SYNC_CHANNEL, b"{}")
+        self._connected = True
+
+    async def _expire_workers(self) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat)
+            cutoff = time.monotonic() - 3 * self._heartbeat
+            for worker_id, seen in list(self._last_seen.items()):
+                if seen < cutoff:
+                    del self._last_seen[worker_id]
+                    await self._on_interest(worker_id, set())
+
+    async def publish(self, trade: Dict[str, Any]) -> None:
+        await self._redis.publish(
+            f"{self.TRADE_PREFIX}{trade['symbol']}", json.dumps(trade, separators=(",", ":"))
+        )
+
+    # --- worker -----------------------------------------------------------
+    async def connect_worker(self, worker_id: str, on_trade: TradeHandler) -> None:
+        self._worker_id = worker_id
+        self._on_trade = on_trade
+        await self._pubsub.subscribe(self.SYNC_CHANNEL)
+        self._ensure_reader()
+        self._tasks.append(asyncio.create_task(self._heartbeat_loop()))
+        self._connected = True
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat)
+            await self._announce()
+
+    async def _announce(self) -> None:
+        await self._redis.publish(
+            self.INTEREST_CHANNEL,
+            json.dumps({"worker": self._worker_id, "symbols": sorted(self._symbols)}),
+        )
+
+    async def set_interest(self, worker_id: str, symbols: Iterable[str]) -> None:
+        symbols = set(symbols)
+        added, removed = symbols - self._symbols, self._symbols - symbols
+        self._symbols = symbols
+        if added:
+            await self._pubsub.subscribe(*(f"{self.TRADE_PREFIX}{s}" for s in added))
+        if removed:
+            await self._pubsub.unsubscribe(*(f"{self.TRADE_PREFIX}{s}" for s in removed))
+        await self._announce()
+
+    async def disconnect_worker(self, worker_id: str) -> None:
+        await self.set_interest(worker_id, ())
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        await self._pubsub.close()
+        await self._redis.close()
+
+
+_memory_bus: InProcessPriceBus | None = None
+
+
+def create_price_bus(url: str | None = None) -> PriceBus:
+    """Build the backend named by `url` (defaults to `PRICE_BUS_URL`)."""
+    global _memory_bus
+    url = url or os.getenv("PRICE_BUS_URL", DEFAULT_BUS_URL)
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        if _memory_bus is None:
+            _memory_bus = InProcessPriceBus()
+        return _memory_bus
+    if parsed.scheme == "unix":
+        return UnixSocketPriceBus(parsed.path)
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisPriceBus(url)
+    raise ValueError(f"Unsupported PRICE_BUS_URL scheme: {parsed.scheme!r}")
+
+
+async def run_headless_owner() -> None:
+    """Own the upstream stream and feed the bus without serving HTTP."""
+    from services.live_prices import FinnhubStreamManager
+
+    manager = FinnhubStreamManager(mode="owner")
+    await manager.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await manager.stop()
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run_headless_owner())
+    except KeyboardInterrupt:
+        pass
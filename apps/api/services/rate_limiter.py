@@ -0,0 +1,203 @@
+"""
+Shared scheduler for calls to rate-limited upstream providers.
+
+Each provider (Finnhub REST, Alpha Vantage, Gemini) gets a token bucket sized
+to its quota. Callers wait in a per-provider priority queue until a token is
+available, so interactive lookups jump ahead of background refreshes and bursts
+are smoothed out instead of being rejected upstream with 429s.
+
+The scheduler lives on the API event loop. Code running on worker threads (the
+blocking SDK/`requests` calls) uses `acquire_blocking`, which hops onto that
+loop and waits there.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available; otherwise return seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def penalize(self, seconds: float) -> None:
+        """Empty the bucket and hold refills for `seconds` (provider told us to back off)."""
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = max(self._updated, time.monotonic() + seconds)
+
+
+@dataclass
+class ProviderQueue:
+    name: str
+    bucket: TokenBucket
+    waiters: List[Tuple[int, int, asyncio.Future, float]] = field(default_factory=list)
+    pump: asyncio.Task | None = None
+    granted: Dict[int, int] = field(default_factory=dict)
+    waited_total: float = 0.0
+    waited_max: float = 0.0
+    penalties: int = 0
+
+    def record(self, priority: int, waited: float) -> None:
+        self.granted[priority] = self.granted.get(priority, 0) + 1
+        self.waited_total += waited
+        self.waited_max = max(self.waited_max, waited)
+
+    def stats(self) -> Dict[str, Any]:
+        granted = sum(self.granted.values())
+        return {
+            "provider": self.name,
+            "rate_per_minute": round(self.bucket.rate * 60, 2),
+            "burst": self.bucket.capacity,
+            "queue_depth": len(self.waiters),
+            "granted": {
+                _PRIORITY_NAMES.get(priority, str(priority)): count
+                for priority, count in sorted(self.granted.items())
+            },
+            "avg_wait_ms": round(self.waited_total / granted * 1000, 2) if granted else 0.0,
+            "max_wait_ms": round(self.waited_max * 1000, 2),
+            "penalties": self.penalties,
+        }
+
+
+class UpstreamScheduler:
+    def __init__(self) -> None:
+        self._providers: Dict[str, ProviderQueue] = {}
+        self._sequence = itertools.count()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._blocking_lock = threading.Lock()
+
+    def configure(self, provider: str, per_minute: float, burst: float = 1) -> None:
+        self._providers[provider] = ProviderQueue(
+            name=provider, bucket=TokenBucket(per_minute / 60, max(burst, 1))
+        )
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Remember the API event loop so worker threads can queue onto it."""
+        self._loop = loop
+
+    async def acquire(self, provider: str, priority: int = INTERACTIVE) -> None:
+        """Wait for permission to make one call to `provider`."""
+        queue = self._providers.get(provider)
+        if queue is None:
+            return
+
+        enqueued_at = time.monotonic()
+        # Fast path: nobody queued ahead of us and a token is ready.
+        if not queue.waiters and queue.bucket.try_acquire() == 0:
+            queue.record(priority, 0.0)
+            return
+
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        future = loop.create_future()
+        heapq.heappush(queue.waiters, (priority, next(self._sequence), future, enqueued_at))
+        if queue.pump is None or queue.pump.done():
+            queue.pump = loop.create_task(self._pump(queue))
+        await future
+
+    def acquire_blocking(self, provider: str, priority: int = INTERACTIVE) -> None:
+        """`acquire` for code running on a worker thread."""
+        queue = self._providers.get(provider)
+        if queue is None:
+            return
+
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                raise RuntimeError("acquire_blocking() called on the event loop; use `await acquire()`")
+            asyncio.run_coroutine_threadsafe(self.acquire(provider, priority), loop).result()
+            return
+
+        # No API loop (CLI warm-up, scripts): wait on the bucket directly.
+        started = time.monotonic()
+        with self._blocking_lock:
+            while (wait := queue.bucket.try_acquire()) > 0:
+                time.sleep(wait)
+        queue.record(priority, time.monotonic() - started)
+
+    def penalize(self, provider: str, seconds: float) -> None:
+        """Back off a provider after it reports we exceeded its limit."""
+        queue = self._providers.get(provider)
+        if queue is None:
+            return
+        queue.penalties += 1
+        queue.bucket.penalize(seconds)
+
+    async def _pump(self, queue: ProviderQueue) -> None:
+        """Hand out tokens to the highest-priority waiter as they refill."""
+        while queue.waiters:
+            if queue.waiters[0][2].done():
+                # Caller gave up (cancelled/timed out) before being served.
+                heapq.heappop(queue.waiters)
+                continue
+            wait = queue.bucket.try_acquire()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            priority, _, future, enqueued_at = heapq.heappop(queue.waiters)
+            queue.record(priority, time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [queue.stats() for queue in self._providers.values()]
+
+
+def _rate(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+upstream_scheduler = UpstreamScheduler()
+upstream_scheduler.configure(
+    "finnhub",
+    per_minute=_rate("FINNHUB_RATE_PER_MINUTE", 60),
+    burst=_rate("FINNHUB_RATE_BURST", 10),
+)
+upstream_scheduler.configure(
+    "alphavantage",
+    per_minute=_rate("ALPHA_VANTAGE_RATE_PER_MINUTE", 5),
+    burst=_rate("ALPHA_VANTAGE_RATE_BURST", 1),
+)
+upstream_scheduler.configure(
+    "gemini",
+    per_minute=_rate("GEMINI_RATE_PER_MINUTE", 10),
+    burst=_rate("GEMINI_RATE_BURST", 2),
+)
@@ -0,0 +1,146 @@
+"""
+Request coalescing for upstream provider calls.
+
+When several callers ask for the same upstream resource at once (e.g. every
+dashboard requesting AAPL's quote at market open), only the first one goes to
+the provider; the rest wait for and share its result. Results are then kept in
+a short-TTL LRU cache so bursts just after the call completes are free as well.
+
+Upstream calls in this app are blocking SDK/`requests` calls made from worker
+threads, so the coordination here is thread-based.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def peek(self, key: Hashable) -> Tuple[bool, Any]:
+        """`get` that doesn't count as a use for LRU purposes."""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return False, None
+        return True, entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Store `value`; `ttl` overrides the cache-wide lifetime for this entry."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Live-entry check that doesn't count as a use for LRU purposes."""
+        entry = self._data.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one upstream call.
+
+    Keys should identify the upstream request completely, i.e.
+    `(endpoint, symbol, params...)`.
+    """
+
+    def __init__(self, name: str, ttl: float = 0.0, maxsize: int = 1024) -> None:
+        self.name = name
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.errors = 0
+        _registry.append(self)
+
+    def do(self, key: Hashable, fn: Callable[[], Any], use_cache: bool = True) -> Any:
+        if use_cache:
+            hit, value = self.cache.get(key)
+            if hit:
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = fn()
+        except BaseException as exc:
+            with self._lock:
+                self.errors += 1
+            future.set_exception(exc)
+            raise
+        else:
+            self.cache.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        upstream_calls = self.misses
+        requests = self.hits + self.misses + self.shared
+        return {
+            "name": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "errors": self.errors,
+            "upstream_calls": upstream_calls,
+            "saved_calls": requests - upstream_calls,
+            "inflight": len(self._inflight),
+            "cached": len(self.cache),
+        }
+
+
+_registry: List[SingleFlight] = []
+
+
+def singleflight_stats() -> List[Dict[str, Any]]:
+    return [flight.stats() for flight in _registry]
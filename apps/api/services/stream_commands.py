@@ -0,0 +1,168 @@
+"""
+Coalescing of upstream subscribe/unsubscribe commands for the price stream.
+
+Rather than forwarding one frame per watcher change, `FinnhubStreamManager`
+tells the coalescer which symbols it wants (`want`/`release`). The coalescer
+keeps the set of symbols the upstream socket is actually subscribed to and,
+after a short debounce window, sends only the difference, unsubscribes first
+so the provider's symbol limit is freed before new symbols are added. A
+subscribe that is released again before it is sent (a watchlist opened and
+closed quickly) costs nothing, and a reconnect replays the desired set once.
+
+Finnhub accepts a single symbol per command frame, so frames cannot be merged;
+the saving comes from dropping redundant commands and pacing the rest through
+a token bucket so large replays don't trip the provider's flood protection.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any, Callable, Dict, Set
+
+from services.rate_limiter import TokenBucket
+
+
+def get_debounce_seconds() -> float:
+    return max(float(os.getenv("STREAM_COMMAND_DEBOUNCE_MS", "50")), 0.0) / 1000
+
+
+def get_command_rate() -> float:
+    return max(float(os.getenv("STREAM_COMMANDS_PER_SECOND", "20")), 1.0)
+
+
+def get_command_burst() -> float:
+    return max(float(os.getenv("STREAM_COMMAND_BURST", "50")), 1.0)
+
+
+class SubscriptionCoalescer:
+    """Reconcile desired symbols against upstream subscriptions, paced and debounced."""
+
+    def __init__(
+        self,
+        send: Callable[[str], None],
+        debounce: float | None = None,
+        rate: float | None = None,
+        burst: float | None = None,
+    ) -> None:
+        self._send = send
+        self.debounce = get_debounce_seconds() if debounce is None else debounce
+        self._bucket = TokenBucket(
+            get_command_rate() if rate is None else rate,
+            get_command_burst() if burst is None else burst,
+        )
+        self._desired: Set[str] = set()
+        self._upstream: Set[str] = set()
+        # Dicts used as insertion-ordered sets of outstanding work.
+        self._to_subscribe: Dict[str, None] = {}
+        self._to_unsubscribe: Dict[str, None] = {}
+        self._connected = False
+        self._dirty = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.requested = 0
+        self.cancelled = 0
+        self.replayed = 0
+        self.sent_subscribe = 0
+        self.sent_unsubscribe = 0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def want(self, symbol: str) -> None:
+        """The symbol should be subscribed upstream."""
+        if symbol in self._desired:
+            return
+        self.requested += 1
+        self._desired.add(symbol)
+        if symbol in self._to_unsubscribe:
+            # Still subscribed upstream; the pending unsubscribe nets to nothing.
+            del self._to_unsubscribe[symbol]
+            self.cancelled += 1
+        elif symbol not in self._upstream:
+            self._to_subscribe[symbol] = None
+        self._dirty.set()
+
+    def release(self, symbol: str) -> None:
+        """Nobody needs the symbol any more."""
+        if symbol not in self._desired:
+            return
+        self.requested += 1
+        self._desired.discard(symbol)
+        if symbol in self._to_subscribe:
+            # Never reached upstream, so there's nothing to undo.
+            del self._to_subscribe[symbol]
+            self.cancelled += 1
+        elif symbol in self._upstream:
+            self._to_unsubscribe[symbol] = None
+        self._dirty.set()
+
+    def on_connected(self) -> None:
+        """A fresh socket has no subscriptions: replay everything desired now."""
+        self._connected = True
+        self._upstream.clear()
+        self._to_unsubscribe.clear()
+        self._to_subscribe = dict.fromkeys(self._desired)
+        self.replayed += len(self._to_subscribe)
+        self._dirty.set()
+
+    def on_disconnected(self) -> None:
+        self._connected = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._to_subscribe) + len(self._to_unsubscribe)
+
+    async def _run(self) -> None:
+        while True:
+            await self._dirty.wait()
+            # Let a burst of watcher changes settle before acting on it.
+            if self.debounce:
+                await asyncio.sleep(self.debounce)
+            self._dirty.clear()
+            while self._connected and self.pending:
+                wait = self._bucket.try_acquire()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                self._send_next()
+
+    def _send_next(self) -> None:
+        if self._to_unsubscribe:
+            symbol = next(iter(self._to_unsubscribe))
+            del self._to_unsubscribe[symbol]
+            self._upstream.discard(symbol)
+            self.sent_unsubscribe += 1
+            command = "unsubscribe"
+        else:
+            symbol = next(iter(self._to_subscribe))
+            del self._to_subscribe[symbol]
+            self._upstream.add(symbol)
+            self.sent_subscribe += 1
+            command = "subscribe"
+        self._send(json.dumps({"type": command, "symbol": symbol}))
+
+    def stats(self) -> Dict[str, Any]:
+        sent = self.sent_subscribe + self.sent_unsubscribe
+        return {
+            "desired": len(self._desired),
+            "subscribed": len(self._upstream),
+            "pending": self.pending,
+            "requested": self.requested,
+            "cancelled": self.cancelled,
+            "replayed": self.replayed,
+            "sent_subscribe": self.sent_subscribe,
+            "sent_unsubscribe": self.sent_unsubscribe,
+            # Desire changes plus replays that never needed a frame of their own.
+            "saved_commands": max(self.requested + self.replayed - sent - self.pending, 0),
+        }
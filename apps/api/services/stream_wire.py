@@ -0,0 +1,121 @@
+"""
+Wire encodings for trade frames on `/stream/prices`.
+
+A client picks one when it connects (`?encoding=...`) and the `ready` message
+confirms it. Control messages (`ready`, `symbols`, `snapshot`, `replay`,
+`error`) are always JSON text; only trade frames change:
+
+- `json` (default): `{"type": "trade", "symbol": ..., "price": ..., ...}`.
+- `msgpack`: binary frame holding `["t", symbol, price, volume, timestamp]`,
+  or `["c", symbol, price, volume, timestamp, trades]` for a conflated window.
+  Only offered when the `msgpack` package is installed.
+- `binary`: fixed little-endian records, 21 bytes per trade:
+  `kind:u8 symbol_id:u32 ts_offset:i32 price:f64 volume:f32`, with
+  `kind` 1 for a trade and 2 for a conflated window, which appends
+  `trades:u32`. Symbol IDs arrive in a `symbols` message before the first
+  trade for them, and `ts_offset` is milliseconds after `timeBase` (sent in
+  `ready`, and again in a `timeBase` message if it ever moves). A NaN volume
+  means the provider reported none.
+
+IDs and the time base are shared by every connection so one encoded frame
+can still be sent to all subscribers of a symbol.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import struct
+import time
+from typing import Any, Dict, List
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional encoding
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+BINARY = "binary"
+
+TRADE_RECORD = struct.Struct("<BIidf")
+WINDOW_RECORD = struct.Struct("<BIidfI")
+KIND_TRADE = 1
+KIND_WINDOW = 2
+
+_INT32_MIN = -(2**31)
+_INT32_MAX = 2**31 - 1
+
+
+def encode_event(event: dict[str, Any]) -> str:
+    """Serialize an outbound event to a text frame (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(event).decode()
+    return json.dumps(event, separators=(",", ":"))
+
+
+def available_encodings() -> List[str]:
+    encodings = [JSON, BINARY]
+    if msgpack is not None:
+        encodings.insert(1, MSGPACK)
+    return encodings
+
+
+class WireEncoder:
+    """Encodes trade frames and owns the shared symbol IDs and time base."""
+
+    def __init__(self) -> None:
+        self.time_base = int(time.time() * 1000)
+        self._symbol_ids: Dict[str, int] = {}
+
+    def symbol_id(self, symbol: str) -> int:
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._symbol_ids[symbol] = len(self._symbol_ids) + 1
+        return symbol_id
+
+    def needs_rebase(self, timestamp: int) -> bool:
+        """True (and the base moved) when `timestamp` doesn't fit the i32 offset."""
+        if _INT32_MIN <= timestamp - self.time_base <= _INT32_MAX:
+            return False
+        self.time_base = timestamp
+        return True
+
+    def trade(
+        self,
+        encoding: str,
+        symbol: str,
+        price: float,
+        volume: float | None,
+        timestamp: int,
+        trades: int | None = None,
+    ) -> str | bytes:
+        if encoding == BINARY:
+            volume = math.nan if volume is None else volume
+            offset = timestamp - self.time_base
+            if trades is None:
+                return TRADE_RECORD.pack(KIND_TRADE, self.symbol_id(symbol), offset, price, volume)
+            return WINDOW_RECORD.pack(
+                KIND_WINDOW, self.symbol_id(symbol), offset, price, volume, trades
+            )
+        if encoding == MSGPACK:
+            if trades is None:
+                return msgpack.packb(["t", symbol, price, volume, timestamp])
+            return msgpack.packb(["c", symbol, price, volume, timestamp, trades])
+
+        event = {
+            "type": "trade",
+            "symbol": symbol,
+            "price": price,
+            "volume": volume,
+            "timestamp": timestamp,
+            "source": "finnhub",
+        }
+        if trades is not None:
+            event["trades"] = trades
+        return encode_event(event)
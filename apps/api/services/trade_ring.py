@@ -0,0 +1,110 @@
+"""
+Fixed-size per-symbol history of recent trades for the price stream.
+
+Each ring stores timestamps, prices and volumes in flat `array` buffers
+(24 bytes per trade) rather than one dict per trade, so keeping a few hundred
+trades for thousands of symbols stays cheap. The stream manager uses it to
+send new subscribers a snapshot and to replay what a reconnecting client
+missed, without asking the provider for anything.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# (timestamp ms, price, volume)
+Trade = Tuple[int, float, Optional[float]]
+
+
+def get_replay_size() -> int:
+    return max(int(os.getenv("STREAM_REPLAY_SIZE", "128")), 1)
+
+
+def get_replay_symbols() -> int:
+    return max(int(os.getenv("STREAM_REPLAY_SYMBOLS", "2000")), 1)
+
+
+def get_replay_grace_seconds() -> float:
+    """How long a symbol stays streamed (and recorded) after its last watcher leaves."""
+    return max(float(os.getenv("STREAM_REPLAY_GRACE_SECONDS", "60")), 0.0)
+
+
+class TradeRing:
+    """The last `size` trades of one symbol, oldest overwritten first."""
+
+    __slots__ = ("size", "_timestamps", "_prices", "_volumes", "_next", "_count")
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._timestamps = array("q", bytes(8 * size))
+        self._prices = array("d", bytes(8 * size))
+        # NaN stands in for "no volume reported".
+        self._volumes = array("d", bytes(8 * size))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: int, price: float, volume: float | None) -> None:
+        index = self._next
+        self._timestamps[index] = timestamp
+        self._prices[index] = price
+        self._volumes[index] = math.nan if volume is None else volume
+        self._next = (index + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+
+    def _trade(self, index: int) -> Trade:
+        volume = self._volumes[index]
+        return self._timestamps[index], self._prices[index], None if math.isnan(volume) else volume
+
+    def latest(self) -> Trade | None:
+        if not self._count:
+            return None
+        return self._trade((self._next - 1) % self.size)
+
+    def covers(self, timestamp: int) -> bool:
+        """Whether every trade after `timestamp` is still buffered (nothing was overwritten)."""
+        if self._count < self.size:
+            return True
+        return self._timestamps[self._next] <= timestamp
+
+    def since(self, timestamp: int) -> List[Trade]:
+        """Trades strictly newer than `timestamp`, oldest first."""
+        start = (self._next - self._count) % self.size
+        trades = []
+        for offset in range(self._count):
+            index = (start + offset) % self.size
+            if self._timestamps[index] > timestamp:
+                trades.append(self._trade(index))
+        return trades
+
+
+class TradeRings:
+    """Rings for the most recently traded symbols, bounded in count (LRU)."""
+
+    def __init__(self, size: int | None = None, max_symbols: int | None = None) -> None:
+        self.size = size or get_replay_size()
+        self.max_symbols = max_symbols or get_replay_symbols()
+        self._rings: OrderedDict[str, TradeRing] = OrderedDict()
+
+    def append(self, symbol: str, timestamp: int, price: float, volume: float | None) -> None:
+        ring = self._rings.get(symbol)
+        if ring is None:
+            ring = self._rings[symbol] = TradeRing(self.size)
+            if len(self._rings) > self.max_symbols:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(symbol)
+        ring.append(timestamp, price, volume)
+
+    def get(self, symbol: str) -> TradeRing | None:
+        return self._rings.get(symbol)
+
+    def __len__(self) -> int:
+        return len(self._rings)
@@ -63,26 +63,73 @@ export function ChatbotWidget() {
     setIsLoading(true);
     setError(null);
 
+    const assistantId = `assistant-${Date.now()}`;
+    const setAssistantContent = (content: string) => {
+      setMessages((prev) => {
+        const exists = prev.some((message) => message.id === assistantId);
+        if (!exists) {
+          const assistantMessage: ChatMessage = { id: assistantId, role: 'assistant', content };
+          return [...prev, assistantMessage];
+        }
+        return prev.map((message) =>
+          message.id === assistantId ? { ...message, content } : message,
+        );
+      });
+    };
+
     try {
-      const response = await fetch(`${API_BASE_URL}/chatbot/query`, {
+      // Server-sent events: `data: {"delta"}` chunks, then `event: done` or `event: error`.
+      const response = await fetch(`${API_BASE_URL}/chatbot/stream`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ question }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         const errBody = await response.json().catch(() => ({}));
         throw new Error(errBody.detail ?? 'Failed to get a response from Gemini.');
       }
 
-      const data: { answer: string } = await response.json();
-      const assistantMessage: ChatMessage = {
-        id: `assistant-${Date.now()}`,
-        role: 'assistant',
-        content: data.answer.trim() || "I couldn't find an answer to that.",
-      };
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let answer = '';
+      let finished = false;
+
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const block = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+
+          let event = 'message';
+          let data = '';
+          for (const line of block.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          }
+          if (!data) continue;
+
+          const payload = JSON.parse(data);
+          if (event === 'error') {
+            throw new Error(payload.detail ?? 'Failed to get a response from Gemini.');
+          }
+          if (event === 'done') {
+            answer = payload.answer ?? answer;
+            finished = true;
+            break;
+          }
+          answer += payload.delta ?? '';
+          setAssistantContent(answer);
+        }
+      }
 
-      setMessages((prev) => [...prev, assistantMessage]);
+      setAssistantContent(answer.trim() || "I couldn't find an answer to that.");
     } catch (err) {
       console.error('Chatbot error:', err);
       setError(err instanceof Error ? err.message : 'Unexpected error occurred.');
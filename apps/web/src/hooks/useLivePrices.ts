@@ -58,6 +58,10 @@ export function useLivePrices(
   const [prices, setPrices] = useState<PriceMap>({});
   const [reconnectNonce, bumpReconnectNonce] = useState(0);
   const websocketRef = useRef<WebSocket | null>(null);
+  // Newest trade seen so far; sent as `since` after a reconnect so the server
+  // replays only what we missed.
+  const lastTimestampRef = useRef<number | null>(null);
+  const lastWatchKeyRef = useRef<string | null>(null);
 
   const watchList = useMemo(() => dedupeSymbols(symbols), [symbols]);
   const watchKey = watchList.join(',');
@@ -73,7 +77,34 @@ export function useLivePrices(
     let reconnectTimer: number | null = null;
 
     const subscribe = () => {
-      ws.send(JSON.stringify({ action: 'subscribe', symbols: watchList }));
+      // A changed watch list needs snapshots for the new symbols, not a replay.
+      const since = lastWatchKeyRef.current === watchKey ? lastTimestampRef.current : null;
+      lastWatchKeyRef.current = watchKey;
+      ws.send(
+        JSON.stringify({
+          action: 'subscribe',
+          symbols: watchList,
+          ...(since !== null ? { since } : {}),
+        }),
+      );
+    };
+
+    const applyTrades = (
+      trades: { symbol: string; price: number; timestamp: number; volume?: number }[],
+    ) => {
+      if (trades.length === 0) return;
+      setPrices((prev) => {
+        const next = { ...prev };
+        for (const trade of trades) {
+          next[trade.symbol] = {
+            price: trade.price,
+            timestamp: trade.timestamp,
+            volume: trade.volume,
+          };
+          lastTimestampRef.current = Math.max(lastTimestampRef.current ?? 0, trade.timestamp);
+        }
+        return next;
+      });
     };
 
     ws.onopen = subscribe;
@@ -82,14 +113,9 @@ export function useLivePrices(
       try {
         const payload = JSON.parse(event.data);
         if (payload.type === 'trade') {
-          setPrices((prev) => ({
-            ...prev,
-            [payload.symbol]: {
-              price: payload.price,
-              timestamp: payload.timestamp,
-              volume: payload.volume,
-            },
-          }));
+          applyTrades([payload]);
+        } else if (payload.type === 'snapshot' || payload.type === 'replay') {
+          applyTrades(payload.trades ?? []);
         }
       } catch (error) {
         console.error('Failed to parse price event', error);
@@ -105,9 +131,9 @@ export function useLivePrices(
         window.clearTimeout(reconnectTimer);
       }
       // Attempt a very simple reconnect using a short delay so we keep prices
-      // flowing even if the server restarts.
+      // flowing even if the server restarts. Known prices are kept; the server
+      // replays trades newer than `lastTimestampRef` on resubscribe.
       reconnectTimer = window.setTimeout(() => {
-        setPrices({});
         bumpReconnectNonce((value) => value + 1);
       }, 1000);
     };